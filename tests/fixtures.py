@@ -0,0 +1,54 @@
+"""Shared test fixtures: a small transformer block and the .stb weights it loads."""
+
+from tools import stb
+from tools.khlnary_compiler import KhlnaryCompiler
+
+
+def transformer_block(compiler, weights_dir):
+    """Attention, linear + GELU, linear and a residual add over `weights_dir`/{attn,l1,l2}.stb."""
+
+    compiler.compile_attention_layer(hidden_size=8, num_heads=2, file_path=str(weights_dir / "attn.stb"))
+    compiler.compile_linear_layer(
+        weight_file=str(weights_dir / "l1.stb"),
+        weight_id=0,
+        bias_file=str(weights_dir / "l1.stb"),
+        bias_id=1,
+        weight_shape=(8, 16),
+    )
+    compiler.knus.append(compiler.encode_glyph("G_GELU"))
+    compiler.compile_linear_layer(
+        weight_file=str(weights_dir / "l2.stb"),
+        weight_id=0,
+        bias_file=str(weights_dir / "l2.stb"),
+        bias_id=1,
+        weight_shape=(16, 8),
+    )
+    compiler.knus.append(compiler.encode_glyph("G_TENSOR_ADD"))
+
+
+def write_block_weights(weights_dir, rng):
+    """Random float16 weights for `transformer_block`; needs NumPy."""
+
+    np = stb.np
+    stb.write_stb(
+        weights_dir / "attn.stb",
+        [{"tensor_id": i, "array": rng.standard_normal((8, 8)).astype(np.float16)} for i in range(3)],
+    )
+    for name, shape in (("l1.stb", (8, 16)), ("l2.stb", (16, 8))):
+        stb.write_stb(
+            weights_dir / name,
+            [
+                {"tensor_id": 0, "array": rng.standard_normal(shape).astype(np.float16)},
+                {"tensor_id": 1, "array": rng.standard_normal(shape[1]).astype(np.float16)},
+            ],
+        )
+
+
+def block_module(weights_dir, *, fuse=False):
+    """Build the `transformer_block` module, optionally after operator fusion."""
+
+    compiler = KhlnaryCompiler()
+    transformer_block(compiler, weights_dir)
+    if fuse:
+        compiler.fuse_operators()
+    return compiler.build_module()
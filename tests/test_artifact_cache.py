@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tools.artifact_cache import ArtifactCache, artifact_key, write_if_changed
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_webgpu import BACKEND_VERSION, WGSL_ARTIFACT, WebGpuBackend
+
+
+def _module(hidden=8):
+    compiler = KhlnaryCompiler()
+    compiler.compile_linear_layer(
+        weight_file="weights/l1.stb", weight_id=0, bias_file="weights/l1.stb", bias_id=1, weight_shape=(hidden, 16)
+    )
+    return compiler.build_module()
+
+
+class TestArtifactCache(unittest.TestCase):
+    def test_key_tracks_knus_tables_and_backend_version(self):
+        key = artifact_key(_module(), kind="webgpu", backend_version=BACKEND_VERSION)
+        self.assertEqual(key, artifact_key(_module(), kind="webgpu", backend_version=BACKEND_VERSION))
+        self.assertNotEqual(key, artifact_key(_module(hidden=4), kind="webgpu", backend_version=BACKEND_VERSION))
+        self.assertNotEqual(key, artifact_key(_module(), kind="webgpu", backend_version=BACKEND_VERSION + 1))
+        self.assertNotEqual(key, artifact_key(_module(), kind="khn", backend_version=BACKEND_VERSION))
+
+    def test_second_build_is_served_from_disk_without_regenerating(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = WebGpuBackend(ArtifactCache(tmp)).build_artifacts(_module())
+            cache = ArtifactCache(tmp)
+            with mock.patch.object(WebGpuBackend, "build_program", side_effect=AssertionError("regenerated")):
+                second = WebGpuBackend(cache).build_artifacts(_module())
+                wgsl = WebGpuBackend(cache).generate_wgsl_shader(_module())
+        self.assertEqual(first, second)
+        self.assertEqual(wgsl, first[WGSL_ARTIFACT])
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+
+    def test_prune_drops_least_recently_used_entries(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ArtifactCache(tmp, max_entries=2)
+            keys = [f"{i:064x}" for i in range(3)]
+            cache.put(keys[0], {"a.txt": b"0"})
+            cache.put(keys[1], {"a.txt": b"1"})
+            manifest = Path(tmp) / keys[0] / "manifest.json"
+            old = manifest.stat().st_mtime_ns
+            os.utime(Path(tmp) / keys[1] / "manifest.json", ns=(old - 10**9, old - 10**9))
+            cache.put(keys[2], {"a.txt": b"2"})
+            self.assertEqual(cache.entries(), [keys[0], keys[2]])
+            self.assertIsNone(cache.get(keys[1]))
+            with self.assertRaises(ValueError):
+                cache.put(keys[0], {"../escape": b""})
+
+    def test_write_if_changed_skips_identical_bytes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "out" / "khlnary.wgsl"
+            self.assertTrue(write_if_changed(path, b"abc"))
+            mtime = path.stat().st_mtime_ns
+            self.assertFalse(write_if_changed(path, b"abc"))
+            self.assertEqual(path.stat().st_mtime_ns, mtime)
+            self.assertTrue(write_if_changed(path, b"abd"))
+            self.assertEqual(path.read_bytes(), b"abd")
+
+            umask = os.umask(0o022)
+            self.addCleanup(os.umask, umask)
+            fresh = Path(tmp) / "out" / "khlnary.js"
+            write_if_changed(fresh, b"js")
+            self.assertEqual(fresh.stat().st_mode & 0o777, 0o644)
+            os.chmod(fresh, 0o640)
+            write_if_changed(fresh, b"js2")
+            self.assertEqual(fresh.stat().st_mode & 0o777, 0o640)
+            if Path("/proc/self/status").is_file():
+                # The umask is process-global: reading it must not toggle it under other threads.
+                with mock.patch("tools.artifact_cache.os.umask", side_effect=AssertionError("umask toggled")):
+                    write_if_changed(Path(tmp) / "out" / "other.js", b"x")
+                os.remove(Path(tmp) / "out" / "other.js")
+
+            with mock.patch("tools.artifact_cache.os.replace", side_effect=OSError("disk full")):
+                with self.assertRaises(OSError):
+                    write_if_changed(path, b"xyz")
+            self.assertEqual(sorted(p.name for p in path.parent.iterdir()), ["khlnary.js", "khlnary.wgsl"])
+
+    def test_put_keeps_an_existing_entry_for_the_same_key(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ArtifactCache(tmp)
+            key = "ab" * 32
+            cache.put(key, {"a.wgsl": b"x"})
+            cache.put(key, {"a.wgsl": b"x"})
+            self.assertEqual(cache.get(key), {"a.wgsl": b"x"})
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], [key])
+
+
+if __name__ == "__main__":
+    unittest.main()
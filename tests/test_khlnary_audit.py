@@ -0,0 +1,117 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tools import khlnary_verify, stb
+from tools.khlnary_audit import ALLOW, DENY, AuditLog, AuditLogError, read_audit_log
+from tools.khlnary_encoder import encode_knu
+from tools.khlnary_verify import verify_module
+
+from tests.fixtures import block_module, write_block_weights
+
+
+class TestAuditLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name) / "audit"
+
+    def test_background_writer_rolls_segments_and_replays_in_order(self):
+        with AuditLog(self.dir, batch_size=50, segment_bytes=256, flush_interval=0.001) as audit:
+            for i in range(500):
+                audit.record("tensor_load", f"bin:0/tensor:{i % 16}", knu_index=i, authority=1, trace_id="t1")
+        stats = audit.stats()
+        self.assertEqual((stats.recorded, stats.written, stats.dropped), (500, 500, 0))
+        self.assertGreater(stats.segments, 1)
+        events = list(read_audit_log(self.dir))
+        self.assertEqual([e.knu_index for e in events], list(range(500)))
+        self.assertEqual({(e.actor, e.action, e.outcome, e.trace_id) for e in events}, {("local", "tensor_load", "allow", "t1")})
+
+        # Reopening appends to a new segment after the existing ones.
+        with AuditLog(self.dir) as again:
+            again.record("authority_check", "bin:1", DENY, severity="warning")
+        self.assertEqual(list(read_audit_log(self.dir))[-1].outcome, DENY)
+
+    def test_sampling_rate_limit_filters_and_full_ring(self):
+        audit = AuditLog(
+            self.dir,
+            capacity=10,
+            sample={"tensor_load": 0.0},
+            rate_limit={"authority_check": 3},
+            filters=[lambda e: e.resource != "bin:9"],
+        )
+        for _ in range(5):
+            self.assertFalse(audit.record("tensor_load", "bin:0/tensor:0"))
+            self.assertTrue(audit.record("tensor_load", "bin:0/tensor:0", DENY))
+        accepted = [audit.record("authority_check", "bin:0") for _ in range(5)]
+        self.assertEqual(accepted, [True] * 3 + [False] * 2)
+        audit.record("prefetch", "bin:9")
+        audit.record("prefetch", "bin:9")
+        self.assertFalse(audit.record("prefetch", "bin:1"))
+        stats = audit.stats()
+        self.assertEqual((stats.sampled_out, stats.rate_limited, stats.dropped, stats.recorded), (5, 2, 1, 10))
+
+        audit.start()
+        audit.stop()
+        events = list(read_audit_log(self.dir))
+        self.assertEqual(len(events), 8)
+        self.assertEqual(audit.stats().filtered, 2)
+
+    def test_writer_survives_raising_filters_and_failed_writes(self):
+        def broken(event):
+            raise RuntimeError("filter bug")
+
+        with AuditLog(self.dir, filters=[broken], flush_interval=0.001) as audit:
+            with mock.patch.object(audit, "_write_frame", side_effect=OSError(28, "No space left on device")):
+                for i in range(10):
+                    audit.record("tensor_load", "bin:0/tensor:0", knu_index=i)
+                time.sleep(0.05)
+                self.assertTrue(audit._thread.is_alive())
+                self.assertEqual(audit.stats().written, 0)
+            audit.record("tensor_load", "bin:0/tensor:0", knu_index=10)
+        stats = audit.stats()
+        self.assertEqual((stats.written, stats.lost, stats.filtered), (11, 0, 0))
+        self.assertGreaterEqual(stats.errors, 12)
+        self.assertEqual([e.knu_index for e in read_audit_log(self.dir)], list(range(11)))
+
+    def test_torn_tail_is_ignored_but_inner_corruption_raises(self):
+        with AuditLog(self.dir, batch_size=4) as audit:
+            for i in range(8):
+                audit.record("tensor_load", "bin:0/tensor:0", knu_index=i)
+            audit.flush()
+        (segment,) = self.dir.glob("audit-*.kal")
+        data = segment.read_bytes()
+        segment.write_bytes(data[:-3])
+        self.assertEqual([e.knu_index for e in read_audit_log(self.dir)], [0, 1, 2, 3])
+        segment.write_bytes(data[:20] + bytes([data[20] ^ 0xFF]) + data[21:])
+        with self.assertRaises(AuditLogError):
+            list(read_audit_log(self.dir))
+
+    def test_executor_and_verifier_emit_events(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        from tools.khlnary_cpu import CpuExecutor
+
+        write_block_weights(Path(self.tmp.name), stb.np.random.default_rng(3))
+        module = block_module(Path(self.tmp.name))
+        loads = module.tensors
+        x = stb.np.random.default_rng(1).standard_normal((4, 8)).astype(stb.np.float32)
+        with AuditLog(self.dir) as audit:
+            self.assertTrue(verify_module(module, audit=audit).ok)
+            CpuExecutor(module).run(x, audit=audit)
+            module.knus.append(encode_knu("G_PREFETCH_BIN", profile_flags=0x2, payload=0, auth_class=2, ver=2))
+            self.assertFalse(verify_module(module, audit=audit, stamp=False).ok)
+        events = list(read_audit_log(self.dir))
+        checks = [e for e in events if e.action == "authority_check"]
+        tensor_loads = [e for e in events if e.action == "tensor_load"]
+        self.assertEqual(len(tensor_loads), len(loads))
+        self.assertEqual(len(checks), 2 * len(loads) + 1)
+        self.assertEqual([(e.resource, e.outcome, e.authority) for e in checks if e.outcome == DENY], [("bin:0", DENY, 2)])
+        self.assertEqual((khlnary_verify.ALLOW, khlnary_verify.DENY), (ALLOW, DENY))
+        self.assertEqual(tensor_loads[0].resource, f"bin:{loads[0].file_id}/tensor:{loads[0].tensor_id}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from dataclasses import replace
+from pathlib import Path
+
+from tools.khlnary_bench import (
+    BenchResult,
+    compare,
+    load_results,
+    main,
+    parse_size,
+    run_benchmarks,
+    save_results,
+)
+
+
+class TestBenchRunner(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size("1MB"), 1 << 20)
+        self.assertEqual(parse_size("1gb"), 1 << 30)
+        self.assertEqual(parse_size("512"), 512)
+
+    def test_compare_uses_fastest_repeat_with_noise_allowance(self):
+        base = BenchResult("encoder.encode_knu", 1.0, 0.9, 15, 100, "KNU")
+        baseline = {base.name: base, "gone": replace(base, name="gone")}
+        self.assertEqual(compare({base.name: replace(base, seconds=5.0)}, baseline, threshold=0.25), [])
+        self.assertEqual(compare({base.name: replace(base, seconds=1.2, min_seconds=1.1)}, baseline), [])
+        [regression] = compare({base.name: replace(base, seconds=1.4, min_seconds=1.35)}, baseline, threshold=0.25)
+        self.assertAlmostEqual(regression.ratio, 1.5)
+        noisy = replace(base, seconds=3.0, min_seconds=1.35)
+        self.assertEqual(compare({base.name: noisy}, baseline, threshold=0.25), [])
+        self.assertEqual(compare({base.name: replace(base, min_seconds=9.0, units=10)}, baseline), [])
+
+    def test_runner_records_json_and_fails_on_regression(self):
+        results = run_benchmarks(scale=0.01, repeats=1, only=["encoder.", "compiler."])
+        self.assertEqual(
+            sorted(results),
+            ["compiler.build_module", "encoder.decode_knu", "encoder.encode_knu", "encoder.lower_python"],
+        )
+        self.assertTrue(all(r.seconds > 0 and r.units > 0 for r in results.values()))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = save_results(Path(tmp) / "baseline.json", results)
+            self.assertEqual(load_results(path), results)
+            fast = {name: replace(r, seconds=1e-9, min_seconds=1e-9) for name, r in results.items()}
+            save_results(path, fast)
+            args = ["--quick", "--repeats", "1", "--only", "encoder.encode_knu", "--baseline", str(path)]
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(main(args), 0)  # --quick does different work than the baseline
+                save_results(path, {"encoder.encode_knu": replace(fast["encoder.encode_knu"], units=2000)})
+                self.assertEqual(main(args), 1)
+                self.assertIn("REGRESSION encoder.encode_knu", out.getvalue())
+                missing = args[:-1] + [str(Path(tmp) / "missing.json")]
+                self.assertEqual(main(missing), 0)
+        self.assertIn("No baseline at", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ from tools.khlnary_encoder import (
     GLYPH_IDS,
     KhlNaryParityError,
     compile_python_to_khlnary_words,
+    compile_python_with_functions,
     decode_knu,
     encode_knu,
     pack_lane_bundle_u128,
@@ -67,6 +68,17 @@ class TestKhlNaryEncoder(unittest.TestCase):
         func_call = decoded[glyphs.index("G_CALL")]
         self.assertEqual(func_def["payload"], func_call["payload"])
 
+    def test_function_table_records_entry_pc_arity_and_locals(self):
+        src = "def add(a, b):\n    c = a + b\n    return c\n\nadd(1, 2)\n"
+        words, functions = compile_python_with_functions(src)
+        glyphs = [decode_knu(word)["glyph_name"] for word in words]
+        entry = functions[decode_knu(words[glyphs.index("G_CALL")])["payload"]]
+
+        self.assertEqual(glyphs[entry.entry_pc - 1], "G_FUNC_DEF")
+        self.assertEqual(glyphs[entry.end_pc], "G_FUNC_END")
+        self.assertEqual(entry.arity, 2)
+        self.assertEqual(entry.num_locals, 3)
+
     def test_lane_bundle_packing(self):
         words = [
             encode_knu("G_CONST_I8", profile_flags=1, payload=1),
@@ -0,0 +1,111 @@
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from tools import khn, khlnary_inspect, stb
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_encoder import encode_knu
+from tools.khlnary_inspect import disassemble, disassemble_chunks, glyph_histogram, main
+
+
+def _module():
+    compiler = KhlnaryCompiler()
+    compiler.compile_linear_layer(
+        weight_file="weights/l1.stb", weight_id=0, bias_file="weights/l1.stb", bias_id=1, weight_shape=(8, 16)
+    )
+    compiler.compile_kuhul_block(
+        "func count(n) { i = 0; while (i < n) { i = i + 1; } return i; }\nprefetch(0);\ncount(5);\n"
+    )
+    return compiler.build_module()
+
+
+class TestKhlnaryInspect(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.module = _module()
+        self.path = khn.write_khn(Path(self.tmp.name) / "m.khn", self.module)
+
+    def _run(self, *argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(main([str(a) for a in argv]), 0)
+        return out.getvalue().splitlines()
+
+    def test_disassembly_resolves_references(self):
+        with khn.KhnFile(self.path) as f:
+            lines = list(disassemble(f))
+        self.assertEqual(len(lines), len(self.module.knus))
+        self.assertTrue(lines[0].startswith("00000000  "))
+        self.assertIn("G_LOAD_BIN_TENSOR", lines[0])
+        self.assertTrue(lines[0].endswith("; bin 0 tensor 0 float16[8x16] weights/l1.stb"))
+        self.assertIn("G_FUNC_DEF           a=1 f=1 p=0x01 auth=1", lines[4])
+        self.assertTrue(lines[4].endswith("; func 1 body 00000005..00000020 arity=1"))
+        self.assertTrue(lines[11].endswith("; -> 00000017"))
+        self.assertTrue(lines[16].endswith("p=0xf7 auth=1  ; -> 00000007"))
+        self.assertTrue(lines[21].endswith("G_PREFETCH_BIN       a=0 f=2 p=0x00 auth=1  ; bin 0 weights/l1.stb"))
+        self.assertTrue(lines[22].endswith("; 5"))
+        self.assertIn("G_CALL", lines[23])
+        self.assertNotIn("!parity", "".join(lines))
+
+    def test_chunking_filters_and_fallbacks_agree(self):
+        with khn.KhnFile(self.path) as f:
+            expected = list(disassemble(f))
+            chunked = [line for chunk in disassemble_chunks(f, chunk=3) for line in chunk]
+            self.assertEqual(chunked, expected)
+            window = list(disassemble(f, start=10, count=8, glyphs=[0x10, 0x11], chunk=4))
+            self.assertEqual(window, [expected[11], expected[16]])
+            with mock.patch.object(khlnary_inspect, "np", None):
+                self.assertEqual(list(disassemble(f, chunk=5)), expected)
+                self.assertEqual(glyph_histogram(f, chunk=5), glyph_histogram(f))
+            self.assertEqual(glyph_histogram(f), dict(Counter((w >> 20) & 0xFF for w in self.module.knus)))
+
+        packed = khn.write_khn(Path(self.tmp.name) / "z.khn", self.module, compress="zlib")
+        with khn.KhnFile(packed) as f:
+            self.assertEqual(list(disassemble(f)), expected)
+
+    def test_flags_bad_parity_and_dangling_jumps(self):
+        self.module.knus[5] ^= 1 << 8
+        self.module.knus.append(encode_knu("G_JUMP8", profile_flags=0x1, payload=0x7F, ver=0x2))
+        path = khn.write_khn(Path(self.tmp.name) / "bad.khn", self.module)
+        with khn.KhnFile(path) as f:
+            lines = list(disassemble(f))
+        self.assertIn("!parity", lines[5])
+        self.assertTrue(lines[-1].endswith("(out of bounds)"))
+
+    def test_cli_subcommands(self):
+        lines = self._run("disasm", self.path, "--glyph", "G_CALL", "--glyph", "0x20")
+        self.assertTrue(lines[0].startswith(f"; {self.path}: {len(self.module.knus)} KNUs (KNUS), 1 functions"))
+        self.assertEqual(lines[1], "; bin 0: weights/l1.stb")
+        self.assertEqual([line.split()[0] for line in lines[2:]], ["00000004", "00000023"])
+
+        hist = self._run("hist", self.path)
+        self.assertEqual(hist[1].split()[:3], ["G_LOAD_LOCAL", "0x23", "4"])
+        self.assertEqual(hist[-1].split(), ["total", str(len(self.module.knus))])
+        as_json = json.loads("\n".join(self._run("hist", self.path, "--json")))
+        self.assertEqual(as_json["G_CONST_I8"], 3)
+
+        if stb.np is None:
+            return
+        weights = Path(self.tmp.name) / "w.stb"
+        stb.write_stb(
+            weights,
+            [
+                {"tensor_id": 0, "array": stb.np.zeros((8, 16), dtype=stb.np.float16)},
+                {"tensor_id": 1, "array": stb.np.zeros(16, dtype=stb.np.float32)},
+            ],
+        )
+        table = self._run("stb", weights)
+        self.assertTrue(table[0].startswith(f"; {weights}: 2 tensors"))
+        self.assertEqual(table[2].split()[:4], ["0", "float16", "row_major", "8x16"])
+        self.assertEqual(table[3].split()[1:4], ["float32", "row_major", "16"])
+        self.assertEqual(table[3].split()[-1], "64")
+
+
+if __name__ == "__main__":
+    unittest.main()
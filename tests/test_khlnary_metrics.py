@@ -0,0 +1,69 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools import khlnary_metrics as metrics
+from tools import stb
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_encoder import compile_python_to_khlnary_words
+from tools.khlnary_webgpu import WebGpuBackend
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.previous = metrics.enable(False)
+        metrics.REGISTRY.reset()
+
+    def tearDown(self):
+        metrics.enable(self.previous)
+        metrics.REGISTRY.reset()
+
+    def test_disabled_collection_records_nothing(self):
+        self.assertIs(metrics.timer("a_seconds"), metrics.timer("b_seconds"))
+        compile_python_to_khlnary_words("x = 1\n")
+        metrics.inc("khlnary_test_total")
+        self.assertEqual(metrics.REGISTRY.snapshot(), {"counters": {}, "histograms": {}})
+
+    def test_instrumented_pipeline_exports_json_and_prometheus(self):
+        metrics.enable()
+        words = compile_python_to_khlnary_words("x = 1\nx = x + 2\n")
+        compiler = KhlnaryCompiler()
+        compiler.compile_linear_layer(
+            weight_file="weights/l1.stb", weight_id=0, bias_file="weights/l1.stb", bias_id=1, weight_shape=(8, 16)
+        )
+        WebGpuBackend().generate_wgsl_shader(compiler.build_module())
+        if stb.np is not None:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = stb.write_stb(Path(tmp) / "w.stb", [{"tensor_id": 0, "array": stb.np.zeros(16, "<f4")}])
+                stb.read_stb(path)
+
+        snap = json.loads(metrics.REGISTRY.to_json())
+        self.assertEqual(snap["counters"]["khlnary_knus_encoded_total"], len(words))
+        timers = [
+            "khlnary_parse_seconds",
+            "khlnary_lower_seconds",
+            "khlnary_encode_seconds",
+            "khlnary_compile_build_seconds",
+            "khlnary_wgsl_generate_seconds",
+        ]
+        for name in timers:
+            self.assertEqual(snap["histograms"][name]["count"], 1, name)
+        if stb.np is not None:
+            self.assertEqual(snap["counters"]["khlnary_stb_bytes_read_total"], 64)
+
+        text = metrics.REGISTRY.to_prometheus()
+        self.assertIn("# TYPE khlnary_knus_encoded_total counter", text)
+        self.assertIn('khlnary_parse_seconds_bucket{le="+Inf"} 1', text)
+        self.assertIn("khlnary_parse_seconds_count 1", text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = metrics.MetricsRegistry()
+        for value in (0.002, 0.002, 3.0, 99.0):
+            registry.observe("khlnary_test_seconds", value)
+        buckets = registry.snapshot()["histograms"]["khlnary_test_seconds"]["buckets"]
+        self.assertEqual((buckets["0.001"], buckets["0.005"], buckets["5.0"], buckets["+Inf"]), (0, 2, 3, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from tools import stb
+from tools.khlnary_bench import generated_program, transformer_module
+from tools.khlnary_encoder import KhlNaryParityError, compile_python_to_khlnary_words, encode_knu
+from tools.khlnary_profiles import (
+    PROFILE_BRANCH,
+    PROFILE_DENSE,
+    PROFILE_VECTOR,
+    ProfileFormatError,
+    ProfileStream,
+    decode_profile,
+    density_report,
+    encode_profile,
+)
+
+
+class TestProfileCodecs(unittest.TestCase):
+    def setUp(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+
+    def test_round_trip_through_bytes_is_lossless(self):
+        streams = [
+            compile_python_to_khlnary_words(generated_program(40)),
+            transformer_module(2).knus,
+            [encode_knu("G_JUMP8", payload=0x80), encode_knu("G_CONST_I8", payload=0x7F, auth_class=0x7)],
+            [],
+        ]
+        for words in streams:
+            for profile in (PROFILE_BRANCH, PROFILE_VECTOR):
+                stream = ProfileStream.from_bytes(encode_profile(words, profile).to_bytes())
+                self.assertEqual(stream.profile, profile)
+                self.assertEqual(decode_profile(stream).tolist(), list(words))
+
+    def test_branch_profile_uses_balanced_trits_for_signed_offsets(self):
+        back = encode_knu("G_JUMP8", payload=0xFC)  # -4
+        words = [encode_knu("G_IFZ_JUMP8", arity=1, payload=3), back]
+        branch = encode_profile(words, PROFILE_BRANCH)
+        vector = encode_profile(words, PROFILE_VECTOR)
+        self.assertEqual((branch.index_digits, branch.payload_digits), (1, 2))  # 9 codes cover -4..4
+        self.assertEqual(vector.payload_digits, 4)  # 0xFC read unsigned
+        self.assertEqual(decode_profile(branch).tolist(), words)
+
+    def test_density_beats_dense_32(self):
+        words = compile_python_to_khlnary_words(generated_program(100))
+        report = density_report(words, repeats=1)
+        self.assertEqual(report[PROFILE_DENSE]["bits_per_knu"], 32.0)
+        for profile in (PROFILE_BRANCH, PROFILE_VECTOR):
+            self.assertLess(report[profile]["bits_per_knu"], 16.0)
+            self.assertGreater(report[profile]["decode_knu_per_s"], 0)
+
+    def test_rejects_corrupt_input(self):
+        word = encode_knu("G_ADD_I32", arity=2)
+        with self.assertRaises(KhlNaryParityError):
+            encode_profile([word, word ^ 0x10])
+        data = bytearray(encode_profile([word] * 8).to_bytes())
+        with self.assertRaises(ProfileFormatError):
+            ProfileStream.from_bytes(bytes(data[:-4]))
+        data[4] = 5
+        with self.assertRaises(ProfileFormatError):
+            ProfileStream.from_bytes(bytes(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools import stb
+from tools.khlnary_compiler import KhlnaryCompiler, build_graph
+from tools.khlnary_memory import apply_memory_plan
+from tools.khlnary_scheduler import build_task_graph
+
+from tests.fixtures import block_module, transformer_block, write_block_weights
+
+
+class TestParallelScheduler(unittest.TestCase):
+    def test_attention_projections_are_independent_tasks(self):
+        compiler = KhlnaryCompiler()
+        transformer_block(compiler, Path("weights"))
+        tasks = build_task_graph(build_graph(compiler.knus, compiler.tensors))
+        levels = tasks.levels()
+
+        self.assertEqual(levels[0], [(0, ""), (1, ""), (2, ""), (3, ""), (5, ""), (6, ""), (10, ""), (11, "")])
+        self.assertEqual(levels[1], [(4, "k"), (4, "q"), (4, "v")])
+        self.assertEqual(len(levels), 9)
+        self.assertEqual(tasks.deps[(4, "")], [(4, "k"), (4, "q"), (4, "v")])
+        self.assertEqual(tasks.order()[-1], (max(key[0] for key in tasks.deps), ""))
+
+    def test_parallel_run_is_bitwise_identical_to_sequential(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor
+        from tools.khlnary_scheduler import ParallelExecutor
+
+        rng = np.random.default_rng(11)
+        with tempfile.TemporaryDirectory() as tmp:
+            write_block_weights(Path(tmp), rng)
+            x = rng.standard_normal((2, 33, 8)).astype(np.float32)
+            for fuse, plan in ((False, False), (True, False), (False, True), (True, True)):
+                module = block_module(Path(tmp), fuse=fuse)
+                if plan:
+                    apply_memory_plan(module, rows=66)
+                expected = CpuExecutor(module).run(x)
+                with ParallelExecutor(module, workers=4) as executor:
+                    for _ in range(3):
+                        np.testing.assert_array_equal(executor.run(x), expected)
+                    report = executor.last_report
+
+                self.assertEqual(report.tasks, len(executor.tasks.deps))
+                self.assertGreaterEqual(report.max_width, 3)
+                self.assertLess(report.levels, report.tasks)
+                self.assertLessEqual(report.critical_path_seconds, report.work_seconds + 1e-9)
+                self.assertGreater(report.parallelism, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
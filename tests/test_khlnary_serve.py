@@ -0,0 +1,119 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from tools import stb
+from tools.khlnary_compiler import KhlnaryCompiler
+
+from tests.fixtures import block_module, write_block_weights
+
+
+class TestBatchingServer(unittest.TestCase):
+    def setUp(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+
+    def test_batched_results_match_single_requests(self):
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor
+        from tools.khlnary_serve import BatchingServer, ServerClosedError
+
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            write_block_weights(Path(tmp), rng)
+            module = block_module(Path(tmp), fuse=True)
+            inputs = [rng.standard_normal((5, 8)).astype(np.float32) for _ in range(20)]
+            inputs += [rng.standard_normal(8).astype(np.float32) for _ in range(4)]
+
+            server = BatchingServer(module, max_batch_size=8, max_wait=0.05, workers=2)
+            with server:
+                futures = [server.submit(x) for x in inputs]
+                results = [f.result(timeout=10) for f in futures]
+            reference = CpuExecutor(module)
+            for x, result in zip(inputs, results):
+                expected = reference.run(x) if x.ndim > 1 else reference.run(x[None, :])[0]
+                np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-6)
+            with self.assertRaises(ServerClosedError):
+                server.submit(inputs[0])
+
+        stats = server.stats()
+        self.assertEqual(stats.requests, 24)
+        self.assertLess(stats.batches, 24)
+        self.assertLessEqual(stats.mean_batch_size, 8)
+        self.assertGreater(stats.throughput_rps, 0)
+        self.assertLessEqual(stats.p50_ms, stats.p99_ms)
+
+    def test_cancelled_request_does_not_stop_the_worker(self):
+        np = stb.np
+        from tools.khlnary_serve import BatchingServer
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "w.stb"
+            eye, zeros = np.eye(8, dtype=np.float32), np.zeros(8, np.float32)
+            stb.write_stb(path, [{"tensor_id": 0, "array": eye}, {"tensor_id": 1, "array": zeros}])
+            compiler = KhlnaryCompiler()
+            compiler.compile_linear_layer(
+                weight_file=str(path), weight_id=0, bias_file=str(path), bias_id=1, weight_shape=(8, 8)
+            )
+            x = np.arange(16, dtype=np.float32).reshape(2, 8)
+            with BatchingServer(compiler.build_module(), max_batch_size=4, max_wait=0.2, workers=1) as server:
+                cancelled = server.submit(x)
+                self.assertTrue(cancelled.cancel())
+                kept = server.submit(x)
+                np.testing.assert_array_equal(kept.result(timeout=10), x)
+                np.testing.assert_array_equal(server.infer(x, timeout=10), x)
+                self.assertTrue(all(t.is_alive() for t in server._threads))
+            self.assertEqual(server.stats().requests, 2)
+
+    def test_batches_take_consecutive_same_shaped_requests_in_order(self):
+        np = stb.np
+        from concurrent.futures import Future
+
+        from tools.khlnary_serve import BatchingServer, _Request
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "w.stb"
+            eye, zeros = np.eye(8, dtype=np.float32), np.zeros(8, np.float32)
+            stb.write_stb(path, [{"tensor_id": 0, "array": eye}, {"tensor_id": 1, "array": zeros}])
+            compiler = KhlnaryCompiler()
+            compiler.compile_linear_layer(
+                weight_file=str(path), weight_id=0, bias_file=str(path), bias_id=1, weight_shape=(8, 8)
+            )
+            server = BatchingServer(compiler.build_module(), max_batch_size=3, max_wait=10.0, workers=1)
+        shapes = [(2, 8), (2, 8), (8,), (2, 8), (2, 8), (2, 8), (2, 8)]
+        now = time.perf_counter()
+        server._pending.extend(_Request(np.zeros(shape, np.float32), Future(), now) for shape in shapes)
+        server._running = True
+        started = time.perf_counter()
+        batches = [[r.x.shape for r in server._take_batch()] for _ in range(3)]
+        self.assertLess(time.perf_counter() - started, 5.0)  # a shape change closes the batch without waiting
+        server._running = False
+        batches.append([r.x.shape for r in server._take_batch()])
+        self.assertEqual(batches, [[(2, 8), (2, 8)], [(8,)], [(2, 8)] * 3, [(2, 8)]])
+        self.assertEqual(server._take_batch(), [])
+
+    def test_mmap_weights_are_shared_views(self):
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "w.stb"
+            w = np.arange(128, dtype=np.float32).reshape(8, 16)
+            stb.write_stb(path, [{"tensor_id": 0, "array": w}, {"tensor_id": 1, "array": np.ones(16, np.float32)}])
+            mapped = stb.read_stb(path, mmap=True)
+            self.assertFalse(mapped[0]["array"].flags.owndata or mapped[0]["array"].flags.writeable)
+            np.testing.assert_array_equal(mapped[0]["array"], w)
+
+            compiler = KhlnaryCompiler()
+            compiler.compile_linear_layer(
+                weight_file=str(path), weight_id=0, bias_file=str(path), bias_id=1, weight_shape=(8, 16)
+            )
+            executor = CpuExecutor(compiler.build_module(), mmap_weights=True).preload()
+            weights = [executor.weight(n) for n in executor.graph.nodes if n.tensor is not None]
+            self.assertTrue(all(not weight.flags.writeable for weight in weights))
+            del mapped, weights, executor
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools import stb
+from tools.khlnary_encoder import compile_python_with_functions
+from tools.khlnary_trace import (
+    KIND_TENSOR, KIND_VM, NO_HANDLE, TraceRecorder, decode_trace, diff_traces, main, read_trace,
+)
+from tools.khlnary_vm import KhlnaryVM
+
+from tests.fixtures import block_module, write_block_weights
+
+_LOOP = "x = 0\nwhile x < {n}:\n    x = x + 1\nx\n"
+
+
+def _trace_vm(src, trace):
+    words, functions = compile_python_with_functions(src)
+    return KhlnaryVM(words, functions).run(trace=trace)
+
+
+class TestTraceRecorder(unittest.TestCase):
+    def test_vm_replay_is_deterministic_and_diff_finds_divergence(self):
+        runs = []
+        for n in (5, 5, 6):
+            trace = TraceRecorder(1024)
+            self.assertEqual(_trace_vm(_LOOP.format(n=n), trace), n)
+            runs.append(trace.records())
+        first, again, longer = runs
+        self.assertTrue(all(r.kind == KIND_VM for r in first))
+        self.assertEqual([r.seq for r in first], list(range(len(first))))
+        self.assertEqual(first[0].pc, 0)
+        self.assertIsNone(diff_traces(first, again))
+
+        divergence = diff_traces(first, longer)
+        self.assertIsNotNone(divergence)
+        self.assertIn("word", divergence.fields)  # the loop bound constant differs
+        self.assertEqual(divergence.left.pc, divergence.right.pc)
+
+    def test_ring_keeps_latest_records_and_file_round_trips(self):
+        full = TraceRecorder(4096)
+        _trace_vm(_LOOP.format(n=20), full)
+        expected = full.records()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "run.ktr"
+            with TraceRecorder(16, path=path) as ring:
+                _trace_vm(_LOOP.format(n=20), ring)
+            self.assertEqual(path.stat().st_size, 32 + 16 * 40)
+            kept = read_trace(path)
+            self.assertEqual(ring.count, len(expected))
+            self.assertEqual([r.seq for r in kept], [r.seq for r in expected[-16:]])
+            self.assertIsNone(diff_traces(kept, expected[-16:]))
+
+            other = Path(tmp) / "other.ktr"
+            other.write_bytes(full.to_bytes())
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(main(["diff", str(path), str(path)]), 0)
+                self.assertEqual(main(["diff", str(path), str(other)]), 1)
+                self.assertEqual(main(["dump", str(path)]), 0)
+            self.assertIn("traces diverge at record 0", out.getvalue())
+
+        with self.assertRaises(ValueError):
+            decode_trace(b"NOPE" + bytes(28))
+
+    def test_handles_past_16_bits_round_trip(self):
+        trace = TraceRecorder(4)
+        trace.record(KIND_TENSOR, 70000, 0x12345678, 3, 70000, 65535, 1 << 31)
+        trace.record(KIND_TENSOR, 70001, 0x12345678, 0)
+        first, second = trace.records()
+        self.assertEqual((first.pc, first.out, first.in0, first.in1), (70000, 70000, 65535, 1 << 31))
+        self.assertEqual((second.out, second.in0, second.in1), (NO_HANDLE,) * 3)
+        self.assertNotEqual(first.in0, NO_HANDLE)
+
+    def test_cpu_executor_records_tensor_handles(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor
+
+        rng = np.random.default_rng(3)
+        with tempfile.TemporaryDirectory() as tmp:
+            write_block_weights(Path(tmp), rng)
+            module = block_module(Path(tmp))
+            executor = CpuExecutor(module)
+            x = rng.standard_normal((3, 8)).astype(np.float32)
+            trace = TraceRecorder()
+            np.testing.assert_array_equal(executor.run(x, trace=trace), executor.run(x))
+
+        records = trace.records()
+        nodes = executor.graph.nodes[1:]
+        self.assertEqual(len(records), len(nodes))
+        for record, node in zip(records, nodes):
+            self.assertEqual(record.kind, KIND_TENSOR)
+            self.assertEqual((record.pc, record.word), (node.knu_index, module.knus[node.knu_index]))
+            self.assertEqual((record.out, record.depth), (node.node_id, len(node.inputs)))
+            if node.inputs:
+                self.assertEqual(record.in0, node.inputs[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import copy
+import hashlib
+import unittest
+from unittest import mock
+
+from tools import khlnary_verify
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_encoder import encode_knu
+from tools.khlnary_verify import KhlNaryVerifyError, is_verified, require_verified, verify_module
+from tools.khlnary_vm import KhlnaryVM
+
+
+def _module():
+    compiler = KhlnaryCompiler()
+    compiler.compile_linear_layer(
+        weight_file="weights/l1.stb", weight_id=0, bias_file="weights/l1.stb", bias_id=1, weight_shape=(8, 16)
+    )
+    compiler.compile_python_block("def inc(a):\n    return a + 1\n\nx = 0\nwhile x < 3:\n    x = inc(x)\nx\n")
+    return compiler.build_module()
+
+
+def _broken_module():
+    module = _module()
+    module.knus[0] ^= 0x1  # parity
+    module.knus.append(encode_knu("G_JUMP8", profile_flags=1, payload=0x7F, ver=2))
+    module.knus.append(encode_knu("G_LOAD_BIN_TENSOR", payload=0x5F, ver=2))
+    module.knus.append(encode_knu("G_CALL", payload=9, ver=2, auth_class=3))
+    module.knus.append(encode_knu("G_NOP", ver=1))
+    return module
+
+
+class TestKhlnaryVerify(unittest.TestCase):
+    def test_clean_module_is_stamped_and_bound_to_its_contents(self):
+        module = _module()
+        report = verify_module(module)
+        self.assertTrue(report.ok, report.diagnostics)
+        self.assertEqual(module.metadata["verified"]["digest"], report.digest)
+        self.assertTrue(is_verified(module, max_authority=1))
+        self.assertFalse(is_verified(module, max_authority=0))
+        with mock.patch.object(khlnary_verify, "module_digest", side_effect=AssertionError("re-hashed")):
+            self.assertTrue(is_verified(module, max_authority=1))
+
+        module.knus[0] = encode_knu("G_NOP", ver=2)
+        self.assertFalse(is_verified(module, max_authority=1))
+
+    def test_certificates_cannot_be_forged_or_carried_over(self):
+        module = _module()
+        verify_module(module, max_authority=7)
+        self.assertFalse(is_verified(module, max_authority=1))
+
+        cert = dict(module.metadata["verified"], max_authority=1)
+        copied = copy.deepcopy(module)
+        copied.metadata["verified"] = cert
+        self.assertFalse(is_verified(copied, max_authority=1))
+
+        forged = copy.deepcopy(_module())
+        forged.metadata["verified"] = dict(cert, mac=hashlib.sha256(b"guess").hexdigest())
+        self.assertFalse(is_verified(forged, max_authority=7))
+        with mock.patch.object(khlnary_verify, "_CERT_KEY", b"another process"):
+            self.assertFalse(is_verified(module, max_authority=7))
+
+    def test_vm_trusts_verified_modules(self):
+        compiler = KhlnaryCompiler()
+        compiler.compile_python_block("def inc(a):\n    return a + 1\n\nx = 0\nwhile x < 3:\n    x = inc(x)\nx\n")
+        module = compiler.build_module()
+        require_verified(module)
+        with mock.patch("tools.khlnary_vm.decode_knu", side_effect=AssertionError("per-word decode")):
+            self.assertEqual(KhlnaryVM.from_module(module).run(), 3)
+
+    def test_diagnostics_are_typed_and_indexed(self):
+        module = _broken_module()
+        n = len(module.knus)
+        report = verify_module(module)
+        found = {(d.code, d.knu_index) for d in report.diagnostics}
+        self.assertEqual(
+            found,
+            {
+                ("parity", 0),
+                ("jump_bounds", n - 4),
+                ("unresolved_bin", n - 3),
+                ("authority", n - 2),
+                ("unresolved_function", n - 2),
+                ("version", n - 1),
+            },
+        )
+        self.assertNotIn("verified", module.metadata)
+        with self.assertRaises(KhlNaryVerifyError) as ctx:
+            require_verified(module)
+        self.assertIn("KNU 0", str(ctx.exception))
+
+    def test_pure_python_scan_matches_vectorized_scan(self):
+        if khlnary_verify.np is None:
+            self.skipTest("NumPy not available")
+        expected = verify_module(_broken_module(), stamp=False).diagnostics
+        with mock.patch.object(khlnary_verify, "np", None):
+            actual = verify_module(_broken_module(), stamp=False).diagnostics
+        self.assertEqual(sorted(actual, key=repr), sorted(expected, key=repr))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_encoder import compile_python_with_functions
+from tools.khlnary_vm import KhlNaryRuntimeError, KhlnaryVM
+
+
+def _run(src):
+    words, functions = compile_python_with_functions(src)
+    return KhlnaryVM(words, functions).run(max_steps=10_000)
+
+
+class TestKhlnaryVM(unittest.TestCase):
+    def test_expression_and_while_loop(self):
+        self.assertEqual(_run("1 + 2"), 3)
+        self.assertEqual(_run("x = 0\nwhile x < 5:\n    x = x + 1\nx\n"), 5)
+
+    def test_call_dispatches_through_function_table(self):
+        src = (
+            "def count(n):\n"
+            "    i = 0\n"
+            "    while i < n:\n"
+            "        i = i + 1\n"
+            "    return i\n"
+            "\n"
+            "def twice(a):\n"
+            "    return count(a) + count(a)\n"
+            "\n"
+            "twice(7)\n"
+        )
+        self.assertEqual(_run(src), 14)
+
+    def test_compiler_blocks_share_function_ids_and_rebase_entries(self):
+        compiler = KhlnaryCompiler()
+        compiler.compile_python_block("def inc(a):\n    return a + 1\n")
+        compiler.compile_python_block("if inc(1) == 2:\n    inc(41)\n")
+        module = compiler.build_module()
+        self.assertEqual(list(module.functions), [1])
+        self.assertEqual(KhlnaryVM.from_module(module).run(), 42)
+
+    def test_missing_function_entry_is_a_typed_error(self):
+        words, _ = compile_python_with_functions("def f():\n    return 1\n\nf()\n")
+        with self.assertRaises(KhlNaryRuntimeError):
+            KhlnaryVM(words, {}).run()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tools import khn
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_encoder import FunctionEntry
+from tools.khlnary_verify import is_verified, verify_module
+
+
+def _module():
+    compiler = KhlnaryCompiler()
+    compiler.compile_attention_layer(hidden_size=8, num_heads=2, file_path="weights/attn.stb")
+    compiler.compile_linear_layer(
+        weight_file="weights/l1.stb", weight_id=0, bias_file="weights/l1.stb", bias_id=1, weight_shape=(8, 16)
+    )
+    compiler.compile_python_block("def add(a, b):\n    return a + b\n")
+    return compiler.build_module()
+
+
+class TestKhnContainer(unittest.TestCase):
+    def test_round_trip_preserves_every_table(self):
+        module = _module()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = khn.write_khn(Path(tmp) / "m.khn", module)
+            self.assertEqual(path.stat().st_size % khn.KHN_ALIGN, 0)
+            loaded = khn.read_khn(path)
+
+        self.assertEqual(loaded.knus, module.knus)
+        self.assertEqual(loaded.bin_files, module.bin_files)
+        self.assertEqual(loaded.tensors, module.tensors)
+        self.assertEqual(loaded.functions, {1: FunctionEntry(func_id=1, entry_pc=9, end_pc=13, arity=2, num_locals=2)})
+        self.assertEqual(loaded.metadata, module.metadata)
+
+    def test_sections_are_aligned_and_parsed_lazily(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = khn.write_khn(Path(tmp) / "m.khn", _module())
+            with khn.KhnFile(path) as f:
+                for _, offset, _, _ in f.directory.values():
+                    self.assertEqual(offset % khn.KHN_ALIGN, 0)
+                self.assertNotIn("tensors", f.__dict__)
+                self.assertEqual(f.knu_count, 14)
+                self.assertEqual(len(f.tensors), 5)
+                self.assertIn("tensors", f.__dict__)
+
+    def test_compressed_knu_stream_round_trips_and_reverifies(self):
+        compiler = KhlnaryCompiler()
+        for _ in range(64):
+            compiler.compile_linear_layer(
+                weight_file="weights/l1.stb", weight_id=0, bias_file="weights/l1.stb", bias_id=1, weight_shape=(8, 8)
+            )
+        module = compiler.build_module()
+        self.assertTrue(verify_module(module).ok)
+        with tempfile.TemporaryDirectory() as tmp:
+            plain = khn.write_khn(Path(tmp) / "plain.khn", module)
+            for codec in khn.KNU_CODECS:
+                path = khn.write_khn(Path(tmp) / f"{codec}.khn", module, compress=codec)
+                with khn.KhnFile(path) as f:
+                    self.assertTrue(f.compressed)
+                    self.assertEqual(f.knu_count, len(module.knus))
+                    self.assertLess(f.directory[khn.SECTION_KNUZ][2], len(module.knus) * 4 // 8)
+                loaded = khn.read_khn(path)
+                self.assertEqual(loaded.knus, module.knus)
+                self.assertNotIn("verified", loaded.metadata)
+                self.assertTrue(verify_module(loaded).ok)
+                self.assertTrue(is_verified(loaded, max_authority=1))
+                self.assertLessEqual(path.stat().st_size, plain.stat().st_size, codec)
+
+    def test_knu_columns_without_numpy_and_corrupt_input(self):
+        knus = _module().knus
+        blob = khn.pack_knu_columns(knus)
+        with mock.patch.object(khn, "np", None):
+            self.assertEqual(khn.pack_knu_columns(knus), blob)
+            self.assertEqual(khn.unpack_knu_columns(blob, len(knus), khn.KNU_CODECS["zlib"]), knus)
+        with self.assertRaises(khn.KhnFormatError):
+            khn.pack_knu_columns([knus[0] ^ 1])
+        with self.assertRaises(khn.KhnFormatError):
+            khn.unpack_knu_columns(blob, len(knus) + 1, khn.KNU_CODECS["zlib"])
+        with self.assertRaises(khn.KhnFormatError):
+            khn.unpack_knu_columns(blob, len(knus), 9)
+        with self.assertRaises(khn.KhnFormatError):
+            khn.unpack_knu_columns(blob[:2], len(knus), khn.KNU_CODECS["zlib"])
+        for codec, codec_id in khn.KNU_CODECS.items():
+            packed = khn.pack_knu_columns(knus, codec)
+            flipped = packed[:8] + bytes(b ^ 0x5A for b in packed[8:16]) + packed[16:]
+            for bad in (packed[:-5], flipped, packed[: khn.KNUZ_HEADER.size]):
+                with self.subTest(codec=codec), self.assertRaises(khn.KhnFormatError):
+                    khn.unpack_knu_columns(bad, len(knus), codec_id)
+
+    def test_rejects_bare_word_stream(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "bare.khn"
+            path.write_bytes(b"\x02\x00\x00\x20" * 16)
+            with self.assertRaises(khn.KhnFormatError):
+                khn.KhnFile(path)
+
+    def test_rejects_truncated_or_inconsistent_directory(self):
+        data = bytearray(khn.encode_khn(_module()))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "bad.khn"
+
+            def check(blob):
+                path.write_bytes(bytes(blob))
+                with self.assertRaises(khn.KhnFormatError):
+                    khn.KhnFile(path)
+
+            check(b"")
+            check(data[: khn.HEADER.size])
+            short = bytearray(data)
+            short[6:8] = (4096).to_bytes(2, "little")  # section count
+            check(short)
+            bad_count = bytearray(data)
+            items = khn.HEADER.size + khn.DIRECTORY_ENTRY.size - 8  # KNUS item count
+            bad_count[items : items + 8] = (1000).to_bytes(8, "little")
+            check(bad_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+from tools.khlnary_bench import generated_kuhul_program, generated_program
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_encoder import compile_python_with_functions, encode_knu
+from tools.khlnary_vm import KhlnaryVM
+from tools.khlnary_verify import verify_module
+from tools.kuhul_frontend import KuhulSyntaxError, compile_kuhul_to_khlnary_words, compile_kuhul_with_functions
+
+KUHUL = """
+// count up to n
+func count(n) {
+    i = 0;
+    while (i < n) { i = i + 1; }
+    return i;
+}
+func add(a, b) { return a + b; }
+x = 0;
+if (x == 0) { x = add(count(7), 2); } else { x = 1; }
+x;
+"""
+
+PYTHON = """
+def count(n):
+    i = 0
+    while i < n:
+        i = i + 1
+    return i
+def add(a, b):
+    return a + b
+x = 0
+if x == 0:
+    x = add(count(7), 2)
+else:
+    x = 1
+x
+"""
+
+
+class TestKuhulFrontend(unittest.TestCase):
+    def test_lowers_exactly_like_the_python_subset(self):
+        words, functions = compile_kuhul_with_functions(KUHUL)
+        self.assertEqual((words, functions), compile_python_with_functions(PYTHON))
+        self.assertEqual(KhlnaryVM(words, functions).run(), 9)
+        big_kuhul = compile_kuhul_with_functions(generated_kuhul_program(60))
+        self.assertEqual(big_kuhul, compile_python_with_functions(generated_program(60)))
+
+    def test_glyph_and_tensor_statements(self):
+        src = "nop; const -3; jump -1; tensor(1, 2); prefetch(3); add; call 4;"
+        expected = [
+            encode_knu("G_NOP"),
+            encode_knu("G_CONST_I8", profile_flags=0x1, payload=0xFD),
+            encode_knu("G_JUMP8", profile_flags=0x1, payload=0xFF),
+            encode_knu("G_LOAD_BIN_TENSOR", profile_flags=0x2, payload=0x12),
+            encode_knu("G_PREFETCH_BIN", profile_flags=0x2, payload=3),
+            encode_knu("G_ADD_I32", arity=2),
+            encode_knu("G_CALL", profile_flags=0x1, payload=4),
+        ]
+        self.assertEqual(compile_kuhul_to_khlnary_words(src), expected)
+
+    def test_compiler_blocks_resolve_tensor_loads_and_functions(self):
+        compiler = KhlnaryCompiler()
+        compiler.compile_linear_layer(
+            weight_file="weights/l1.stb", weight_id=0, bias_file="weights/l1.stb", bias_id=1, weight_shape=(8, 16)
+        )
+        compiler.compile_kuhul_block("func inc(a) { return a + 1; }\nprefetch(0);\n")
+        compiler.compile_kuhul_block("load_tensor(0, 1);\ninc(41);\n")
+        module = compiler.build_module()
+        self.assertTrue(verify_module(module).ok)
+        self.assertEqual(list(module.functions), [1])
+
+    def test_syntax_errors_carry_positions(self):
+        cases = {
+            "x = 1": "line 1, column 6: expected ';'",
+            "x = 1;\ny = 2 * 3;": "line 2, column 7: only the '+'",
+            "x = 300;": "integer literal 300 outside",
+            "jump 200;": "int8 operand 200 outside",
+            "// note\n  x = $;": "line 2, column 7: unexpected character",
+            "while (x < 1) { x = x + 1;": "unterminated block",
+        }
+        for src, message in cases.items():
+            with self.assertRaises(KuhulSyntaxError) as ctx:
+                compile_kuhul_to_khlnary_words(src)
+            self.assertIn(message, str(ctx.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
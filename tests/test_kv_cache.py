@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools import stb
+
+from tests.fixtures import block_module, write_block_weights
+
+
+class TestKVCache(unittest.TestCase):
+    def setUp(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+
+    def test_incremental_decode_matches_causal_full_pass(self):
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor, attention_params, fused_attention, scaled_dot_product
+        from tools.kv_cache import DecodeSession
+
+        def causal(node, x, wq, wk, wv, out=None):
+            heads, scale = attention_params(node)
+            return scaled_dot_product(x, wq, wk, wv, scale, heads, causal=True)
+
+        rng = np.random.default_rng(7)
+        with tempfile.TemporaryDirectory() as tmp:
+            write_block_weights(Path(tmp), rng)
+            x = rng.standard_normal((12, 8)).astype(np.float32)
+            for fuse in (False, True):
+                module = block_module(Path(tmp), fuse=fuse)
+                kernels = {"G_SCALED_DOT_PRODUCT": causal, "G_FUSED_ATTENTION": causal}
+                expected = CpuExecutor(module).run(x, kernels=kernels)
+
+                session = DecodeSession(module, block_size=4, num_blocks=8)
+                steps = [session.step("a", x[:5])] + [session.step("a", x[i : i + 1]) for i in range(5, 12)]
+                np.testing.assert_allclose(np.concatenate(steps), expected, rtol=1e-5, atol=1e-6)
+                self.assertEqual(session.cache.free_blocks, 5)
+                session.end("a")
+                self.assertEqual(session.cache.free_blocks, 8)
+
+        q = rng.standard_normal((3, 70, 8)).astype(np.float32)
+        w = [rng.standard_normal((8, 8)).astype(np.float32) for _ in range(3)]
+        np.testing.assert_allclose(
+            fused_attention(q, *w, 0.5, 2, causal=True),
+            scaled_dot_product(q, *w, 0.5, 2, causal=True),
+            rtol=1e-5,
+            atol=1e-5,
+        )
+
+    def test_paging_window_and_eviction(self):
+        np = stb.np
+        from tools.kv_cache import KVCache, KVCacheEvictedError, KVCacheFullError
+
+        cache = KVCache(2, block_size=4, num_blocks=4, max_context=6)
+        rows = np.arange(20, dtype=np.float32).reshape(10, 2)
+        self.assertEqual(cache.append("a", 0, rows[:3], rows[:3]), 0)
+        self.assertEqual(cache.append("a", 0, rows[3:10], -rows[3:10]), 3)
+        cache.trim("a", 0)
+        blocks = list(cache.blocks("a", 0))
+        self.assertEqual([pos for pos, _, _ in blocks], [4, 8])
+        np.testing.assert_array_equal(np.concatenate([k for _, k, _ in blocks]), rows[4:10])
+        self.assertEqual((cache.length("a", 0), cache.free_blocks), (10, 2))
+
+        cache.append("b", 0, rows[:8], rows[:8])
+        cache.append("b", 0, rows[:1], rows[:1])
+        self.assertEqual((cache.evictions, cache.sequences()), (1, ["b"]))
+        self.assertTrue(cache.evicted("a"))
+        with self.assertRaises(KVCacheEvictedError):
+            cache.append("a", 0, rows[:1], rows[:1])
+
+        # A failed append (or multi-layer reservation) commits nothing.
+        with self.assertRaises(KVCacheFullError):
+            cache.append("b", 0, rows[:8], rows[:8])
+        with self.assertRaises(KVCacheFullError):
+            cache.reserve("b", (1, 2), 4)
+        self.assertEqual((cache.length("b", 0), cache.length("b", 1), cache.free_blocks), (9, 0, 1))
+        self.assertEqual([pos for pos, _, _ in cache.blocks("b", 0)], [0, 4, 8])
+
+        cache.free("a")
+        self.assertEqual(cache.append("a", 0, rows[:3], rows[:3]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
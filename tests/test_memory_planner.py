@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools import stb
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_memory import apply_memory_plan, plan_memory
+
+
+def _stacked_linears(compiler, weights_dir, layers=4):
+    path = str(weights_dir / "mlp.stb")
+    for layer in range(layers):
+        compiler.compile_linear_layer(
+            weight_file=path, weight_id=2 * layer, bias_file=path, bias_id=2 * layer + 1, weight_shape=(16, 16)
+        )
+        compiler.knus.append(compiler.encode_glyph("G_RELU"))
+
+
+class TestMemoryPlanner(unittest.TestCase):
+    def test_plan_reuses_buffers_and_never_aliases_live_tensors(self):
+        compiler = KhlnaryCompiler()
+        _stacked_linears(compiler, Path("weights"))
+        plan = plan_memory(compiler.build_module(), rows=32)
+
+        self.assertEqual(len(plan.buffers), 12)
+        self.assertEqual(plan.naive_bytes, 12 * 32 * 16 * 4)
+        self.assertLess(plan.arena_bytes, plan.naive_bytes)
+        self.assertGreaterEqual(plan.arena_bytes, plan.live_peak_bytes)
+        for a in plan.buffers:
+            self.assertEqual(a.offset % plan.alignment, 0)
+            for b in plan.buffers:
+                if a is not b and a.overlaps_in_time(b):
+                    self.assertTrue(a.offset + a.size <= b.offset or b.offset + b.size <= a.offset)
+
+    def test_plan_is_recorded_in_module_metadata(self):
+        compiler = KhlnaryCompiler()
+        _stacked_linears(compiler, Path("weights"), layers=2)
+        compiler.fuse_operators()
+        module = compiler.build_module()
+        plan = apply_memory_plan(module, rows=8)
+        self.assertEqual(module.metadata["memory_plan"]["arena_bytes"], plan.arena_bytes)
+        self.assertEqual(len(module.metadata["memory_plan"]["buffers"]), 2)
+
+    def test_cpu_executor_uses_arena_without_changing_results(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor
+
+        rng = np.random.default_rng(1)
+        with tempfile.TemporaryDirectory() as tmp:
+            weights_dir = Path(tmp)
+            stb.write_stb(
+                weights_dir / "mlp.stb",
+                [
+                    {"tensor_id": i, "array": rng.standard_normal((16, 16) if i % 2 == 0 else 16).astype(np.float16)}
+                    for i in range(8)
+                ],
+            )
+            compiler = KhlnaryCompiler()
+            _stacked_linears(compiler, weights_dir)
+            module = compiler.build_module()
+            x = rng.standard_normal((32, 16)).astype(np.float32)
+            expected = CpuExecutor(module).run(x)
+
+            apply_memory_plan(module, rows=32)
+            np.testing.assert_allclose(CpuExecutor(module).run(x), expected, rtol=1e-5)
+
+            apply_memory_plan(module, rows=32, elem_bytes=2)
+            self.assertEqual(CpuExecutor(module).arena_views(x), {})
+            np.testing.assert_allclose(CpuExecutor(module).run(x), expected, rtol=1e-5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools import stb
+from tools.khlnary_compiler import KhlnaryCompiler, build_graph
+from tools.kuhul_glyphs import FUSED_ACTIVATIONS
+
+from tests.fixtures import transformer_block, write_block_weights
+
+
+class TestOperatorFusion(unittest.TestCase):
+    def test_linear_gelu_chain_fuses_into_one_glyph(self):
+        compiler = KhlnaryCompiler()
+        compiler.compile_linear_layer(
+            weight_file="weights/l1.stb", weight_id=0, bias_file="weights/l1.stb", bias_id=1, weight_shape=(8, 16)
+        )
+        compiler.knus.append(compiler.encode_glyph("G_GELU"))
+        report = compiler.fuse_operators(rows=32)
+
+        module = compiler.build_module()
+        glyph_ids = [((w >> 20) & 0xFF) for w in module.knus]
+        self.assertEqual(glyph_ids, [0x30, 0x30, 0x43])
+        self.assertEqual((module.knus[-1] >> 4) & 0xFF, FUSED_ACTIVATIONS["gelu"])
+        self.assertEqual(report.fused_linear, 1)
+        self.assertLess(report.traffic_after, report.traffic_before)
+        self.assertEqual(module.metadata["fusion"]["knus_after"], 3)
+
+    def test_attention_chain_fuses_and_residual_add_is_kept(self):
+        compiler = KhlnaryCompiler()
+        transformer_block(compiler, Path("weights"))
+        report = compiler.fuse_operators(rows=128)
+
+        glyph_ids = [((w >> 20) & 0xFF) for w in compiler.knus]
+        self.assertEqual(glyph_ids, [0x30, 0x30, 0x30, 0x62, 0x30, 0x30, 0x43, 0x30, 0x30, 0x43, 0x41])
+        self.assertEqual(report.fused_attention, 1)
+        self.assertEqual(report.fused_linear, 2)
+        graph = build_graph(compiler.knus, compiler.tensors)
+        self.assertEqual(graph.nodes[graph.output].inputs[1], 0)
+        self.assertLess(report.traffic_after, report.traffic_before / 2)
+
+    def test_fused_module_matches_unfused_on_cpu(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor
+
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            weights_dir = Path(tmp)
+            write_block_weights(weights_dir, rng)
+
+            plain, fused = KhlnaryCompiler(), KhlnaryCompiler()
+            transformer_block(plain, weights_dir)
+            transformer_block(fused, weights_dir)
+            fused.fuse_operators()
+
+            x = rng.standard_normal((130, 8)).astype(np.float32)
+            expected = CpuExecutor(plain.build_module()).run(x)
+            actual = CpuExecutor(fused.build_module()).run(x)
+            self.assertEqual(actual.shape, (130, 8))
+            np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
+import tempfile
 import unittest
+from pathlib import Path
 
 from tools import stb
 
@@ -19,6 +21,38 @@ class TestStbHelpers(unittest.TestCase):
         with self.assertRaises(stb.StbDependencyError):
             stb.write_stb("any.stb", [])
 
+    def test_round_trip_reads_data_region_from_data_offset(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        w = np.arange(12, dtype=np.float16).reshape(3, 4)
+        b = np.arange(4, dtype=np.float16) + 100
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "two.stb"
+            stb.write_stb(path, [{"tensor_id": 0, "array": w}, {"tensor_id": 1, "array": b}])
+            tensors = stb.read_stb(path)
+            layout = stb.read_stb_layout(path)
+        np.testing.assert_array_equal(tensors[0]["array"], w)
+        np.testing.assert_array_equal(tensors[1]["array"], b)
+        self.assertEqual(layout["data_offset"], 128)
+        self.assertEqual(layout["tensors"][1]["offset"] - layout["data_offset"], w.nbytes)
+
+    def test_int4_tensors_are_packed_two_per_byte(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        values = np.array([[-8, 7, 0], [1, -1, 3]], dtype=np.int8)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "q.stb"
+            stb.write_stb(path, [{"tensor_id": 0, "array": values, "dtype": "int4"}])
+            tensors = stb.read_stb(path)
+            layout = stb.read_stb_layout(path)
+        self.assertEqual(layout["tensors"][0]["size_bytes"], 3)
+        self.assertEqual(tensors[0]["dtype_enum"], stb.INT4_ENUM)
+        np.testing.assert_array_equal(tensors[0]["array"], values)
+        with self.assertRaises(ValueError):
+            stb.pack_int4([8])
+
 
 if __name__ == "__main__":
     unittest.main()
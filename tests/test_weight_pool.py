@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools import stb
+
+from tests.fixtures import block_module, write_block_weights
+
+
+def _sum_weights(handle, keys, results):
+    from tools.weight_pool import attach
+
+    with attach(handle) as pool:
+        results.put([float(pool.tensor(*key).sum()) for key in keys])
+
+
+def _attach_and_die(handle):
+    from tools.weight_pool import attach
+
+    attach(handle)
+    os._exit(0)
+
+
+class TestWeightPool(unittest.TestCase):
+    def setUp(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        write_block_weights(Path(self.tmp.name), stb.np.random.default_rng(5))
+        self.module = block_module(Path(self.tmp.name))
+
+    def test_views_are_shared_read_only_float32(self):
+        from tools.weight_pool import WeightPool, attach
+
+        np = stb.np
+        with WeightPool.from_module(self.module) as pool:
+            self.assertEqual(len(pool.handle.entries), len(self.module.tensors))
+            with attach(pool.handle) as worker:
+                self.assertEqual(pool.refcount, 1)
+                for t in self.module.tensors:
+                    expected = stb.read_stb(self.module.bin_files[t.file_id])[t.tensor_id]["array"]
+                    view = worker.tensor(t.file_id, t.tensor_id)
+                    self.assertEqual(view.dtype, np.float32)
+                    self.assertFalse(view.flags.owndata or view.flags.writeable)
+                    np.testing.assert_array_equal(view, expected.astype(np.float32))
+                    self.assertEqual(view.__array_interface__["data"][0] % 64, 0)
+            self.assertEqual(pool.refcount, 0)
+            self.assertTrue(pool.close())
+        with self.assertRaises(FileNotFoundError):
+            attach(pool.handle)
+
+    def test_worker_processes_attach_and_detach(self):
+        from tools.weight_pool import WeightPool
+
+        keys = sorted({(t.file_id, t.tensor_id) for t in self.module.tensors})
+        with WeightPool.from_module(self.module) as pool:
+            results = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=_sum_weights, args=(pool.handle, keys, results)) for _ in range(3)]
+            for p in procs:
+                p.start()
+            sums = [results.get(timeout=30) for _ in procs]
+            for p in procs:
+                p.join(timeout=30)
+            expected = [float(pool.tensor(*key).sum()) for key in keys]
+            self.assertEqual(sums, [expected] * 3)
+            self.assertTrue(pool.close(timeout=5))
+
+    def test_spawn_context_workers(self):
+        from tools.weight_pool import WeightPool
+
+        ctx = multiprocessing.get_context("spawn")
+        keys = sorted({(t.file_id, t.tensor_id) for t in self.module.tensors})
+        with WeightPool.from_module(self.module, mp_context=ctx) as pool:
+            results = ctx.Queue()
+            proc = ctx.Process(target=_sum_weights, args=(pool.handle, keys, results))
+            proc.start()
+            sums = results.get(timeout=60)
+            proc.join(timeout=60)
+            self.assertEqual(sums, [float(pool.tensor(*key).sum()) for key in keys])
+            self.assertTrue(pool.close(timeout=5))
+
+    def test_close_does_not_wait_for_dead_workers(self):
+        from tools.weight_pool import WeightPool
+
+        with WeightPool.from_module(self.module) as pool:
+            proc = multiprocessing.Process(target=_attach_and_die, args=(pool.handle,))
+            proc.start()
+            proc.join(timeout=30)
+            self.assertEqual(pool.refcount, 1)
+            self.assertTrue(pool.close(timeout=None))
+            self.assertEqual(proc.exitcode, 0)
+
+    def test_executor_runs_from_the_pool(self):
+        from tools.khlnary_cpu import CpuExecutor
+        from tools.weight_pool import WeightPool
+
+        x = stb.np.random.default_rng(1).standard_normal((4, 8)).astype(stb.np.float32)
+        with WeightPool.from_module(self.module) as pool:
+            executor = CpuExecutor(self.module, weight_pool=pool).preload()
+            self.assertEqual(executor._files, {})
+            stb.np.testing.assert_array_equal(executor.run(x), CpuExecutor(self.module).run(x))
+            del executor
+
+
+if __name__ == "__main__":
+    unittest.main()
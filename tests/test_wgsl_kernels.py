@@ -0,0 +1,267 @@
+import json
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from tools import stb
+from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khlnary_webgpu import WebGpuBackend, matmul_tile_config, plan_stb_ranges, plan_storage_bindings
+
+from tests.fixtures import block_module, transformer_block, write_block_weights
+
+
+class TestWgslKernels(unittest.TestCase):
+    def test_tile_config_follows_weight_shape(self):
+        self.assertEqual(matmul_tile_config(8, 16).workgroup_size, (16, 16, 1))
+        tile = matmul_tile_config(6, 3)
+        self.assertEqual((tile.tile_m, tile.tile_n, tile.tile_k), (16, 2, 4))
+
+    def test_program_emits_one_entry_point_per_dispatch(self):
+        compiler = KhlnaryCompiler()
+        transformer_block(compiler, Path("weights"))
+        compiler.fuse_operators()
+        program = WebGpuBackend().build_program(compiler.build_module())
+
+        kinds = [d.kind for d in program.dispatches]
+        self.assertEqual(kinds, ["matmul", "matmul", "matmul", "attention", "matmul", "matmul", "add"])
+        for d in program.dispatches:
+            self.assertIn(f"fn {d.entry_point}(", program.source)
+        self.assertIn("var<workgroup> k9_matmul_tile_a : array<f32, 256>;", program.source)
+        self.assertIn("@compute @workgroup_size(16, 16, 1)", program.source)
+        self.assertEqual(program.dispatches[-1].output.buffer, "output_buffer")
+        self.assertEqual(program.dispatches[3].workgroups(130), (3, 2, 1))
+
+    def test_emulated_kernels_match_cpu_executor(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor
+        from tools.wgsl_emulator import emulate_program, load_storage_buffers
+
+        rng = np.random.default_rng(1)
+        with tempfile.TemporaryDirectory() as tmp:
+            weights_dir = Path(tmp)
+            write_block_weights(weights_dir, rng)
+            x = rng.standard_normal((2, 37, 8)).astype(np.float32)
+            for fuse in (False, True):
+                compiler = KhlnaryCompiler()
+                transformer_block(compiler, weights_dir)
+                compiler.knus.append(compiler.encode_glyph("G_SOFTMAX"))
+                if fuse:
+                    compiler.fuse_operators()
+                module = compiler.build_module()
+                program = WebGpuBackend().build_program(module)
+                actual = emulate_program(program, x, load_storage_buffers(program))
+                expected = CpuExecutor(module).run(x)
+                np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-5)
+
+    def test_each_stb_file_is_bound_once_with_offset_slots(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        rng = stb.np.random.default_rng(2)
+        with tempfile.TemporaryDirectory() as tmp:
+            write_block_weights(Path(tmp), rng)
+            module = block_module(Path(tmp))
+            plan = plan_storage_bindings(module)
+            program = WebGpuBackend().build_program(module)
+
+        self.assertEqual([f.name for f in plan.files], ["stb_file_0", "stb_file_1", "stb_file_2"])
+        self.assertEqual(plan.offsets_uniform(), [0, 64, 128, 0, 128, 0, 128, 0])
+        self.assertEqual(program.source.count("var<storage, read> stb_file_"), 3)
+        self.assertIn(
+            "unpack2x16float(stb_file_0[(tensor_offsets.slots[0u].z + kk * 8u + c) >> 1u])", program.source
+        )
+
+    def _stream_with_node(self, plan, tmp, *, chunk_bytes, honor_range=True):
+        """Run the streaming loader against a fetch that trickles 7-byte pieces (whole files without Range)."""
+
+        node = shutil.which("node")
+        if node is None:
+            self.skipTest("node not available")
+        script = Path(tmp) / "run.js"
+        script.write_text(
+            WebGpuBackend.generate_javascript_loader(plan)
+            + f"const CHUNK_BYTES = {chunk_bytes};\n"
+            + f"const HONOR_RANGE = {str(honor_range).lower()};\n"
+            + """
+const fs = require('fs');
+globalThis.GPUBufferUsage = { STORAGE: 1, UNIFORM: 2, COPY_DST: 4 };
+const requests = [];
+globalThis.fetch = async (url, init) => {
+  const data = fs.readFileSync(url);
+  const [, a, b] = HONOR_RANGE ? /bytes=(\\d+)-(\\d+)/.exec(init.headers.Range) : [, 0, data.length - 1];
+  const body = data.subarray(Number(a), Math.min(Number(b) + 1, data.length));
+  requests.push([url, Number(a), Number(a) + body.length]);
+  let pos = 0;
+  const stream = new ReadableStream({
+    pull(controller) {
+      if (pos >= body.length) return controller.close();
+      controller.enqueue(new Uint8Array(body.subarray(pos, pos + 7)));
+      pos += 7;
+    },
+  });
+  return {
+    ok: true, status: HONOR_RANGE ? 206 : 200, body: stream,
+    arrayBuffer: async () => body.buffer.slice(body.byteOffset, body.byteOffset + body.byteLength),
+  };
+};
+const writes = [];
+const device = {
+  createBuffer: (desc) => ({ bytes: new Uint8Array(desc.size) }),
+  queue: {
+    writeBuffer: (buffer, offset, data, dataOffset = 0, size) => {
+      const src = new Uint8Array(data.buffer, data.byteOffset + dataOffset, size ?? data.byteLength - dataOffset);
+      buffer.bytes.set(src, offset);
+      writes.push(src.byteLength);
+      buffer.last = Array.from(new Uint32Array(src.slice().buffer));
+    },
+  },
+};
+(async () => {
+  const { files, tensorOffsets } = await loadKHlnaryStorage(device, KHLNARY_STORAGE, { chunkBytes: CHUNK_BYTES });
+  const buffers = {};
+  for (const [fileId, { buffer }] of files) buffers[fileId] = Array.from(buffer.bytes);
+  console.log(JSON.stringify({ requests, writes, buffers, offsets: tensorOffsets.last }));
+})();
+""",
+            encoding="utf-8",
+        )
+        return json.loads(subprocess.run([node, str(script)], capture_output=True, check=True, text=True).stdout)
+
+    def test_js_loader_streams_each_file_once_and_fills_offsets(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        from tools.wgsl_emulator import load_storage_buffers
+
+        rng = stb.np.random.default_rng(3)
+        with tempfile.TemporaryDirectory() as tmp:
+            write_block_weights(Path(tmp), rng)
+            program = WebGpuBackend().build_program(block_module(Path(tmp)))
+            plan = program.binding_plan
+            result = self._stream_with_node(plan, tmp, chunk_bytes=1 << 20)
+            storage = load_storage_buffers(program)
+
+        # Files stream concurrently; the offsets uniform is written last.
+        self.assertEqual(sorted(result["writes"][:-1]), [272, 288, 384])
+        self.assertEqual(result["writes"][-1], 32)
+        self.assertEqual(result["offsets"], plan.offsets_uniform())
+        for storage_file in plan.files:
+            expected = storage[storage_file.name].view(stb.np.uint8).tolist()
+            self.assertEqual(result["buffers"][str(storage_file.file_id)], expected)
+
+    def test_js_loader_requests_only_referenced_ranges_in_chunks(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        from tools.wgsl_emulator import load_storage_buffers
+
+        rng = np.random.default_rng(5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "big.stb"
+            stb.write_stb(
+                path,
+                [
+                    {"tensor_id": 0, "array": rng.standard_normal((8, 16)).astype(np.float16)},
+                    {"tensor_id": 9, "array": np.zeros(3000, dtype=np.float32)},
+                    {"tensor_id": 1, "array": rng.standard_normal(16).astype(np.float32)},
+                ],
+            )
+            compiler = KhlnaryCompiler()
+            compiler.compile_linear_layer(
+                weight_file=str(path), weight_id=0, bias_file=str(path), bias_id=1, weight_shape=(8, 16)
+            )
+            program = WebGpuBackend().build_program(compiler.build_module())
+            plan = program.binding_plan
+            result = self._stream_with_node(plan, tmp, chunk_bytes=64)
+            storage = load_storage_buffers(program)
+
+        self.assertEqual([(r.start, r.end, r.dest) for r in plan.ranges[0]], [(128, 384, 0), (12384, 12448, 256)])
+        self.assertEqual([r[1:] for r in result["requests"]], [[0, 544], [128, 384], [12384, 12448]])
+        self.assertEqual(result["writes"], [64] * 5 + [16])
+        self.assertEqual(result["buffers"]["0"], storage["stb_file_0"].view(np.uint8).tolist())
+        self.assertEqual(result["offsets"], plan.offsets_uniform())
+
+    def test_js_loader_downloads_once_when_the_server_ignores_range(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        from tools.wgsl_emulator import load_storage_buffers
+
+        rng = stb.np.random.default_rng(3)
+        with tempfile.TemporaryDirectory() as tmp:
+            write_block_weights(Path(tmp), rng)
+            program = WebGpuBackend().build_program(block_module(Path(tmp)))
+            plan = program.binding_plan
+            result = self._stream_with_node(plan, tmp, chunk_bytes=64, honor_range=False)
+            storage = load_storage_buffers(program)
+            sizes = {f.path: Path(f.path).stat().st_size for f in plan.files}
+
+        self.assertEqual(sorted(r[0] for r in result["requests"]), sorted(sizes))
+        self.assertEqual({r[0]: r[2] for r in result["requests"]}, sizes)
+        self.assertEqual(result["offsets"], plan.offsets_uniform())
+        for storage_file in plan.files:
+            expected = storage[storage_file.name].view(stb.np.uint8).tolist()
+            self.assertEqual(result["buffers"][str(storage_file.file_id)], expected)
+
+    def test_range_planner_merges_small_gaps_and_keeps_alignment(self):
+        layout = {
+            "data_offset": 64,
+            "file_size": 64 + 10_000,
+            "tensors": {
+                0: {"offset": 64, "size_bytes": 6},
+                1: {"offset": 70, "size_bytes": 10},
+                2: {"offset": 64 + 9_000, "size_bytes": 8},
+            },
+        }
+        ranges, packed = plan_stb_ranges(layout, [2, 1, 0], max_gap=4096)
+        self.assertEqual([(r.start, r.end, r.dest) for r in ranges], [(64, 80, 0), (9064, 9072, 16)])
+        self.assertEqual(packed, {0: 0, 1: 6, 2: 16})
+        merged, _ = plan_stb_ranges(layout, [0, 2], max_gap=10_000)
+        self.assertEqual([(r.start, r.end) for r in merged], [(64, 9072)])
+
+    def test_quantized_weights_stay_packed_and_match_cpu(self):
+        if stb.np is None:
+            self.skipTest("NumPy not available")
+        np = stb.np
+        from tools.khlnary_cpu import CpuExecutor
+        from tools.wgsl_emulator import emulate_program, load_storage_buffers
+
+        rng = np.random.default_rng(4)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "q.stb"
+            stb.write_stb(
+                path,
+                [
+                    {"tensor_id": 0, "array": rng.integers(-8, 8, (8, 16)), "dtype": "int4"},
+                    {"tensor_id": 1, "array": rng.integers(-128, 128, 16).astype(np.int8)},
+                    {"tensor_id": 2, "array": rng.standard_normal((16, 8)).astype(np.float32)},
+                    {"tensor_id": 3, "array": rng.standard_normal(8).astype(np.float16)},
+                ],
+            )
+            compiler = KhlnaryCompiler()
+            compiler.compile_linear_layer(
+                weight_file=str(path), weight_id=0, bias_file=str(path), bias_id=1, weight_shape=(8, 16)
+            )
+            compiler.knus.append(compiler.encode_glyph("G_RELU"))
+            compiler.compile_linear_layer(
+                weight_file=str(path), weight_id=2, bias_file=str(path), bias_id=3, weight_shape=(16, 8)
+            )
+            module = compiler.build_module()
+            program = WebGpuBackend().build_program(module)
+            storage = load_storage_buffers(program)
+
+            x = rng.standard_normal((5, 8)).astype(np.float32)
+            np.testing.assert_allclose(
+                emulate_program(program, x, storage), CpuExecutor(module).run(x), rtol=1e-5, atol=1e-4
+            )
+
+        self.assertEqual([t.dtype for t in module.tensors], ["int4", "int8", "float32", "float16"])
+        self.assertEqual(storage["stb_file_0"].nbytes, 64 + 16 + 512 + 16)
+        self.assertIn("var<storage, read> stb_file_0 : array<u32>;", program.source)
+        self.assertIn("* 4u, 4u))", program.source)
+        self.assertNotIn("f16", program.source.replace("unpack2x16float", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+"""Content-addressed on-disk cache for generated KHΛNARY build artifacts.
+
+Artifacts (WGSL, JS loader glue, .khn containers) are a pure function of the
+KNU stream, the bin/tensor/function tables, the .stb layouts they address and
+the backend version. `artifact_key` hashes exactly those inputs; an entry is a
+directory `<root>/<key>/` holding one file per artifact plus a manifest.
+Entries are touched on every hit and the least recently used ones are pruned
+once the cache holds more than `max_entries`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from tools import khlnary_metrics as metrics
+from tools import stb
+from tools.khlnary_verify import module_digest
+
+MANIFEST = "manifest.json"
+
+
+def artifact_key(module, *, kind: str, backend_version: object) -> str:
+    """SHA-256 over everything a generated artifact of `kind` depends on."""
+
+    h = hashlib.sha256()
+    h.update(f"{kind}:{backend_version}\n".encode("utf-8"))
+    h.update(module_digest(module).encode("ascii"))
+    h.update(json.dumps(module.metadata, sort_keys=True, default=str).encode("utf-8"))
+    for file_id, path in sorted(module.bin_files.items()):
+        layout = stb.read_stb_layout(path) if Path(path).is_file() else None
+        h.update(json.dumps([file_id, str(path), layout], sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _umask_at_import() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Toggling the umask is process-global, so it is only done once, at import.
+_IMPORT_UMASK = _umask_at_import()
+
+
+def _umask() -> int:
+    """The current umask, read from /proc where available so it is never toggled."""
+
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    return _IMPORT_UMASK
+
+
+def write_if_changed(path, data: bytes) -> bool:
+    """Atomically write `data` unless `path` already holds exactly these bytes.
+
+    The file keeps its existing permissions, or gets the usual `0o666 & ~umask`
+    when new (not `mkstemp`'s owner-only 0600).
+    """
+
+    path = Path(path)
+    if path.is_file() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    mode = path.stat().st_mode & 0o7777 if path.is_file() else 0o666 & ~_umask()
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
+
+
+class ArtifactCache:
+    def __init__(self, root, *, max_entries: int = 32) -> None:
+        self.root = Path(root)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, key: str) -> Path:
+        if not key or not all(c in "0123456789abcdef" for c in key):
+            raise ValueError(f"Invalid artifact key: {key!r}")
+        return self.root / key
+
+    def entries(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / MANIFEST).is_file())
+
+    def get(self, key: str) -> Optional[Dict[str, bytes]]:
+        entry = self._entry(key)
+        manifest = entry / MANIFEST
+        if not manifest.is_file():
+            return None
+        names = json.loads(manifest.read_text(encoding="utf-8"))["artifacts"]
+        try:
+            artifacts = {name: (entry / name).read_bytes() for name in names}
+        except FileNotFoundError:
+            return None
+        os.utime(manifest)
+        return artifacts
+
+    def put(self, key: str, artifacts: Mapping[str, bytes]) -> None:
+        entry = self._entry(key)
+        for name in artifacts:
+            if name == MANIFEST or Path(name).name != name or name.startswith("."):
+                raise ValueError(f"Invalid artifact name: {name!r}")
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=".staging-"))
+        try:
+            os.chmod(staging, 0o777 & ~_umask())
+            for name, data in artifacts.items():
+                (staging / name).write_bytes(data)
+            (staging / MANIFEST).write_text(json.dumps({"key": key, "artifacts": sorted(artifacts)}), encoding="utf-8")
+            try:
+                os.replace(staging, entry)
+            except OSError:
+                # Keys are content addresses: a complete entry written by a
+                # concurrent `put` holds the same artifacts, so keep it. Only an
+                # entry without a manifest (an interrupted prune) is replaced.
+                if (entry / MANIFEST).is_file():
+                    return
+                shutil.rmtree(entry, ignore_errors=True)
+                os.replace(staging, entry)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        self.prune()
+
+    def get_or_build(self, key: str, build: Callable[[], Mapping[str, bytes]]) -> Tuple[Dict[str, bytes], bool]:
+        """Return `(artifacts, hit)`; `build` runs only on a miss."""
+
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            metrics.inc("khlnary_artifact_cache_hits_total")
+            return cached, True
+        self.misses += 1
+        metrics.inc("khlnary_artifact_cache_misses_total")
+        artifacts = dict(build())
+        self.put(key, artifacts)
+        return artifacts, False
+
+    def prune(self, max_entries: Optional[int] = None) -> List[str]:
+        """Drop least recently used entries beyond `max_entries`; return removed keys."""
+
+        limit = self.max_entries if max_entries is None else max_entries
+        keys = self.entries()
+        if len(keys) <= limit:
+            return []
+        keys.sort(key=lambda k: (self.root / k / MANIFEST).stat().st_mtime_ns)
+        removed = keys[: len(keys) - limit]
+        for key in removed:
+            shutil.rmtree(self.root / key, ignore_errors=True)
+        return removed
+
+
+__all__ = ["ArtifactCache", "artifact_key", "write_if_changed"]
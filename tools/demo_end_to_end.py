@@ -10,9 +10,9 @@ from pathlib import Path
 if __package__ is None or __package__ == "":
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-import struct
-
+from tools.artifact_cache import ArtifactCache, artifact_key, write_if_changed
 from tools.khlnary_compiler import KhlnaryCompiler
+from tools.khn import KHN_VERSION, encode_khn
 from tools.khlnary_webgpu import WebGpuBackend
 from tools.stb import write_stb
 
@@ -64,23 +64,26 @@ def compile_module() -> object:
         weight_shape=(16, 8),
     )
     compiler.knus.append(compiler.encode_glyph("G_TENSOR_ADD"))
+    compiler.fuse_operators()
     return compiler.build_module()
 
 
-def generate_artifacts(module) -> None:
-    webgpu = WebGpuBackend()
-    Path("khlnary.wgsl").write_text(webgpu.generate_wgsl_shader(module), encoding="utf-8")
-    Path("khlnary.js").write_text(webgpu.generate_javascript_loader(), encoding="utf-8")
-
-    with Path("transformer_layer.khn").open("wb") as f:
-        f.write(struct.pack(f"<{len(module.knus)}I", *module.knus))
+def generate_artifacts(module, cache_dir: Path = Path(".khlnary-cache")) -> list:
+    """Write WGSL/JS/.khn artifacts, skipping generation and writes that are unchanged."""
+    cache = ArtifactCache(cache_dir)
+    outputs = {name: text.encode("utf-8") for name, text in WebGpuBackend(cache).build_artifacts(module).items()}
+    khn_key = artifact_key(module, kind="khn", backend_version=KHN_VERSION)
+    khn, _ = cache.get_or_build(khn_key, lambda: {"transformer_layer.khn": encode_khn(module)})
+    outputs.update(khn)
+    return [name for name, data in outputs.items() if write_if_changed(Path(name), data)]
 
 
 def main() -> None:
     create_demo_weights(Path("weights"))
     module = compile_module()
-    generate_artifacts(module)
+    written = generate_artifacts(module)
     print(f"Generated {len(module.knus)} KNU words")
+    print(f"Updated {len(written)} artifact(s): {', '.join(written) or 'none (unchanged)'}")
     print("Artifacts: weights/*.stb, transformer_layer.khn, khlnary.wgsl, khlnary.js")
 
 
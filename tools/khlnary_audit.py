@@ -0,0 +1,341 @@
+"""Batched, asynchronous audit log for tensor access and authority decisions.
+
+Producers call `AuditLog.record(...)` on the hot path. It applies
+per-action sampling and token-bucket rate limits, then appends one
+event tuple to an in-memory ring (a `collections.deque`, whose
+`append`/`popleft` are atomic, so producers never take a lock). When the ring
+holds `capacity` events, new ones are dropped and counted rather than
+blocking execution. Deny outcomes bypass sampling and rate limits.
+
+A background writer thread wakes every `flush_interval` seconds. It drains
+the ring in batches of up to `batch_size`, runs the `filters` stage, and
+appends each batch to the current segment file as one compressed frame:
+
+    magic "KAL1" | payload length u32 | crc32 u32 | event count u32 | zlib(JSON array of event rows)
+
+Segment files (`audit-000001.kal`, ...) are append-only. The writer rolls
+to a new one past `segment_bytes`. `read_audit_log` replays every
+segment in order and stops at a torn final frame.
+
+The writer never dies on a bad batch. A filter that raises keeps the event,
+and a failed write (for example a full disk) puts the batch back at the head
+of the ring for the next flush. Both count toward `AuditStats.errors`.
+
+    with AuditLog("audit/", sample={"tensor_load": 0.1}, rate_limit={"tensor_load": 1000}) as audit:
+        CpuExecutor(module, audit=audit).run(x)
+        verify_module(module, audit=audit)
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+import json
+from pathlib import Path
+import random
+import struct
+import threading
+import time
+from typing import Callable, Deque, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence
+import zlib
+
+FRAME_MAGIC = b"KAL1"
+FRAME = struct.Struct("<4sIII")
+SEGMENT_PATTERN = "audit-{:06d}.kal"
+
+DEFAULT_CAPACITY = 1 << 16
+DEFAULT_BATCH_SIZE = 4096
+DEFAULT_FLUSH_INTERVAL = 0.05
+DEFAULT_SEGMENT_BYTES = 8 << 20
+
+ALLOW = "allow"
+DENY = "deny"
+
+
+class AuditEvent(NamedTuple):
+    ts_ns: int
+    actor: str
+    action: str  # e.g. "tensor_load", "authority_check"
+    resource: str  # e.g. "bin:1/tensor:2"
+    outcome: str  # ALLOW / DENY
+    severity: str
+    knu_index: int
+    authority: int  # AUTH_CLASS of the KNU involved
+    trace_id: Optional[str]
+
+
+class AuditLogError(ValueError):
+    """Raised when an audit segment is corrupt before its final frame."""
+
+
+@dataclass(frozen=True)
+class AuditStats:
+    """Counters since start; hot-path counts are approximate under concurrent producers."""
+
+    recorded: int
+    sampled_out: int
+    rate_limited: int
+    dropped: int
+    filtered: int
+    written: int
+    segments: int
+    errors: int  # filter exceptions and failed writes (the writer keeps running)
+    lost: int  # events discarded because their batch could not be encoded
+
+
+class AuditLog:
+    def __init__(
+        self,
+        directory,
+        *,
+        actor: str = "local",
+        capacity: int = DEFAULT_CAPACITY,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        sample: Optional[Mapping[str, float]] = None,
+        rate_limit: Optional[Mapping[str, float]] = None,
+        filters: Sequence[Callable[[AuditEvent], bool]] = (),
+        compress_level: int = 6,
+    ) -> None:
+        self.directory = Path(directory)
+        self.actor = actor
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.sample = dict(sample or {})
+        self.rate_limit = dict(rate_limit or {})
+        self.filters = list(filters)
+        self.compress_level = compress_level
+
+        self._ring: Deque[tuple] = deque()
+        self._policed = bool(self.sample or self.rate_limit)
+        self._buckets: Dict[str, List[float]] = {
+            action: [rate, time.monotonic()] for action, rate in self.rate_limit.items()
+        }
+        self._recorded = self._sampled_out = self._rate_limited = self._dropped = 0
+        self._filtered = self._written = self._errors = self._lost = 0
+        self.last_error: Optional[BaseException] = None
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._segment = None
+        self._segment_index = 0
+
+    # ------------------------------------------------------------
+    # Hot path
+    # ------------------------------------------------------------
+
+    def record(
+        self,
+        action: str,
+        resource: str,
+        outcome: str = ALLOW,
+        *,
+        severity: str = "info",
+        actor: Optional[str] = None,
+        knu_index: int = -1,
+        authority: int = 0,
+        trace_id: Optional[str] = None,
+    ) -> bool:
+        """Queue one event; returns False if it was sampled out, rate limited or dropped."""
+
+        if self._policed and outcome != DENY:
+            rate = self.sample.get(action)
+            if rate is not None and random.random() >= rate:
+                self._sampled_out += 1
+                return False
+            bucket = self._buckets.get(action)
+            if bucket is not None and not self._take_token(bucket, self.rate_limit[action]):
+                self._rate_limited += 1
+                return False
+        if len(self._ring) >= self.capacity:
+            self._dropped += 1
+            return False
+        # Plain tuples keep the hot path cheap; the writer wraps them as AuditEvent.
+        self._ring.append(
+            (time.time_ns(), actor or self.actor, action, resource, outcome, severity, knu_index, authority, trace_id)
+        )
+        self._recorded += 1
+        return True
+
+    @staticmethod
+    def _take_token(bucket: List[float], rate: float) -> bool:
+        now = time.monotonic()
+        tokens = min(rate, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1.0
+        return True
+
+    # ------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------
+
+    def start(self) -> "AuditLog":
+        if self._thread is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            existing = sorted(self.directory.glob("audit-*.kal"))
+            self._segment_index = int(existing[-1].stem.split("-")[1]) if existing else 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="khlnary-audit-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the writer after flushing every queued event."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:  # never let the writer die; flush already contains per-batch failures
+                self._error(exc)
+
+    def _error(self, exc: BaseException) -> None:
+        self._errors += 1
+        self.last_error = exc
+
+    def _keep(self, row: tuple) -> bool:
+        try:
+            event = AuditEvent._make(row)
+            return all(f(event) for f in self.filters)
+        except Exception as exc:  # a broken filter must not hide events: keep them
+            self._error(exc)
+            return True
+
+    def flush(self) -> int:
+        """Drain the ring into the segment log now; returns the number of events written.
+
+        A batch whose write fails is put back at the head of the ring and
+        retried on the next flush; a batch that cannot be encoded is counted
+        as lost.
+        """
+
+        written = 0
+        with self._write_lock:
+            while self._ring:
+                batch = []
+                popleft = self._ring.popleft
+                try:
+                    for _ in range(self.batch_size):
+                        batch.append(popleft())
+                except IndexError:
+                    pass
+                kept = [row for row in batch if self._keep(row)] if self.filters else batch
+                self._filtered += len(batch) - len(kept)
+                if not kept:
+                    continue
+                try:
+                    frame = self._encode_frame(kept)
+                except Exception as exc:
+                    self._error(exc)
+                    self._lost += len(kept)
+                    continue
+                try:
+                    self._write_frame(frame)
+                except OSError as exc:
+                    self._error(exc)
+                    self._ring.extendleft(reversed(kept))
+                    break
+                written += len(kept)
+        self._written += written
+        return written
+
+    def _encode_frame(self, rows: List[tuple]) -> bytes:
+        payload = zlib.compress(json.dumps(rows, separators=(",", ":")).encode("utf-8"), self.compress_level)
+        return FRAME.pack(FRAME_MAGIC, len(payload), zlib.crc32(payload), len(rows)) + payload
+
+    def _write_frame(self, frame: bytes) -> None:
+        if self._segment is None or self._segment.tell() >= self.segment_bytes:
+            if self._segment is not None:
+                self._segment.close()
+            self._segment_index += 1
+            self._segment = (self.directory / SEGMENT_PATTERN.format(self._segment_index)).open("ab")
+        try:
+            self._segment.write(frame)
+            self._segment.flush()
+        except OSError:
+            # The frame may be half written; end this segment there (readers
+            # skip a torn final frame) and retry into a fresh one.
+            segment, self._segment = self._segment, None
+            try:
+                segment.close()
+            except OSError:
+                pass
+            raise
+
+    def stats(self) -> AuditStats:
+        return AuditStats(
+            recorded=self._recorded,
+            sampled_out=self._sampled_out,
+            rate_limited=self._rate_limited,
+            dropped=self._dropped,
+            filtered=self._filtered,
+            written=self._written,
+            segments=self._segment_index,
+            errors=self._errors,
+            lost=self._lost,
+        )
+
+    def __enter__(self) -> "AuditLog":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+# ------------------------------------------------------------
+# Reader
+# ------------------------------------------------------------
+
+def read_segment(path) -> Iterator[AuditEvent]:
+    """Events of one segment; a torn final frame (crash mid-write) ends the segment."""
+
+    data = Path(path).read_bytes()
+    pos = 0
+    while pos + FRAME.size <= len(data):
+        magic, length, crc, count = FRAME.unpack_from(data, pos)
+        payload = data[pos + FRAME.size : pos + FRAME.size + length]
+        last = pos + FRAME.size + length >= len(data)
+        if magic != FRAME_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            if last:
+                return
+            raise AuditLogError(f"{path}: corrupt frame at byte {pos}")
+        rows = json.loads(zlib.decompress(payload))
+        if len(rows) != count:
+            raise AuditLogError(f"{path}: frame at byte {pos} holds {len(rows)} events, header says {count}")
+        for row in rows:
+            yield AuditEvent._make(row)
+        pos += FRAME.size + length
+
+
+def read_audit_log(directory) -> Iterator[AuditEvent]:
+    """Every event in the log directory, oldest segment first."""
+
+    for path in sorted(Path(directory).glob("audit-*.kal")):
+        yield from read_segment(path)
+
+
+__all__ = [
+    "ALLOW",
+    "DENY",
+    "AuditEvent",
+    "AuditLog",
+    "AuditLogError",
+    "AuditStats",
+    "read_segment",
+    "read_audit_log",
+]
@@ -0,0 +1,375 @@
+"""Benchmark runner for the KHΛNARY toolchain with stored baselines.
+
+Covers KNU encode/decode, lowering of a generated program through the
+Python-subset (`ast`) and KUHUL front-ends,
+KHΛ-3/KHΛ-4 profile re-encoding and compressed .khn decoding of the lowered stream,
+`.stb` write/read at configurable sizes, compiler module builds and WGSL
+generation. Results are written as JSON and compared against a baseline
+file by their fastest repeat (`min_seconds`). A benchmark regresses when it
+is slower than `baseline * (1 + threshold)` plus the run-to-run spread
+(median - min) seen in either run, and the runner then exits non-zero.
+
+    python tools/khlnary_bench.py --quick
+    python tools/khlnary_bench.py --stb-sizes 1MB,64MB,1GB --output bench.json
+    python tools/khlnary_bench.py --update-baseline
+
+Timings are machine specific, so no baseline is committed: the first
+`--update-baseline` on a machine creates `benchmarks/baseline.json` there,
+and without one the runner only reports timings.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import asdict, dataclass
+import importlib
+import importlib.util
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+if __package__ is None or __package__ == "":
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from tools import khn, stb
+from tools.khlnary_audit import AuditLog
+from tools.khlnary_compiler import KhlnaryCompiler, KhlnaryModule
+from tools.khlnary_encoder import compile_python_to_khlnary_words, decode_knu, encode_knu
+from tools.khlnary_inspect import disassemble_chunks
+from tools.khlnary_profiles import PROFILE_BRANCH, PROFILE_VECTOR, decode_profile, encode_profile
+from tools.khlnary_webgpu import WebGpuBackend
+from tools.kuhul_frontend import compile_kuhul_to_khlnary_words
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+RESULTS_VERSION = 1
+BASELINE_PATH = Path(__file__).resolve().parents[1] / "benchmarks" / "baseline.json"
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_REPEATS = 15
+DEFAULT_STB_SIZES = (1 << 20,)
+_SIZE_UNITS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "B": 1}
+
+
+@dataclass(frozen=True)
+class BenchResult:
+    name: str
+    seconds: float  # median over repeats
+    min_seconds: float
+    repeats: int
+    units: int  # work per repeat, in `unit`
+    unit: str
+
+    @property
+    def throughput(self) -> float:
+        return self.units / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass(frozen=True)
+class Regression:
+    name: str
+    baseline_seconds: float  # fastest repeat of each run
+    seconds: float
+
+    @property
+    def ratio(self) -> float:
+        return self.seconds / self.baseline_seconds
+
+
+def parse_size(text: str) -> int:
+    """`"64MB"` -> 67108864; plain integers are bytes."""
+
+    text = text.strip().upper()
+    for suffix, factor in _SIZE_UNITS.items():
+        if text.endswith(suffix) and text[: -len(suffix)].strip():
+            return int(float(text[: -len(suffix)]) * factor)
+    return int(text)
+
+
+def _size_label(size: int) -> str:
+    for suffix in ("GB", "MB", "KB"):
+        if size >= _SIZE_UNITS[suffix] and size % _SIZE_UNITS[suffix] == 0:
+            return f"{size // _SIZE_UNITS[suffix]}{suffix}"
+    return f"{size}B"
+
+
+def measure(
+    name: str,
+    fn: Callable[[], object],
+    *,
+    units: int,
+    unit: str,
+    repeats: int,
+    setup: Optional[Callable[[], object]] = None,
+) -> BenchResult:
+    """Time `fn` `repeats` times after one untimed warm-up; `setup` runs untimed before each call."""
+
+    times = []
+    for i in range(repeats + 1):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        if i:
+            times.append(time.perf_counter() - started)
+    return BenchResult(name, statistics.median(times), min(times), repeats, units, unit)
+
+
+# ------------------------------------------------------------
+# Workloads
+# ------------------------------------------------------------
+
+def generated_program(blocks: int) -> str:
+    """A Python-subset program with a function, branches and loops per block."""
+
+    lines = ["def step(a, b):\n    c = a + b\n    return c\n", "x = 0"]
+    for i in range(blocks):
+        lines.append(
+            f"if x < {i % 50}:\n    x = step(x, {i % 7})\nelse:\n    x = x + 1\nwhile x < {i % 9}:\n    x = x + 1"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def generated_kuhul_program(blocks: int) -> str:
+    """`generated_program` written in KUHUL syntax; it lowers to the same KNU stream."""
+
+    lines = ["func step(a, b) {\n    c = a + b;\n    return c;\n}", "x = 0;"]
+    for i in range(blocks):
+        lines.append(
+            f"if (x < {i % 50}) {{\n    x = step(x, {i % 7});\n}} else {{\n    x = x + 1;\n}}\n"
+            f"while (x < {i % 9}) {{\n    x = x + 1;\n}}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def stacked_mlp_compiler(layers: int) -> KhlnaryCompiler:
+    compiler = KhlnaryCompiler()
+    for layer in range(layers):
+        compiler.compile_linear_layer(
+            weight_file="weights/mlp.stb",
+            weight_id=2 * layer % 16,
+            bias_file="weights/mlp.stb",
+            bias_id=(2 * layer + 1) % 16,
+            weight_shape=(64, 64),
+        )
+        compiler.knus.append(compiler.encode_glyph("G_GELU"))
+    return compiler
+
+
+def transformer_module(blocks: int):
+    compiler = KhlnaryCompiler()
+    for _ in range(blocks):
+        compiler.compile_attention_layer(hidden_size=64, num_heads=4, file_path="weights/attn.stb")
+        for name, shape in (("weights/l1.stb", (64, 256)), ("weights/l2.stb", (256, 64))):
+            compiler.compile_linear_layer(weight_file=name, weight_id=0, bias_file=name, bias_id=1, weight_shape=shape)
+            compiler.knus.append(compiler.encode_glyph("G_GELU"))
+        compiler.knus.append(compiler.encode_glyph("G_TENSOR_ADD"))
+    compiler.fuse_operators()
+    return compiler.build_module()
+
+
+def run_benchmarks(
+    *,
+    scale: float = 1.0,
+    stb_sizes: Sequence[int] = DEFAULT_STB_SIZES,
+    repeats: int = DEFAULT_REPEATS,
+    only: Optional[Sequence[str]] = None,
+) -> Dict[str, BenchResult]:
+    """Run every benchmark whose name starts with one of `only` (all by default)."""
+
+    wanted = lambda name: not only or any(name.startswith(prefix) for prefix in only)
+    n = lambda base: max(1, int(base * scale))
+    results: Dict[str, BenchResult] = {}
+
+    def add(name: str, fn, **kwargs) -> None:
+        if wanted(name):
+            results[name] = measure(name, fn, repeats=kwargs.pop("repeats", repeats), **kwargs)
+
+    words = n(20_000)
+    encode = lambda: [encode_knu("G_ADD_I32", payload=i & 0xFF) for i in range(words)]
+    add("encoder.encode_knu", encode, units=words, unit="KNU")
+    encoded = encode()
+    add("encoder.decode_knu", lambda: [decode_knu(w) for w in encoded], units=words, unit="KNU")
+    program = generated_program(n(500))
+    program_knus = len(compile_python_to_khlnary_words(program)) if wanted("encoder.lower_python") else 0
+    add("encoder.lower_python", lambda: compile_python_to_khlnary_words(program), units=program_knus, unit="KNU")
+    kuhul = generated_kuhul_program(n(500))
+    kuhul_knus = len(compile_kuhul_to_khlnary_words(kuhul)) if wanted("frontend.lower_kuhul") else 0
+    add("frontend.lower_kuhul", lambda: compile_kuhul_to_khlnary_words(kuhul), units=kuhul_knus, unit="KNU")
+
+    if any(wanted(f"profiles.{op}_{kind}") for op in ("encode", "decode") for kind in ("branch", "vector")):
+        if np is None:
+            raise RuntimeError("NumPy is required for the profile benchmarks")
+        stream_words = compile_python_to_khlnary_words(program)
+        for kind, profile in (("branch", PROFILE_BRANCH), ("vector", PROFILE_VECTOR)):
+            stream = encode_profile(stream_words, profile)
+            add(f"profiles.encode_{kind}", lambda p=profile: encode_profile(stream_words, p), units=stream.count, unit="KNU")
+            add(f"profiles.decode_{kind}", lambda s=stream: decode_profile(s), units=stream.count, unit="KNU")
+
+    if any(wanted(f"stb.{op}_{_size_label(size)}") for size in stb_sizes for op in ("write", "read")):
+        if np is None:
+            raise RuntimeError("NumPy is required for the .stb benchmarks")
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in stb_sizes:
+                label = _size_label(size)
+                path = Path(tmp) / f"bench_{label}.stb"
+                tensors = [{"tensor_id": 0, "array": np.ones(size // 4, dtype=np.float32)}]
+                big = max(1, min(repeats, (256 << 20) // max(size, 1)))
+                add(f"stb.write_{label}", lambda: stb.write_stb(path, tensors), units=size, unit="B", repeats=big)
+                if wanted(f"stb.read_{label}") and not path.exists():
+                    stb.write_stb(path, tensors)
+                add(f"stb.read_{label}", lambda: stb.read_stb(path), units=size, unit="B", repeats=big)
+
+    if wanted("khn.decode_knuz"):
+        program_words = compile_python_to_khlnary_words(program)
+        blob = khn.pack_knu_columns(program_words, "zlib")
+        decode = lambda: khn.unpack_knu_columns(blob, len(program_words), khn.KNU_CODECS["zlib"])
+        add("khn.decode_knuz", decode, units=len(program_words), unit="KNU")
+
+    if wanted("inspect.disasm"):
+        inspect_words = compile_python_to_khlnary_words(program)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = khn.write_khn(Path(tmp) / "bench.khn", KhlnaryModule(inspect_words, {}, []))
+
+            def disasm():
+                with khn.KhnFile(path) as f:
+                    for _ in disassemble_chunks(f):
+                        pass
+
+            add("inspect.disasm", disasm, units=len(inspect_words), unit="KNU")
+
+    if wanted("audit.record"):
+        events = n(20_000)
+
+        def record_events():
+            with tempfile.TemporaryDirectory() as tmp, AuditLog(tmp, capacity=events) as audit:
+                record = audit.record
+                for i in range(events):
+                    record("tensor_load", "bin:0/tensor:1", knu_index=i, authority=1)
+
+        add("audit.record", record_events, units=events, unit="event")
+
+    layers = n(64)
+    compiled_knus = len(stacked_mlp_compiler(layers).knus)
+
+    def build():
+        compiler = stacked_mlp_compiler(layers)
+        compiler.fuse_operators()
+        return compiler.build_module()
+
+    add("compiler.build_module", build, units=compiled_knus, unit="KNU")
+
+    if wanted("webgpu.generate_wgsl"):
+        module = transformer_module(n(8))
+        generate = lambda: WebGpuBackend().generate_wgsl_shader(module)
+        add("webgpu.generate_wgsl", generate, units=len(module.knus), unit="KNU")
+    return results
+
+
+# ------------------------------------------------------------
+# Results and baselines
+# ------------------------------------------------------------
+
+def results_to_json(results: Mapping[str, BenchResult]) -> Dict[str, object]:
+    return {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {name: asdict(result) for name, result in sorted(results.items())},
+    }
+
+
+def load_results(path) -> Dict[str, BenchResult]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if data.get("version") != RESULTS_VERSION:
+        raise ValueError(f"Unsupported benchmark results version: {data.get('version')}")
+    return {name: BenchResult(**entry) for name, entry in data["results"].items()}
+
+
+def save_results(path, results: Mapping[str, BenchResult]) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results_to_json(results), indent=2) + "\n", encoding="utf-8")
+    return path
+
+
+def compare(
+    results: Mapping[str, BenchResult],
+    baseline: Mapping[str, BenchResult],
+    *,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> List[Regression]:
+    """Benchmarks present in both (with equal work) whose fastest repeat grew past the noise-aware limit.
+
+    The limit is `baseline.min_seconds * (1 + threshold)` widened by the
+    median - min spread of both runs, so a noisy machine needs a larger
+    slowdown before it is flagged.
+    """
+
+    regressions = []
+    for name in sorted(results.keys() & baseline.keys()):
+        new, old = results[name], baseline[name]
+        if new.units != old.units:
+            continue
+        noise = (old.seconds - old.min_seconds) + (new.seconds - new.min_seconds)
+        if new.min_seconds > old.min_seconds * (1.0 + threshold) + noise:
+            regressions.append(Regression(name, old.min_seconds, new.min_seconds))
+    return regressions
+
+
+def format_results(results: Mapping[str, BenchResult], baseline: Optional[Mapping[str, BenchResult]] = None) -> str:
+    baseline = baseline or {}
+    lines = [f"{'benchmark':<28}{'median':>12}{'min':>12}{'throughput':>18}{'vs baseline':>14}"]
+    for name, r in sorted(results.items()):
+        rate = r.throughput / (1 << 20) if r.unit == "B" else r.throughput
+        unit = "MB/s" if r.unit == "B" else f"{r.unit}/s"
+        same = name in baseline and baseline[name].units == r.units
+        delta = f"{r.min_seconds / baseline[name].min_seconds - 1:+.1%}" if same else "-"
+        lines.append(
+            f"{name:<28}{r.seconds * 1e3:>10.2f}ms{r.min_seconds * 1e3:>10.2f}ms{rate:>12.0f} {unit:<5}{delta:>14}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="run smaller workloads (scale 0.1)")
+    parser.add_argument("--only", nargs="*", help="benchmark name prefixes to run")
+    parser.add_argument("--stb-sizes", default="1MB", help="comma-separated .stb sizes, e.g. 1MB,64MB,1GB")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        scale=0.1 if args.quick else 1.0,
+        stb_sizes=[parse_size(s) for s in args.stb_sizes.split(",") if s],
+        repeats=args.repeats,
+        only=args.only,
+    )
+    baseline = load_results(args.baseline) if args.baseline.is_file() else {}
+    print(format_results(results, baseline))
+    if args.output:
+        save_results(args.output, results)
+    if args.update_baseline:
+        save_results(args.baseline, {**baseline, **results})
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"No baseline at {args.baseline}; create one on this machine with --update-baseline")
+        return 0
+    regressions = compare(results, baseline, threshold=args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {r.name}: {r.baseline_seconds * 1e3:.2f}ms -> {r.seconds * 1e3:.2f}ms ({r.ratio:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
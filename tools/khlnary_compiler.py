@@ -2,13 +2,16 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, replace
 import math
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
-from tools.kuhul_glyphs import FLAG_BITS, KUHUL_GLYPHS
+from tools import khlnary_metrics as metrics
+from tools.khlnary_encoder import FunctionEntry, GlyphEmitter, decode_knu, encode_glyphs, lower_python
+from tools.kuhul_glyphs import FLAG_BITS, FUSED_ACTIVATIONS, KUHUL_GLYPHS, KUHUL_GLYPHS_BY_ID
 from tools import stb
+from tools.kuhul_frontend import lower_kuhul
 
 
 DTYPE_BY_STB_ENUM = {
@@ -16,6 +19,7 @@ DTYPE_BY_STB_ENUM = {
     1: "float16",
     2: "int8",
     3: "int32",
+    4: "int4",
 }
 LAYOUT_BY_STB_ENUM = {
     0: "row_major",
@@ -24,13 +28,13 @@ LAYOUT_BY_STB_ENUM = {
 }
 
 
-def _dtype_size(dtype: str) -> int:
-    return {
-        "float16": 2,
-        "float32": 4,
-        "int8": 1,
-        "int32": 4,
-    }[dtype]
+DTYPE_BITS = {
+    "float16": 16,
+    "float32": 32,
+    "int8": 8,
+    "int32": 32,
+    "int4": 4,
+}
 
 
 @dataclass
@@ -47,7 +51,7 @@ class StbTensor:
         size = 1
         for dim in self.shape:
             size *= dim
-        return size * _dtype_size(self.dtype)
+        return (size * DTYPE_BITS[self.dtype] + 7) // 8
 
     @property
     def ptr_name(self) -> str:
@@ -59,10 +63,259 @@ class KhlnaryModule:
     knus: List[int]
     bin_files: Dict[int, str]
     tensors: List[StbTensor]
-    functions: Dict[int, int] = field(default_factory=dict)
+    functions: Dict[int, FunctionEntry] = field(default_factory=dict)
     metadata: Dict[str, object] = field(default_factory=lambda: {"version": "KHΛNARY-2"})
 
 
+class KhlnaryGraphError(ValueError):
+    """Raised when a KNU stream cannot be lifted into a tensor graph."""
+
+
+LOAD_GLYPH = "G_LOAD_BIN_TENSOR"
+ATTENTION_GLYPHS = ("G_SCALED_DOT_PRODUCT", "G_FUSED_ATTENTION")
+
+# Number of queued G_LOAD_BIN_TENSOR operands each compute glyph consumes
+# in addition to the current activation.
+_QUEUED_OPERANDS = {
+    "G_TENSOR_MATMUL": 1,
+    "G_TENSOR_ADD": 1,
+    "G_RELU": 0,
+    "G_GELU": 0,
+    "G_SOFTMAX": 0,
+    "G_SCALED_DOT_PRODUCT": 3,
+    "G_FUSED_LINEAR": 2,
+    "G_FUSED_ATTENTION": 3,
+}
+
+
+@dataclass
+class GraphNode:
+    node_id: int
+    op: str
+    inputs: List[int] = field(default_factory=list)
+    payload: int = 0
+    knu_index: int = -1
+    width: int = 0
+    tensor: Optional[StbTensor] = None
+
+
+@dataclass
+class KhlnaryGraph:
+    """Dataflow view of a tensor KNU stream.
+
+    Node 0 is the module input activation. `G_LOAD_BIN_TENSOR` words are queued
+    as operands; every compute glyph consumes the current activation plus its
+    queued operands in stream order. A `G_TENSOR_ADD` with no queued operand is
+    a residual add against the input of the most recent attention glyph.
+    """
+
+    nodes: List[GraphNode]
+    output: int
+    input_width: int = 0
+
+    def consumers(self) -> Dict[int, List[int]]:
+        users: Dict[int, List[int]] = {node.node_id: [] for node in self.nodes}
+        for node in self.nodes:
+            for src in node.inputs:
+                users[src].append(node.node_id)
+        return users
+
+
+@dataclass
+class FusionReport:
+    fused_linear: int
+    fused_attention: int
+    knus_before: int
+    knus_after: int
+    traffic_before: int
+    traffic_after: int
+
+
+def attention_head_count(scale_payload: int, width: int) -> int:
+    """Recover the head count from an attention glyph's 8.8 fixed-point scale."""
+
+    if scale_payload <= 0 or width <= 0:
+        return 1
+    head_dim = round((256.0 / scale_payload) ** 2)
+    if head_dim <= 0 or width % head_dim:
+        return 1
+    return width // head_dim
+
+
+def build_graph(knus: List[int], tensors: List[StbTensor], *, check_parity: bool = True) -> KhlnaryGraph:
+    """Lift a tensor KNU stream into a `KhlnaryGraph`.
+
+    `check_parity=False` skips per-word validation for verified modules.
+    """
+
+    by_ref = {(t.file_id, t.tensor_id): t for t in tensors}
+    nodes = [GraphNode(node_id=0, op="INPUT")]
+    pending: List[int] = []
+    current = 0
+    residual = 0
+    input_width = 0
+
+    for index, word in enumerate(knus):
+        if check_parity:
+            decode_knu(word)
+        glyph_id = (int(word) >> 20) & 0xFF
+        name = KUHUL_GLYPHS_BY_ID.get(glyph_id)
+        payload = (int(word) >> 4) & 0xFF
+
+        if name == LOAD_GLYPH:
+            tensor = by_ref.get(stb.decode_load_bin_tensor_payload(payload))
+            if tensor is None:
+                raise KhlnaryGraphError(f"KNU {index}: unresolved tensor reference 0x{payload:02x}")
+            nodes.append(
+                GraphNode(
+                    node_id=len(nodes),
+                    op=name,
+                    payload=payload,
+                    knu_index=index,
+                    width=tensor.shape[-1],
+                    tensor=tensor,
+                )
+            )
+            pending.append(len(nodes) - 1)
+            continue
+
+        if name not in _QUEUED_OPERANDS:
+            raise KhlnaryGraphError(f"KNU {index}: glyph 0x{glyph_id:02x} has no tensor-graph lowering")
+
+        count = _QUEUED_OPERANDS[name]
+        if name == "G_TENSOR_ADD" and not pending:
+            operands = [residual]
+        else:
+            if len(pending) < count:
+                raise KhlnaryGraphError(f"KNU {index}: {name} needs {count} loaded operands, found {len(pending)}")
+            operands = pending[:count]
+            del pending[:count]
+
+        if name in ATTENTION_GLYPHS:
+            residual = current
+        if current == 0 and operands and nodes[operands[0]].tensor is not None and not input_width:
+            input_width = nodes[operands[0]].tensor.shape[0]
+
+        if name in ("G_TENSOR_MATMUL", "G_FUSED_LINEAR") or name in ATTENTION_GLYPHS:
+            width = nodes[operands[0]].width
+        else:
+            width = nodes[current].width or input_width
+
+        nodes.append(
+            GraphNode(
+                node_id=len(nodes),
+                op=name,
+                inputs=[current] + operands,
+                payload=payload,
+                knu_index=index,
+                width=width,
+            )
+        )
+        current = len(nodes) - 1
+
+    nodes[0].width = input_width
+    return KhlnaryGraph(nodes=nodes, output=current, input_width=input_width)
+
+
+def _renumber(nodes: List[GraphNode], output: int, input_width: int) -> KhlnaryGraph:
+    new_ids = {node.node_id: i for i, node in enumerate(nodes)}
+    renumbered = [
+        replace(node, node_id=new_ids[node.node_id], inputs=[new_ids[src] for src in node.inputs]) for node in nodes
+    ]
+    return KhlnaryGraph(nodes=renumbered, output=new_ids[output], input_width=input_width)
+
+
+def fuse_graph(graph: KhlnaryGraph) -> Tuple[KhlnaryGraph, Dict[str, int]]:
+    """Fuse matmul->add->activation chains and attention glyphs.
+
+    A fused node keeps the id and KNU index of the last node it absorbs, so
+    downstream references and load ordering stay valid.
+    """
+
+    users = graph.consumers()
+    activations = {"G_RELU": FUSED_ACTIVATIONS["relu"], "G_GELU": FUSED_ACTIVATIONS["gelu"]}
+    removed = set()
+    fused: Dict[int, GraphNode] = {}
+    counts = {"fused_linear": 0, "fused_attention": 0}
+
+    def sole_user(node_id: int) -> Optional[GraphNode]:
+        if node_id == graph.output or len(users[node_id]) != 1:
+            return None
+        return graph.nodes[users[node_id][0]]
+
+    for node in graph.nodes:
+        if node.op == "G_SCALED_DOT_PRODUCT":
+            fused[node.node_id] = replace(node, op="G_FUSED_ATTENTION")
+            counts["fused_attention"] += 1
+            continue
+        if node.op != "G_TENSOR_MATMUL":
+            continue
+        add = sole_user(node.node_id)
+        if add is None or add.op != "G_TENSOR_ADD" or add.inputs[0] != node.node_id:
+            continue
+        bias = graph.nodes[add.inputs[1]]
+        if bias.op != LOAD_GLYPH:
+            continue
+        last, activation = add, FUSED_ACTIVATIONS["none"]
+        act = sole_user(add.node_id)
+        if act is not None and act.op in activations:
+            last, activation = act, activations[act.op]
+        removed.update(member for member in (node.node_id, add.node_id) if member != last.node_id)
+        fused[last.node_id] = replace(
+            last,
+            op="G_FUSED_LINEAR",
+            inputs=[node.inputs[0], node.inputs[1], bias.node_id],
+            payload=activation,
+            width=add.width,
+        )
+        counts["fused_linear"] += 1
+
+    nodes = []
+    for node in graph.nodes:
+        if node.node_id not in removed:
+            nodes.append(fused.get(node.node_id, node))
+    return _renumber(nodes, graph.output, graph.input_width), counts
+
+
+def lower_graph(graph: KhlnaryGraph, encode: Callable[..., int]) -> List[int]:
+    """Re-emit a graph as KNUs, keeping every surviving node at its stream position."""
+
+    ordered = sorted((node for node in graph.nodes if node.op != "INPUT"), key=lambda node: node.knu_index)
+    return [encode(node.op, payload=node.payload) for node in ordered]
+
+
+def estimate_memory_traffic(graph: KhlnaryGraph, *, rows: int = 1, elem_bytes: int = 4) -> Dict[str, int]:
+    """Estimate bytes moved per forward pass for `rows` activation rows.
+
+    Every compute node reads its activation inputs and writes its output.
+    Unfused attention also round-trips the per-head score and probability
+    matrices; fused attention keeps them in tiles.
+    """
+
+    activation_bytes = 0
+    weight_bytes = 0
+    for node in graph.nodes:
+        if node.op in ("INPUT", LOAD_GLYPH):
+            continue
+        for src in node.inputs:
+            source = graph.nodes[src]
+            if source.tensor is not None:
+                weight_bytes += source.tensor.size_bytes
+            else:
+                activation_bytes += rows * source.width * elem_bytes
+        activation_bytes += rows * node.width * elem_bytes
+        if node.op in ATTENTION_GLYPHS:
+            activation_bytes += 2 * 3 * rows * node.width * elem_bytes
+            if node.op == "G_SCALED_DOT_PRODUCT":
+                heads = attention_head_count(node.payload, node.width)
+                activation_bytes += 2 * 2 * heads * rows * rows * elem_bytes
+    return {
+        "activation_bytes": activation_bytes,
+        "weight_bytes": weight_bytes,
+        "total_bytes": activation_bytes + weight_bytes,
+    }
+
+
 class KhlnaryCompiler:
     """Compiler from KUHUL glyph names into KHΛNARY words + .stb metadata."""
 
@@ -71,7 +324,9 @@ class KhlnaryCompiler:
         self.bin_files: Dict[int, str] = {}
         self.file_ids_by_path: Dict[str, int] = {}
         self.tensors: List[StbTensor] = []
-        self.functions: Dict[int, int] = {}
+        self.functions: Dict[int, FunctionEntry] = {}
+        self.function_ids: Dict[str, int] = {}
+        self.fusion_report: Optional[FusionReport] = None
 
     @staticmethod
     def _compute_parity(word: int) -> int:
@@ -116,7 +371,7 @@ class KhlnaryCompiler:
                     meta = tensors[tensor_id]
                     tensor.offset = int(meta["offset"])
                     tensor.shape = tuple(int(d) for d in meta["dims"])
-                    tensor.dtype = DTYPE_BY_STB_ENUM.get(stb.DTYPE_ENUM.get(meta["dtype"], -1), dtype)
+                    tensor.dtype = DTYPE_BY_STB_ENUM.get(meta["dtype_enum"], dtype)
                     tensor.layout = LAYOUT_BY_STB_ENUM.get(int(meta["layout"]), "row_major")
             except (ValueError, KeyError, stb.StbDependencyError):
                 pass
@@ -147,18 +402,71 @@ class KhlnaryCompiler:
         scale = int((1.0 / math.sqrt(hidden_size // num_heads)) * 256)
         self.knus.append(self.encode_glyph("G_SCALED_DOT_PRODUCT", payload=max(0, min(scale, 255))))
 
+    def compile_python_block(self, src: str) -> None:
+        """Lower a Python-subset block and record its functions in the entry table.
+
+        Function names are shared across blocks, so later blocks can call
+        functions defined earlier.
+        """
+        self._append_lowered(lower_python(src, self.function_ids))
+
+    def compile_kuhul_block(self, src: str) -> None:
+        """`compile_python_block` for KUHUL source (see `tools.kuhul_frontend`)."""
+        self._append_lowered(lower_kuhul(src, self.function_ids))
+
+    def _append_lowered(self, lower: GlyphEmitter) -> None:
+        base_pc = len(self.knus)
+        self.knus.extend(encode_glyphs(lower.glyphs, ver=0x2))
+        self.function_ids.update(lower.function_ids)
+        for func_id, entry in lower.functions.items():
+            self.functions[func_id] = entry.rebased(base_pc)
+
+    @metrics.timed("khlnary_compile_fuse_seconds")
+    def fuse_operators(self, *, rows: int = 1) -> FusionReport:
+        """Rewrite the emitted stream with fused linear and attention glyphs."""
+        graph = build_graph(self.knus, self.tensors)
+        fused, counts = fuse_graph(graph)
+        knus = lower_graph(fused, self.encode_glyph)
+        self.fusion_report = FusionReport(
+            fused_linear=counts["fused_linear"],
+            fused_attention=counts["fused_attention"],
+            knus_before=len(self.knus),
+            knus_after=len(knus),
+            traffic_before=estimate_memory_traffic(graph, rows=rows)["total_bytes"],
+            traffic_after=estimate_memory_traffic(fused, rows=rows)["total_bytes"],
+        )
+        self.knus = knus
+        return self.fusion_report
+
+    @metrics.timed("khlnary_compile_build_seconds")
     def build_module(self) -> KhlnaryModule:
+        metadata: Dict[str, object] = {
+            "version": "KHΛNARY-2",
+            "knu_count": len(self.knus),
+            "tensor_count": len(self.tensors),
+        }
+        if self.fusion_report is not None:
+            metadata["fusion"] = asdict(self.fusion_report)
         return KhlnaryModule(
             knus=self.knus.copy(),
             bin_files=self.bin_files.copy(),
             tensors=self.tensors.copy(),
             functions=self.functions.copy(),
-            metadata={
-                "version": "KHΛNARY-2",
-                "knu_count": len(self.knus),
-                "tensor_count": len(self.tensors),
-            },
+            metadata=metadata,
         )
 
 
-__all__ = ["StbTensor", "KhlnaryModule", "KhlnaryCompiler"]
+__all__ = [
+    "StbTensor",
+    "KhlnaryModule",
+    "KhlnaryCompiler",
+    "KhlnaryGraphError",
+    "GraphNode",
+    "KhlnaryGraph",
+    "FusionReport",
+    "attention_head_count",
+    "build_graph",
+    "fuse_graph",
+    "lower_graph",
+    "estimate_memory_traffic",
+]
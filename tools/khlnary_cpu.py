@@ -0,0 +1,314 @@
+"""Reference NumPy kernels and executor for KHΛNARY tensor KNU streams.
+
+The executor lifts a `KhlnaryModule` into a `KhlnaryGraph` once and then
+evaluates it node by node. Fused glyphs (`G_FUSED_LINEAR`,
+`G_FUSED_ATTENTION`) have dedicated kernels that write only their final
+output; the unfused glyphs materialize every intermediate.
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import math
+import threading
+from typing import Callable, Dict, Mapping, MutableMapping, Optional
+
+from tools import stb
+from tools.khlnary_compiler import (
+    LOAD_GLYPH,
+    GraphNode,
+    KhlnaryModule,
+    attention_head_count,
+    build_graph,
+)
+from tools.khlnary_encoder import AUTH_CLASS_USER
+from tools.khlnary_trace import KIND_TENSOR, NO_HANDLE
+from tools.khlnary_verify import is_verified
+from tools.kuhul_glyphs import FUSED_ACTIVATIONS
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+ATTENTION_BLOCK = 64
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for the KHΛNARY CPU backend")
+    return np
+
+
+# ------------------------------------------------------------
+# Kernels
+# ------------------------------------------------------------
+
+def gelu(x, out=None):
+    """Tanh-approximated GELU; writes into `out` when given."""
+
+    inner = np.tanh(math.sqrt(2.0 / math.pi) * (x + 0.044715 * x * x * x))
+    return np.multiply(0.5 * x, 1.0 + inner, out=out)
+
+
+def relu(x, out=None):
+    return np.maximum(x, 0.0, out=out)
+
+
+def softmax(x, axis: int = -1):
+    shifted = x - x.max(axis=axis, keepdims=True)
+    e = np.exp(shifted)
+    return e / e.sum(axis=axis, keepdims=True)
+
+
+def _split_heads(t, heads: int):
+    *lead, seq, width = t.shape
+    return t.reshape(*lead, seq, heads, width // heads).swapaxes(-3, -2)
+
+
+def _merge_heads(t):
+    t = t.swapaxes(-3, -2)
+    *lead, seq, heads, head_dim = t.shape
+    return t.reshape(*lead, seq, heads * head_dim)
+
+
+def causal_mask(q_len: int, k_len: int, q_start: int = 0, k_start: int = 0):
+    """True where key position > query position (entries to mask out)."""
+
+    return np.arange(k_start, k_start + k_len)[None, :] > np.arange(q_start, q_start + q_len)[:, None]
+
+
+def scaled_dot_product(x, wq, wk, wv, scale: float, heads: int, *, causal: bool = False):
+    """Unfused attention: materializes Q/K/V, scores and probabilities."""
+
+    return attend_projected(x @ wq, x @ wk, x @ wv, scale, heads, causal=causal)
+
+
+def attend_projected(q, k, v, scale: float, heads: int, *, causal: bool = False):
+    """`scaled_dot_product` from already projected Q/K/V."""
+
+    q = _split_heads(q, heads)
+    k = _split_heads(k, heads)
+    v = _split_heads(v, heads)
+    scores = (q @ k.swapaxes(-1, -2)) * scale
+    if causal:
+        scores = np.where(causal_mask(q.shape[-2], k.shape[-2]), -np.inf, scores)
+    probs = softmax(scores, axis=-1)
+    return _merge_heads(probs @ v)
+
+
+def fused_attention(x, wq, wk, wv, scale: float, heads: int, *, block: int = ATTENTION_BLOCK, causal: bool = False):
+    """Attention with an online softmax over key blocks.
+
+    Only a `seq x block` score tile is live at a time, so the full
+    `seq x seq` score and probability matrices are never written. The first
+    key block always holds key 0, so causal rows never see an all-masked
+    running maximum.
+    """
+
+    return fused_attend_projected(x @ wq, x @ wk, x @ wv, scale, heads, block=block, causal=causal)
+
+
+def fused_attend_projected(q, k, v, scale: float, heads: int, *, block: int = ATTENTION_BLOCK, causal: bool = False):
+    """`fused_attention` from already projected Q/K/V."""
+
+    q = _split_heads(q, heads) * scale
+    k = _split_heads(k, heads)
+    v = _split_heads(v, heads)
+    seq = k.shape[-2]
+
+    running_max = np.full(q.shape[:-1] + (1,), -np.inf, dtype=q.dtype)
+    denom = np.zeros(q.shape[:-1] + (1,), dtype=q.dtype)
+    acc = np.zeros(q.shape[:-1] + (v.shape[-1],), dtype=q.dtype)
+    for start in range(0, seq, block):
+        tile = q @ k[..., start : start + block, :].swapaxes(-1, -2)
+        if causal:
+            tile = np.where(causal_mask(q.shape[-2], tile.shape[-1], 0, start), -np.inf, tile)
+        new_max = np.maximum(running_max, tile.max(axis=-1, keepdims=True))
+        probs = np.exp(tile - new_max)
+        correction = np.exp(running_max - new_max)
+        denom = denom * correction + probs.sum(axis=-1, keepdims=True)
+        acc = acc * correction + probs @ v[..., start : start + block, :]
+        running_max = new_max
+    return _merge_heads(acc / denom)
+
+
+def fused_linear(x, w, b, activation: int, out=None):
+    """`activation(x @ w + b)` computed in one output buffer."""
+
+    out = np.matmul(x, w, out=out)
+    np.add(out, b, out=out)
+    if activation == FUSED_ACTIVATIONS["relu"]:
+        relu(out, out=out)
+    elif activation == FUSED_ACTIVATIONS["gelu"]:
+        gelu(out, out=out)
+    elif activation != FUSED_ACTIVATIONS["none"]:
+        raise ValueError(f"Unknown fused activation: {activation}")
+    return out
+
+
+def _copy_out(result, out):
+    if out is None:
+        return result
+    np.copyto(out, result)
+    return out
+
+
+def attention_params(node: GraphNode):
+    """`(heads, scale)` of an attention node, decoded from its 8.8 fixed-point payload."""
+
+    return attention_head_count(node.payload, node.width), node.payload / 256.0
+
+
+def _attention(node: GraphNode, x, wq, wk, wv, out=None):
+    heads, scale = attention_params(node)
+    if node.op == "G_FUSED_ATTENTION":
+        return _copy_out(fused_attention(x, wq, wk, wv, scale, heads), out)
+    return _copy_out(scaled_dot_product(x, wq, wk, wv, scale, heads), out)
+
+
+# Every kernel takes the graph node, its input values and an optional
+# preallocated output buffer.
+KERNELS: Dict[str, Callable[..., object]] = {
+    "G_TENSOR_MATMUL": lambda node, x, w, out=None: np.matmul(x, w, out=out),
+    "G_TENSOR_ADD": lambda node, x, y, out=None: np.add(x, y, out=out),
+    "G_RELU": lambda node, x, out=None: relu(x, out=out),
+    "G_GELU": lambda node, x, out=None: gelu(x, out=out),
+    "G_SOFTMAX": lambda node, x, out=None: _copy_out(softmax(x, axis=-1), out),
+    "G_SCALED_DOT_PRODUCT": _attention,
+    "G_FUSED_ATTENTION": _attention,
+    "G_FUSED_LINEAR": lambda node, x, w, b, out=None: fused_linear(x, w, b, node.payload, out=out),
+}
+
+
+# ------------------------------------------------------------
+# Executor
+# ------------------------------------------------------------
+
+class CpuExecutor:
+    """Evaluate a tensor `KhlnaryModule` on CPU with NumPy kernels.
+
+    When the module carries a float32 `memory_plan` (see `tools.khlnary_memory`)
+    whose row count matches the input, intermediates are written into one arena
+    allocated per run instead of one buffer per glyph.
+
+    With `mmap_weights=True` weights are read from memory-mapped .stb files;
+    float32 weights are then used in place without a copy. With `weight_pool`
+    (a `tools.weight_pool` pool or attachment) weights are zero-copy views
+    into shared memory and no .stb file is opened. After `preload()` the
+    executor holds no mutable state, so `run` may be called concurrently.
+
+    Per-KNU parity checks are skipped only for a module this process verified
+    at or below `max_authority`.
+    """
+
+    def __init__(
+        self,
+        module: KhlnaryModule,
+        *,
+        mmap_weights: bool = False,
+        weight_pool=None,
+        max_authority: int = AUTH_CLASS_USER,
+    ) -> None:
+        _require_numpy()
+        self.module = module
+        self.mmap_weights = mmap_weights
+        self.weight_pool = weight_pool
+        self.graph = build_graph(module.knus, module.tensors, check_parity=not is_verified(module, max_authority=max_authority))
+        self._files: Dict[int, MutableMapping[int, MutableMapping[str, object]]] = {}
+        self._file_locks = {file_id: threading.Lock() for file_id in module.bin_files}
+        self._weights: Dict[int, object] = {}
+        # (resource, AUTH_CLASS) per load node, so audited runs do no formatting.
+        self._audit_keys = {
+            node.node_id: (
+                f"bin:{node.tensor.file_id}/tensor:{node.tensor.tensor_id}",
+                (module.knus[node.knu_index] >> 1) & 0x7,
+            )
+            for node in self.graph.nodes
+            if node.op == LOAD_GLYPH
+        }
+
+    def weight(self, node: GraphNode):
+        """Return the float32 weight for a load node, reading each .stb once.
+
+        Safe to call from several threads; loads from different files overlap.
+        """
+        if node.node_id not in self._weights:
+            tensor = node.tensor
+            if self.weight_pool is not None:
+                self._weights[node.node_id] = self.weight_pool.tensor(tensor.file_id, tensor.tensor_id)
+                return self._weights[node.node_id]
+            with self._file_locks[tensor.file_id]:
+                if tensor.file_id not in self._files:
+                    path = self.module.bin_files[tensor.file_id]
+                    self._files[tensor.file_id] = stb.read_stb(path, mmap=self.mmap_weights)
+            entry = self._files[tensor.file_id][tensor.tensor_id]
+            self._weights[node.node_id] = np.asarray(entry["array"], dtype=np.float32)
+        return self._weights[node.node_id]
+
+    def preload(self) -> "CpuExecutor":
+        """Read every weight up front so later runs only read shared state."""
+        for node in self.graph.nodes:
+            if node.op == LOAD_GLYPH:
+                self.weight(node)
+        return self
+
+    def arena_views(self, x) -> Dict[int, object]:
+        """Per-glyph output views into a fresh arena, keyed by KNU index (empty without a matching plan).
+
+        Kernels compute in float32, so a plan sized for another element width
+        (`elem_bytes` other than 4) is ignored.
+        """
+        plan = self.module.metadata.get("memory_plan")
+        rows = x.size // x.shape[-1] if x.ndim else 0
+        if not plan or plan["rows"] != rows or plan.get("elem_bytes", 4) != 4:
+            return {}
+        arena = np.empty(plan["arena_bytes"], dtype=np.uint8)
+        widths = {node.knu_index: node.width for node in self.graph.nodes}
+        views = {}
+        for buf in plan["buffers"]:
+            view = arena[buf["offset"] : buf["offset"] + buf["size"]].view(np.float32)
+            views[buf["knu_index"]] = view.reshape(x.shape[:-1] + (widths[buf["knu_index"]],))
+        return views
+
+    def run(self, x, *, kernels: Optional[Mapping[str, Callable[..., object]]] = None, trace=None, audit=None):
+        """Evaluate the graph on `x`; `kernels` overrides entries of `KERNELS` by glyph name.
+
+        `trace` is an optional `TraceRecorder` receiving one record per node:
+        KNU index and word, operand count, and the output/first two input node ids.
+        `audit` is an optional `AuditLog` receiving a `tensor_load` event per
+        `G_LOAD_BIN_TENSOR` executed.
+        """
+
+        table = {**KERNELS, **kernels} if kernels else KERNELS
+        values = {0: np.asarray(x, dtype=np.float32)}
+        arena = self.arena_views(values[0])
+        knus = self.module.knus
+        for node in self.graph.nodes[1:]:
+            if trace is not None:
+                ins = list(node.inputs[:2]) + [NO_HANDLE] * (2 - len(node.inputs[:2]))
+                trace.record(KIND_TENSOR, node.knu_index, knus[node.knu_index], len(node.inputs), node.node_id, *ins)
+            if node.op == LOAD_GLYPH:
+                values[node.node_id] = self.weight(node)
+                if audit is not None:
+                    resource, authority = self._audit_keys[node.node_id]
+                    audit.record("tensor_load", resource, knu_index=node.knu_index, authority=authority)
+                continue
+            args = [values[src] for src in node.inputs]
+            values[node.node_id] = table[node.op](node, *args, out=arena.get(node.knu_index))
+        return values[self.graph.output]
+
+
+__all__ = [
+    "KERNELS",
+    "CpuExecutor",
+    "gelu",
+    "relu",
+    "softmax",
+    "causal_mask",
+    "attention_params",
+    "scaled_dot_product",
+    "attend_projected",
+    "fused_attention",
+    "fused_attend_projected",
+    "fused_linear",
+]
@@ -4,13 +4,17 @@ This module provides:
 - KNU packing/unpacking for the KHΛ-2-DENSE-32 v0.1 draft profile
 - parity validation
 - lowering for a compact Python subset including if/while/functions
+- a compile-time function entry table (`func_id -> entry_pc`, arity, locals)
 - 128-bit lane-bundle packing helpers
 """
 
 from __future__ import annotations
 
 import ast
-from typing import Dict, List, Tuple
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from tools import khlnary_metrics as metrics
 
 VER = 0x1
 AUTH_CLASS_USER = 0x1
@@ -32,6 +36,8 @@ GLYPH_IDS: Dict[str, int] = {
     "G_EQ_I32": 0x25,
     "G_LT_I32": 0x26,
     "G_LOAD_BIN_TENSOR": 0x30,
+    "G_MMAP_BIN_REGION": 0x31,
+    "G_PREFETCH_BIN": 0x32,
 }
 
 GLYPH_BY_ID = {glyph_id: glyph_name for glyph_name, glyph_id in GLYPH_IDS.items()}
@@ -100,28 +106,39 @@ def decode_knu(word: int) -> Dict[str, int | str | None]:
     }
 
 
+@dataclass(frozen=True)
+class FunctionEntry:
+    """Function table row: body starts at `entry_pc`, `G_FUNC_END` sits at `end_pc`."""
+
+    func_id: int
+    entry_pc: int
+    end_pc: int
+    arity: int
+    num_locals: int
+
+    def rebased(self, base_pc: int) -> "FunctionEntry":
+        return FunctionEntry(self.func_id, self.entry_pc + base_pc, self.end_pc + base_pc, self.arity, self.num_locals)
+
+
 def _signed_to_u8(value: int) -> int:
     if not -128 <= value <= 127:
         raise KhlNaryLoweringError(f"Jump offset out of int8 range: {value}")
     return value & 0xFF
 
 
-class ExtendedLower(ast.NodeVisitor):
-    """Lower a tiny Python subset into glyph tuples.
+class GlyphEmitter:
+    """Glyph buffer, slot/function-id allocation and jump patching shared by front-ends.
 
-    Supported constructs:
-    - integer literals in [-128, 127]
-    - names, assignment to names
-    - `+`, `==`, `<`
-    - if/else, while
-    - function definitions, calls, returns
-    - top-level expression statements (auto `G_RET`)
+    Front-ends append `[name, arity, flags, payload]` tuples through `emit`;
+    calls are recorded in `pending_calls` and resolved by `finalize`, so a
+    function may be called before it is defined.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, function_ids: Optional[Dict[str, int]] = None) -> None:
         self.glyphs: List[List[int | str]] = []
-        self.function_ids: Dict[str, int] = {}
-        self.next_function_id = 1
+        self.function_ids: Dict[str, int] = dict(function_ids or {})
+        self.next_function_id = max(self.function_ids.values(), default=0) + 1
+        self.functions: Dict[int, FunctionEntry] = {}
         self.locals_stack: List[Dict[str, int]] = []
         self.pending_calls: List[Tuple[int, str]] = []
 
@@ -153,6 +170,24 @@ class ExtendedLower(ast.NodeVisitor):
             self.next_function_id += 1
         return self.function_ids[name]
 
+    def finalize(self) -> None:
+        for idx, fn_name in self.pending_calls:
+            func_id = self._get_function_id(fn_name)
+            self.glyphs[idx][3] = func_id
+
+
+class ExtendedLower(GlyphEmitter, ast.NodeVisitor):
+    """Lower a tiny Python subset into glyph tuples.
+
+    Supported constructs:
+    - integer literals in [-128, 127]
+    - names, assignment to names
+    - `+`, `==`, `<`
+    - if/else, while
+    - function definitions, calls, returns
+    - top-level expression statements (auto `G_RET`)
+    """
+
     def visit_Module(self, node: ast.Module) -> None:  # noqa: N802
         self.locals_stack.append({})
         for stmt in node.body:
@@ -161,7 +196,9 @@ class ExtendedLower(ast.NodeVisitor):
 
     def visit_FunctionDef(self, node: ast.FunctionDef) -> None:  # noqa: N802
         func_id = self._get_function_id(node.name)
-        self.emit("G_FUNC_DEF", arity=1, flags=FLAG_IMMEDIATE, payload=func_id)
+        if func_id > 255:
+            raise KhlNaryLoweringError("function id exceeds 8-bit payload")
+        entry_pc = self.emit("G_FUNC_DEF", arity=1, flags=FLAG_IMMEDIATE, payload=func_id) + 1
 
         fn_locals: Dict[str, int] = {}
         for i, arg in enumerate(node.args.args):
@@ -171,8 +208,15 @@ class ExtendedLower(ast.NodeVisitor):
         for stmt in node.body:
             self.visit(stmt)
 
-        self.locals_stack.pop()
-        self.emit("G_FUNC_END")
+        num_locals = len(self.locals_stack.pop())
+        end_pc = self.emit("G_FUNC_END")
+        self.functions[func_id] = FunctionEntry(
+            func_id=func_id,
+            entry_pc=entry_pc,
+            end_pc=end_pc,
+            arity=len(node.args.args),
+            num_locals=num_locals,
+        )
 
     def visit_Return(self, node: ast.Return) -> None:  # noqa: N802
         if node.value is None:
@@ -269,35 +313,52 @@ class ExtendedLower(ast.NodeVisitor):
         idx = self.emit("G_CALL", arity=len(node.args), flags=FLAG_IMMEDIATE, payload=0)
         self.pending_calls.append((idx, node.func.id))
 
-    def finalize(self) -> None:
-        for idx, fn_name in self.pending_calls:
-            func_id = self._get_function_id(fn_name)
-            self.glyphs[idx][3] = func_id
 
+def lower_python(src: str, function_ids: Optional[Dict[str, int]] = None) -> ExtendedLower:
+    """Parse and lower `src`, returning the finalized `ExtendedLower`."""
+
+    with metrics.timer("khlnary_parse_seconds"):
+        tree = ast.parse(src)
+    with metrics.timer("khlnary_lower_seconds"):
+        lower = ExtendedLower(function_ids)
+        lower.visit(tree)
+        lower.finalize()
+    return lower
 
-def compile_python_to_khlnary_words(src: str) -> List[int]:
-    """Compile a compact Python subset source string to KHΛ-2-DENSE words."""
 
-    tree = ast.parse(src)
-    lower = ExtendedLower()
-    lower.visit(tree)
-    lower.finalize()
+def encode_glyphs(glyphs: List[List[int | str]], *, ver: int = VER) -> List[int]:
+    """Encode lowered `[name, arity, flags, payload]` tuples as KNU words."""
 
     words: List[int] = []
-    for glyph_name, arity, flags, payload in lower.glyphs:
-        words.append(
-            encode_knu(
-                str(glyph_name),
-                arity=int(arity),
-                profile_flags=int(flags),
-                payload=int(payload),
-                auth_class=AUTH_CLASS_USER,
-                ver=VER,
+    with metrics.timer("khlnary_encode_seconds"):
+        for glyph_name, arity, flags, payload in glyphs:
+            words.append(
+                encode_knu(
+                    str(glyph_name),
+                    arity=int(arity),
+                    profile_flags=int(flags),
+                    payload=int(payload),
+                    auth_class=AUTH_CLASS_USER,
+                    ver=ver,
+                )
             )
-        )
+    metrics.inc("khlnary_knus_encoded_total", len(words))
     return words
 
 
+def compile_python_to_khlnary_words(src: str) -> List[int]:
+    """Compile a compact Python subset source string to KHΛ-2-DENSE words."""
+
+    return encode_glyphs(lower_python(src).glyphs)
+
+
+def compile_python_with_functions(src: str) -> Tuple[List[int], Dict[int, FunctionEntry]]:
+    """Compile `src` and return its words plus the function entry table."""
+
+    lower = lower_python(src)
+    return encode_glyphs(lower.glyphs), lower.functions
+
+
 def pack_lane_bundles(words: List[int]) -> List[List[int]]:
     """Pack words into 128-bit lane bundles (4x 32-bit KNUs, padded with NOP)."""
 
@@ -338,10 +399,16 @@ __all__ = [
     "FLAG_IMMEDIATE",
     "KhlNaryParityError",
     "KhlNaryLoweringError",
+    "FunctionEntry",
+    "GlyphEmitter",
+    "ExtendedLower",
     "parity_even_32",
     "encode_knu",
     "decode_knu",
+    "lower_python",
+    "encode_glyphs",
     "compile_python_to_khlnary_words",
+    "compile_python_with_functions",
     "compile_to_knu",
     "pack_lane_bundles",
     "pack_lane_bundle_u128",
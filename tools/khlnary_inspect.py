@@ -0,0 +1,312 @@
+"""Streaming inspector for .khn modules and .stb tensor files.
+
+    python tools/khlnary_inspect.py disasm model.khn [--start PC] [--count N] [--glyph G_CALL ...]
+    python tools/khlnary_inspect.py hist model.khn [--json]
+    python tools/khlnary_inspect.py stb weights/l1.stb [...]
+
+`disasm` prints one line per KNU, with its fields decoded and a trailing
+`;` comment that resolves jump targets, function table entries, constants
+and `.bin` references (tensor dtype/shape and bin file path). KNUs with odd
+parity are flagged `!parity`. `hist` counts glyph ids. `stb` dumps
+.stb headers and tensor tables without touching tensor data.
+
+The KNU stream is read through `KhnFile`'s read-only mapping in chunks of
+`CHUNK_KNUS` words (NumPy views when available). Each distinct word is
+rendered once, and each chunk's text is written before the next is read,
+so memory is bounded by the chunk size and the word vocabulary, not the
+module length. A compressed (`KNUZ`) stream is the exception: it is decoded
+once into one array.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+if __package__ is None or __package__ == "":
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from tools import stb
+from tools.khlnary_compiler import DTYPE_BY_STB_ENUM, LAYOUT_BY_STB_ENUM
+from tools.khlnary_encoder import GLYPH_BY_ID, GLYPH_IDS
+from tools.khn import SECTION_KNUS, KhnFile
+from tools.kuhul_glyphs import KUHUL_GLYPHS_BY_ID
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+CHUNK_KNUS = 1 << 16
+
+GLYPH_NAMES = [GLYPH_BY_ID.get(i) or KUHUL_GLYPHS_BY_ID.get(i) or f"?0x{i:02x}" for i in range(256)]
+
+G_CONST_I8 = GLYPH_IDS["G_CONST_I8"]
+G_CALL = GLYPH_IDS["G_CALL"]
+G_FUNC_DEF = GLYPH_IDS["G_FUNC_DEF"]
+G_LOAD_BIN_TENSOR = GLYPH_IDS["G_LOAD_BIN_TENSOR"]
+G_MMAP_BIN_REGION = GLYPH_IDS["G_MMAP_BIN_REGION"]
+G_PREFETCH_BIN = GLYPH_IDS["G_PREFETCH_BIN"]
+JUMP_GLYPHS = (GLYPH_IDS["G_IFZ_JUMP8"], GLYPH_IDS["G_JUMP8"])
+RESOLVED_GLYPHS = frozenset(JUMP_GLYPHS) | {
+    G_CONST_I8, G_CALL, G_FUNC_DEF, G_LOAD_BIN_TENSOR, G_MMAP_BIN_REGION, G_PREFETCH_BIN
+}
+
+LINE = "%08x  %-20s a=%d f=%x p=0x%02x auth=%d"
+
+
+def parse_glyph(text: str) -> int:
+    """Glyph id from a name (`G_CALL`) or a number (`0x22`, `34`)."""
+
+    if text in GLYPH_NAMES:
+        return GLYPH_NAMES.index(text)
+    try:
+        value = int(text, 0)
+    except ValueError:
+        raise ValueError(f"unknown glyph {text!r}") from None
+    if not 0 <= value <= 0xFF:
+        raise ValueError(f"glyph id {value} outside 0..255")
+    return value
+
+
+# ------------------------------------------------------------
+# Chunked field decoding
+# ------------------------------------------------------------
+
+def _chunks(khn: KhnFile, start: int, stop: int, chunk: int) -> Iterator[Tuple[int, object]]:
+    if np is not None or khn.compressed:
+        knus = khn.knus  # zero-copy view over the mapping (or the decoded KNUZ array)
+        for base in range(start, stop, chunk):
+            yield base, knus[base : min(base + chunk, stop)]
+        return
+    section = khn.section(SECTION_KNUS)
+    for base in range(start, stop, chunk):
+        end = min(base + chunk, stop)
+        yield base, [w for (w,) in struct.iter_unpack("<I", section[base * 4 : end * 4])]
+
+
+def _select(base: int, words, glyphs: Optional[frozenset]) -> Tuple[List[int], List[int], List[int]]:
+    """(pcs, words, indexes of jump glyphs) of the chunk's KNUs whose glyph is in `glyphs`."""
+
+    if np is not None:
+        words = np.asarray(words, dtype=np.uint32)
+        pcs = np.arange(base, base + words.size)
+        glyph = (words >> 20) & 0xFF
+        if glyphs is not None:
+            keep = np.isin(glyph, list(glyphs))
+            words, pcs, glyph = words[keep], pcs[keep], glyph[keep]
+        return pcs.tolist(), words.tolist(), np.flatnonzero(np.isin(glyph, JUMP_GLYPHS)).tolist()
+    pcs, kept = [], []
+    for pc, w in enumerate(words, base):
+        if glyphs is None or (w >> 20) & 0xFF in glyphs:
+            pcs.append(pc)
+            kept.append(w)
+    return pcs, kept, [i for i, w in enumerate(kept) if (w >> 20) & 0xFF in JUMP_GLYPHS]
+
+
+# ------------------------------------------------------------
+# Disassembly
+# ------------------------------------------------------------
+
+class _WordText(dict):
+    """word -> disassembly text after the PC column, rendered once per distinct word.
+
+    Everything but a jump target depends on the word alone; modules repeat a
+    small vocabulary of words, so the per-line cost is a dict hit.
+    """
+
+    def __init__(self, khn: KhnFile) -> None:
+        super().__init__()
+        self.bin_files = khn.bin_files
+        self.tensors = {(t.file_id, t.tensor_id): t for t in khn.tensors}
+        self.functions = khn.functions
+
+    def __missing__(self, word: int) -> str:
+        glyph, payload = (word >> 20) & 0xFF, (word >> 4) & 0xFF
+        fields = (word, GLYPH_NAMES[glyph], (word >> 16) & 0xF, (word >> 12) & 0xF, payload, (word >> 1) & 0x7)
+        text = LINE % fields
+        if word.bit_count() & 1:
+            text += "  !parity"
+        if glyph in RESOLVED_GLYPHS:
+            text += "  ; " + self._comment(glyph, payload)
+        self[word] = text
+        return text
+
+    def _bin(self, file_id: int) -> str:
+        return self.bin_files.get(file_id, "(unresolved bin file)")
+
+    def _comment(self, glyph: int, payload: int) -> str:
+        signed = payload - 0x100 if payload & 0x80 else payload
+        if glyph in JUMP_GLYPHS:
+            return "-> "  # target appended per PC
+        if glyph == G_CONST_I8:
+            return str(signed)
+        if glyph in (G_CALL, G_FUNC_DEF):
+            entry = self.functions.get(payload)
+            if entry is None:
+                return f"func {payload} (unresolved)"
+            return f"func {payload} body {entry.entry_pc:08d}..{entry.end_pc:08d} arity={entry.arity}"
+        if glyph == G_LOAD_BIN_TENSOR:
+            file_id, tensor_id = stb.decode_load_bin_tensor_payload(payload)
+            tensor = self.tensors.get((file_id, tensor_id))
+            if tensor is None:
+                return f"bin {file_id} tensor {tensor_id} (unresolved)"
+            shape = "x".join(map(str, tensor.shape))
+            return f"bin {file_id} tensor {tensor_id} {tensor.dtype}[{shape}] {self._bin(file_id)}"
+        return f"bin {payload} {self._bin(payload)}"
+
+
+def disassemble_chunks(
+    khn: KhnFile,
+    *,
+    start: int = 0,
+    count: Optional[int] = None,
+    glyphs: Optional[Iterable[int]] = None,
+    chunk: int = CHUNK_KNUS,
+) -> Iterator[List[str]]:
+    """Disassembly lines of KNUs `[start, start + count)`, one list per chunk.
+
+    `glyphs` restricts the output to those glyph ids (PCs keep their stream positions).
+    """
+
+    total = khn.knu_count
+    stop = total if count is None else min(total, start + count)
+    selected = frozenset(glyphs) if glyphs is not None else None
+    text = _WordText(khn)
+    for base, words in _chunks(khn, start, stop, chunk):
+        pcs, words, jumps = _select(base, words, selected)
+        lines = [f"{pc:08d}  {text[w]}" for pc, w in zip(pcs, words)]
+        for i in jumps:
+            payload = (words[i] >> 4) & 0xFF
+            target = pcs[i] + (payload - 0x100 if payload & 0x80 else payload)
+            lines[i] += f"{target:08d}" if 0 <= target <= total else f"{target:08d} (out of bounds)"
+        yield lines
+
+
+def disassemble(khn: KhnFile, **kwargs) -> Iterator[str]:
+    """One disassembly line per KNU; see `disassemble_chunks`."""
+
+    for lines in disassemble_chunks(khn, **kwargs):
+        yield from lines
+
+
+def _module_header(khn: KhnFile) -> List[str]:
+    codec = "compressed KNUZ" if khn.compressed else "KNUS"
+    summary = f"{khn.knu_count} KNUs ({codec}), {len(khn.functions)} functions, {len(khn.tensors)} tensors"
+    lines = [f"; {khn.path}: {summary}"]
+    lines += [f"; bin {file_id}: {path}" for file_id, path in sorted(khn.bin_files.items())]
+    return lines
+
+
+# ------------------------------------------------------------
+# Histogram / .stb tables
+# ------------------------------------------------------------
+
+def glyph_histogram(khn: KhnFile, *, chunk: int = CHUNK_KNUS) -> Dict[int, int]:
+    """Glyph id -> KNU count over the whole stream (ids that occur only)."""
+
+    counts = [0] * 256
+    for _, words in _chunks(khn, 0, khn.knu_count, chunk):
+        if np is not None:
+            binned = np.bincount((np.asarray(words, dtype=np.uint32) >> 20) & 0xFF, minlength=256)
+            counts = [a + b for a, b in zip(counts, binned.tolist())]
+        else:
+            for w in words:
+                counts[(w >> 20) & 0xFF] += 1
+    return {glyph: n for glyph, n in enumerate(counts) if n}
+
+
+def format_histogram(histogram: Dict[int, int]) -> List[str]:
+    total = sum(histogram.values()) or 1
+    lines = [f"{'glyph':<20} {'id':>4} {'count':>12} {'share':>8}"]
+    for glyph, n in sorted(histogram.items(), key=lambda item: (-item[1], item[0])):
+        lines.append(f"{GLYPH_NAMES[glyph]:<20} 0x{glyph:02x} {n:>12} {100.0 * n / total:>7.2f}%")
+    lines.append(f"{'total':<20} {'':>4} {sum(histogram.values()):>12}")
+    return lines
+
+
+def format_stb_table(path) -> List[str]:
+    """Header and tensor table of one .stb file (tensor data is not read)."""
+
+    layout = stb.read_stb_layout(path)
+    lines = [
+        f"; {path}: {len(layout['tensors'])} tensors, "
+        f"data_offset {layout['data_offset']}, file_size {layout['file_size']}",
+        f"{'id':>4}  {'dtype':<8} {'layout':<14} {'dims':<20} {'offset':>12} {'bytes':>12}",
+    ]
+    for tid, t in sorted(layout["tensors"].items()):
+        dtype = DTYPE_BY_STB_ENUM.get(t["dtype_enum"], f"?{t['dtype_enum']}")
+        order = LAYOUT_BY_STB_ENUM.get(t["layout"], f"?{t['layout']}")
+        dims = "x".join(map(str, t["dims"])) or "scalar"
+        lines.append(f"{tid:>4}  {dtype:<8} {order:<14} {dims:<20} {t['offset']:>12} {t['size_bytes']:>12}")
+    return lines
+
+
+# ------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------
+
+def _write(lines: Sequence[str]) -> None:
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect KHΛNARY .khn modules and .stb tensor files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    disasm = sub.add_parser("disasm", help="disassemble a .khn KNU stream")
+    disasm.add_argument("module", type=Path)
+    disasm.add_argument("--start", type=int, default=0, help="first PC to print")
+    disasm.add_argument("--count", type=int, default=None, help="number of KNUs to scan from --start")
+    disasm.add_argument("--glyph", action="append", type=parse_glyph, help="only these glyphs (name or id; repeatable)")
+    disasm.add_argument("--no-header", action="store_true", help="omit the leading ';' module summary")
+    hist = sub.add_parser("hist", help="glyph histogram of a .khn KNU stream")
+    hist.add_argument("module", type=Path)
+    hist.add_argument("--json", action="store_true", help="emit {glyph name: count} JSON")
+    tables = sub.add_parser("stb", help="dump .stb headers and tensor tables")
+    tables.add_argument("files", type=Path, nargs="+")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "stb":
+            for path in args.files:
+                _write(format_stb_table(path))
+            return 0
+        with KhnFile(args.module) as khn:
+            if args.command == "hist":
+                histogram = glyph_histogram(khn)
+                if args.json:
+                    _write([json.dumps({GLYPH_NAMES[g]: n for g, n in sorted(histogram.items())}, indent=2)])
+                else:
+                    _write(format_histogram(histogram))
+                return 0
+            if not args.no_header:
+                _write(_module_header(khn))
+            for lines in disassemble_chunks(khn, start=args.start, count=args.count, glyphs=args.glyph):
+                _write(lines)
+        return 0
+    except BrokenPipeError:
+        # Output piped into `head` and friends: stop quietly.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+
+
+__all__ = [
+    "CHUNK_KNUS",
+    "GLYPH_NAMES",
+    "parse_glyph",
+    "disassemble_chunks",
+    "disassemble",
+    "glyph_histogram",
+    "format_histogram",
+    "format_stb_table",
+    "main",
+]
+
+if __name__ == "__main__":
+    sys.exit(main())
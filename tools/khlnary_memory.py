@@ -0,0 +1,114 @@
+"""Static activation-memory planning for KHΛNARY tensor modules.
+
+Every compute glyph in a module produces one intermediate tensor. Its
+lifetime runs from the KNU that defines it to the last KNU that reads it
+(the module output stays live to the end of the stream). Intermediates are
+packed into a single arena with greedy-by-size offset assignment, so buffers
+whose lifetimes do not overlap share bytes.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+
+from tools.khlnary_compiler import LOAD_GLYPH, KhlnaryGraph, KhlnaryModule, build_graph
+
+
+@dataclass
+class BufferAssignment:
+    knu_index: int
+    size: int
+    first_use: int
+    last_use: int
+    offset: int = 0
+
+    def overlaps_in_time(self, other: "BufferAssignment") -> bool:
+        return self.first_use <= other.last_use and other.first_use <= self.last_use
+
+
+@dataclass
+class MemoryPlan:
+    rows: int
+    elem_bytes: int
+    alignment: int
+    buffers: List[BufferAssignment]
+    arena_bytes: int
+    naive_bytes: int
+    live_peak_bytes: int
+
+    def to_metadata(self) -> Dict[str, object]:
+        return {
+            "rows": self.rows,
+            "elem_bytes": self.elem_bytes,
+            "alignment": self.alignment,
+            "arena_bytes": self.arena_bytes,
+            "naive_bytes": self.naive_bytes,
+            "live_peak_bytes": self.live_peak_bytes,
+            "buffers": [asdict(buf) for buf in self.buffers],
+        }
+
+
+def _align(value: int, alignment: int) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+def buffer_lifetimes(graph: KhlnaryGraph, *, rows: int = 1, elem_bytes: int = 4) -> List[BufferAssignment]:
+    """Return one unplaced buffer per intermediate, in definition order."""
+
+    users = graph.consumers()
+    end = max((node.knu_index for node in graph.nodes), default=0) + 1
+    buffers = []
+    for node in graph.nodes:
+        if node.op in ("INPUT", LOAD_GLYPH):
+            continue
+        readers = [graph.nodes[user].knu_index for user in users[node.node_id]]
+        last_use = end if node.node_id == graph.output else max(readers, default=node.knu_index)
+        buffers.append(
+            BufferAssignment(
+                knu_index=node.knu_index,
+                size=rows * node.width * elem_bytes,
+                first_use=node.knu_index,
+                last_use=last_use,
+            )
+        )
+    return buffers
+
+
+def plan_memory(module: KhlnaryModule, *, rows: int = 1, elem_bytes: int = 4, alignment: int = 64) -> MemoryPlan:
+    """Assign arena offsets to every intermediate of `module`."""
+
+    buffers = buffer_lifetimes(build_graph(module.knus, module.tensors), rows=rows, elem_bytes=elem_bytes)
+
+    placed: List[BufferAssignment] = []
+    for buf in sorted(buffers, key=lambda b: (-b.size, b.first_use)):
+        offset = 0
+        for other in sorted((p for p in placed if p.overlaps_in_time(buf)), key=lambda p: p.offset):
+            if offset + buf.size <= other.offset:
+                break
+            offset = max(offset, _align(other.offset + other.size, alignment))
+        buf.offset = offset
+        placed.append(buf)
+
+    events = sorted({b.first_use for b in buffers})
+    live_peak = max((sum(b.size for b in buffers if b.first_use <= t <= b.last_use) for t in events), default=0)
+    return MemoryPlan(
+        rows=rows,
+        elem_bytes=elem_bytes,
+        alignment=alignment,
+        buffers=buffers,
+        arena_bytes=max((_align(b.offset + b.size, alignment) for b in buffers), default=0),
+        naive_bytes=sum(_align(b.size, alignment) for b in buffers),
+        live_peak_bytes=live_peak,
+    )
+
+
+def apply_memory_plan(module: KhlnaryModule, **kwargs: int) -> MemoryPlan:
+    """Plan `module` and record the result under `metadata["memory_plan"]`."""
+
+    plan = plan_memory(module, **kwargs)
+    module.metadata["memory_plan"] = plan.to_metadata()
+    return plan
+
+
+__all__ = ["BufferAssignment", "MemoryPlan", "buffer_lifetimes", "plan_memory", "apply_memory_plan"]
@@ -0,0 +1,191 @@
+"""Low-overhead counters, timers and histograms for the KHΛNARY toolchain.
+
+Instrumented code calls the module-level helpers:
+
+    with metrics.timer("khlnary_stb_read_seconds"):
+        ...
+    metrics.inc("khlnary_stb_bytes_read_total", len(raw))
+
+Collection is off unless `KHLNARY_METRICS` is set to a non-empty value
+other than `0`, or `enable()` is called. While disabled every helper returns
+after one global flag check (`timer` hands back a shared no-op context), so
+instrumentation can stay in hot paths. Recorded metrics export as JSON
+(`REGISTRY.to_json()`) or Prometheus text format (`REGISTRY.to_prometheus()`).
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; suits everything from one header parse to a full shader generation.
+DEFAULT_BUCKETS: Tuple[float, ...] = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+_enabled = os.environ.get("KHLNARY_METRICS", "") not in ("", "0")
+_NULL_TIMER = nullcontext()
+
+
+@dataclass
+class Histogram:
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    counts: List[int] = field(default_factory=list)  # per bucket, plus +Inf
+    count: int = 0
+    sum: float = 0.0
+
+    def __post_init__(self) -> None:
+        if not self.counts:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """`(le, count)` pairs in Prometheus form, ending with `+Inf`."""
+
+        total = 0
+        rows = []
+        for bound, n in zip([repr(b) for b in self.buckets] + ["+Inf"], self.counts):
+            total += n
+            rows.append((bound, total))
+        return rows
+
+
+class MetricsRegistry:
+    """Named counters and histograms; all updates are serialized by one lock."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram(tuple(buckets))
+            hist.observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {
+                    name: {
+                        "count": h.count,
+                        "sum": h.sum,
+                        "buckets": dict(h.cumulative()),
+                    }
+                    for name, h in sorted(self.histograms.items())
+                },
+            }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self) -> str:
+        snap = self.snapshot()
+        lines: List[str] = []
+        for name, value in snap["counters"].items():
+            lines += [f"# TYPE {name} counter", f"{name} {value:g}"]
+        for name, hist in snap["histograms"].items():
+            lines.append(f"# TYPE {name} histogram")
+            lines += [f'{name}_bucket{{le="{le}"}} {n}' for le, n in hist["buckets"].items()]
+            lines += [f"{name}_sum {hist['sum']:g}", f"{name}_count {hist['count']}"]
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+REGISTRY = MetricsRegistry()
+
+
+# ------------------------------------------------------------
+# Instrumentation helpers
+# ------------------------------------------------------------
+
+def enable(flag: bool = True) -> bool:
+    """Turn collection on or off; returns the previous state."""
+
+    global _enabled
+    previous, _enabled = _enabled, bool(flag)
+    return previous
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def inc(name: str, value: float = 1) -> None:
+    if _enabled:
+        REGISTRY.inc(name, value)
+
+
+def observe(name: str, value: float) -> None:
+    if _enabled:
+        REGISTRY.observe(name, value)
+
+
+class _Timer:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        REGISTRY.observe(self.name, time.perf_counter() - self.started)
+
+
+def timer(name: str):
+    """Context manager recording its duration into histogram `name` (no-op while disabled)."""
+
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator form of `timer`."""
+
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Timer(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+__all__ = [
+    "DEFAULT_BUCKETS",
+    "Histogram",
+    "MetricsRegistry",
+    "REGISTRY",
+    "enable",
+    "is_enabled",
+    "inc",
+    "observe",
+    "timer",
+    "timed",
+]
@@ -0,0 +1,232 @@
+"""Dense ternary and quaternary stream profiles (`KHΛ-3-BRANCH`, `KHΛ-4-VECTOR`).
+
+Both profiles re-encode a valid `KHΛ-2-DENSE-32` stream losslessly:
+
+- every word is split into a *descriptor* (all fields except `PAYLOAD` and
+  `PARITY`) and its 8-bit payload; parity is recomputed on decode, so only
+  words that pass the parity check can be encoded;
+- distinct descriptors go into a per-stream table (a program uses a few
+  dozen at most), and each KNU becomes `index * radix**p + payload_code`,
+  written as `k + p` radix-`α` symbols (`k` index digits, `p` payload digits,
+  both the minimum the stream needs);
+- the symbol stream is packed little-endian into u32 machine words:
+  20 trits per word (3**20 < 2**32) or 16 two-bit symbols per word.
+
+`KHΛ-3-BRANCH` codes the payload as a balanced (signed) value, so the short
+signed jump offsets and constants of branch-heavy code need few trits.
+`KHΛ-4-VECTOR` codes it unsigned, matching the small tensor/slot ids of
+vector glyphs. Encode and decode are vectorized with NumPy.
+
+Serialized stream (little endian): header `magic "KHPS", radix u8,
+index digits u8, payload digits u8, pad u8, KNU count u32, table length u32`,
+then the descriptor table (u32 each), then the packed symbol words.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import importlib
+import importlib.util
+import struct
+import time
+from typing import Dict, Sequence
+
+from tools.khlnary_encoder import KhlNaryParityError
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+PROFILE_DENSE = "KHΛ-2-DENSE-32"
+PROFILE_BRANCH = "KHΛ-3-BRANCH"
+PROFILE_VECTOR = "KHΛ-4-VECTOR"
+RADIX = {PROFILE_BRANCH: 3, PROFILE_VECTOR: 4}
+PROFILE_BY_RADIX = {radix: name for name, radix in RADIX.items()}
+SYMBOLS_PER_WORD = {3: 20, 4: 16}
+
+STREAM_MAGIC = b"KHPS"
+HEADER = struct.Struct("<4sBBBxII")
+
+_DESCRIPTOR_MASK = 0xFFFFF00E  # everything but PAYLOAD [11:4] and PARITY [0]
+
+
+class ProfileFormatError(ValueError):
+    """Raised when a profile stream is malformed or names an unknown profile."""
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("NumPy is required for the KHΛ-3/KHΛ-4 profile codecs")
+
+
+def _parity(words):
+    """Per-word parity of bits [31:0] (0 when the count of set bits is even)."""
+
+    bits = np.unpackbits(np.ascontiguousarray(words, dtype="<u4").view(np.uint8)).reshape(-1, 32)
+    return (bits.sum(axis=1) & 1).astype(np.uint32)
+
+
+def _digits_for(radix: int, values: int) -> int:
+    """Smallest digit count whose range holds `values` distinct codes."""
+
+    digits = 0
+    while radix**digits < values:
+        digits += 1
+    return digits
+
+
+@dataclass(frozen=True)
+class ProfileStream:
+    profile: str
+    count: int  # KNUs in the stream
+    index_digits: int
+    payload_digits: int
+    table: object  # uint32 descriptors
+    packed: object  # uint32 symbol words
+
+    @property
+    def radix(self) -> int:
+        return RADIX[self.profile]
+
+    @property
+    def nbytes(self) -> int:
+        return HEADER.size + 4 * (len(self.table) + len(self.packed))
+
+    @property
+    def bits_per_knu(self) -> float:
+        """Serialized size per KNU, header and table included (DENSE-32 is 32)."""
+
+        return 8.0 * self.nbytes / self.count if self.count else 0.0
+
+    def to_bytes(self) -> bytes:
+        header = HEADER.pack(
+            STREAM_MAGIC, self.radix, self.index_digits, self.payload_digits, self.count, len(self.table)
+        )
+        return header + self.table.astype("<u4").tobytes() + self.packed.astype("<u4").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ProfileStream":
+        _require_numpy()
+        if len(data) < HEADER.size:
+            raise ProfileFormatError("Profile stream too small for header")
+        magic, radix, index_digits, payload_digits, count, table_len = HEADER.unpack_from(data, 0)
+        if magic != STREAM_MAGIC:
+            raise ProfileFormatError("Invalid profile stream magic")
+        if radix not in PROFILE_BY_RADIX:
+            raise ProfileFormatError(f"Unknown profile radix {radix}")
+        spw = SYMBOLS_PER_WORD[radix]
+        n_packed = -(-count * (index_digits + payload_digits) // spw)
+        if len(data) != HEADER.size + 4 * (table_len + n_packed):
+            raise ProfileFormatError("Profile stream length does not match its header")
+        body = np.frombuffer(data, dtype="<u4", offset=HEADER.size)
+        return cls(
+            PROFILE_BY_RADIX[radix],
+            count,
+            index_digits,
+            payload_digits,
+            body[:table_len].astype(np.uint32),
+            body[table_len:].astype(np.uint32),
+        )
+
+
+# ------------------------------------------------------------
+# Codecs
+# ------------------------------------------------------------
+
+def _payload_codes(payload, radix: int):
+    """Map u8 payloads to digit codes: balanced (signed) for radix 3, plain for radix 4."""
+
+    if radix == 3:
+        signed = payload.astype(np.int64) - ((payload & 0x80).astype(np.int64) << 1)
+        bound = int(np.abs(signed).max(initial=0))
+        digits = _digits_for(3, 2 * bound + 1)
+        return (signed + (3**digits - 1) // 2).astype(np.uint64), digits
+    digits = _digits_for(4, int(payload.max(initial=0)) + 1)
+    return payload.astype(np.uint64), digits
+
+
+def _payload_values(codes, radix: int, digits: int):
+    if radix == 3:
+        return ((codes.astype(np.int64) - (3**digits - 1) // 2) & 0xFF).astype(np.uint32)
+    return codes.astype(np.uint32)
+
+
+def encode_profile(words: Sequence[int], profile: str = PROFILE_BRANCH) -> ProfileStream:
+    """Re-encode DENSE-32 `words` under `profile`; raises `KhlNaryParityError` on a corrupt word."""
+
+    _require_numpy()
+    if profile not in RADIX:
+        raise ProfileFormatError(f"Unknown profile {profile!r}")
+    radix = RADIX[profile]
+    words = np.asarray(words, dtype=np.uint32).reshape(-1)
+    bad = np.flatnonzero(_parity(words))
+    if bad.size:
+        raise KhlNaryParityError(f"KNU {int(bad[0])} (0x{int(words[bad[0]]):08x}) fails parity")
+
+    table, index = np.unique(words & np.uint32(_DESCRIPTOR_MASK), return_inverse=True)
+    codes, payload_digits = _payload_codes((words >> np.uint32(4)) & np.uint32(0xFF), radix)
+    index_digits = max(1, _digits_for(radix, len(table)))
+    width = index_digits + payload_digits
+
+    values = index.reshape(-1).astype(np.uint64) * np.uint64(radix**payload_digits) + codes
+    weights = np.uint64(radix) ** np.arange(width - 1, -1, -1, dtype=np.uint64)
+    symbols = ((values[:, None] // weights) % np.uint64(radix)).reshape(-1)
+
+    spw = SYMBOLS_PER_WORD[radix]
+    symbols = np.concatenate([symbols, np.zeros(-len(symbols) % spw, dtype=np.uint64)])
+    place = np.uint64(radix) ** np.arange(spw, dtype=np.uint64)
+    packed = (symbols.reshape(-1, spw) * place).sum(axis=1).astype(np.uint32)
+    return ProfileStream(profile, len(words), index_digits, payload_digits, table.astype(np.uint32), packed)
+
+
+def decode_profile(stream: ProfileStream):
+    """Return the original DENSE-32 words (uint32 array) for `stream`."""
+
+    _require_numpy()
+    radix = stream.radix
+    width = stream.index_digits + stream.payload_digits
+    spw = SYMBOLS_PER_WORD[radix]
+    place = np.uint64(radix) ** np.arange(spw, dtype=np.uint64)
+    symbols = ((stream.packed.astype(np.uint64)[:, None] // place) % np.uint64(radix)).reshape(-1)
+    symbols = symbols[: stream.count * width].reshape(stream.count, width)
+
+    weights = np.uint64(radix) ** np.arange(width - 1, -1, -1, dtype=np.uint64)
+    values = (symbols * weights).sum(axis=1)
+    index, codes = np.divmod(values, np.uint64(radix**stream.payload_digits))
+    if stream.count and int(index.max()) >= len(stream.table):
+        raise ProfileFormatError("Descriptor index out of range")
+
+    words = stream.table[index.astype(np.intp)] | (_payload_values(codes, radix, stream.payload_digits) << np.uint32(4))
+    return words | _parity(words)
+
+
+def density_report(words: Sequence[int], *, repeats: int = 3) -> Dict[str, Dict[str, float]]:
+    """Bits per KNU and best-of-`repeats` encode/decode throughput (KNU/s) per profile."""
+
+    report = {PROFILE_DENSE: {"bits_per_knu": 32.0}}
+    for profile in RADIX:
+        encode_s = decode_s = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            stream = encode_profile(words, profile)
+            encode_s = min(encode_s, time.perf_counter() - started)
+            started = time.perf_counter()
+            decode_profile(stream)
+            decode_s = min(decode_s, time.perf_counter() - started)
+        report[profile] = {
+            "bits_per_knu": stream.bits_per_knu,
+            "encode_knu_per_s": len(words) / encode_s if encode_s else 0.0,
+            "decode_knu_per_s": len(words) / decode_s if decode_s else 0.0,
+        }
+    return report
+
+
+__all__ = [
+    "PROFILE_DENSE",
+    "PROFILE_BRANCH",
+    "PROFILE_VECTOR",
+    "ProfileFormatError",
+    "ProfileStream",
+    "encode_profile",
+    "decode_profile",
+    "density_report",
+]
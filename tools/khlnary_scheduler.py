@@ -0,0 +1,229 @@
+"""Dependency-aware parallel execution of KHΛNARY tensor graphs.
+
+`build_task_graph` turns the dataflow graph of a module into a DAG of tasks:
+one per graph node, except that attention glyphs are split into three
+independent Q/K/V projection tasks plus the attention itself. Weight loads
+are tasks too, so the Q, K and V loads and projections of an attention layer
+can all overlap. When the module carries a memory plan, a task whose arena
+buffer reuses bytes of an earlier buffer also waits for every reader of that
+earlier buffer.
+
+`ParallelExecutor` runs the DAG on a thread pool (NumPy releases the GIL in
+matmuls and file reads). Every task computes exactly what the sequential
+`CpuExecutor` computes for it, so results are bitwise identical to a
+sequential run regardless of completion order (`lowering-rules.md` §5).
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import importlib
+import importlib.util
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from tools.khlnary_compiler import LOAD_GLYPH, KhlnaryGraph, KhlnaryModule
+from tools.khlnary_cpu import (
+    KERNELS,
+    CpuExecutor,
+    attend_projected,
+    attention_params,
+    fused_attend_projected,
+)
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+ATTENTION_GLYPHS = ("G_SCALED_DOT_PRODUCT", "G_FUSED_ATTENTION")
+PROJECTIONS = ("q", "k", "v")
+
+# A task is `(node_id, part)`: part "" is the node itself, "q"/"k"/"v" are the
+# projections of an attention node.
+TaskKey = Tuple[int, str]
+
+
+@dataclass
+class TaskGraph:
+    deps: Dict[TaskKey, List[TaskKey]]
+
+    def dependents(self) -> Dict[TaskKey, List[TaskKey]]:
+        users: Dict[TaskKey, List[TaskKey]] = {key: [] for key in self.deps}
+        for key in sorted(self.deps):
+            for dep in self.deps[key]:
+                users[dep].append(key)
+        return users
+
+    def order(self) -> List[TaskKey]:
+        """Deterministic topological order (Kahn's algorithm, smallest key first)."""
+
+        remaining = {key: len(deps) for key, deps in self.deps.items()}
+        users = self.dependents()
+        ready = sorted(key for key, n in remaining.items() if n == 0)
+        order: List[TaskKey] = []
+        while ready:
+            key = ready.pop(0)
+            order.append(key)
+            for user in users[key]:
+                remaining[user] -= 1
+                if remaining[user] == 0:
+                    ready.append(user)
+            ready.sort()
+        return order
+
+    def levels(self) -> List[List[TaskKey]]:
+        """Tasks grouped by earliest start step when every task takes one step."""
+
+        depth: Dict[TaskKey, int] = {}
+        for key in self.order():
+            depth[key] = 1 + max((depth[d] for d in self.deps[key]), default=-1)
+        levels: List[List[TaskKey]] = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for key in sorted(depth):
+            levels[depth[key]].append(key)
+        return levels
+
+
+def _arena_hazards(graph: KhlnaryGraph, plan: Optional[Mapping[str, object]]) -> Dict[int, List[int]]:
+    """Extra `node -> [nodes]` waits so reused arena bytes are not overwritten while still read."""
+
+    if not plan:
+        return {}
+    by_knu = {node.knu_index: node.node_id for node in graph.nodes}
+    users = graph.consumers()
+    buffers = plan["buffers"]
+    hazards: Dict[int, List[int]] = {}
+    for a in buffers:
+        for b in buffers:
+            if a["last_use"] >= b["first_use"]:
+                continue
+            if a["offset"] < b["offset"] + b["size"] and b["offset"] < a["offset"] + a["size"]:
+                earlier = by_knu[a["knu_index"]]
+                hazards.setdefault(by_knu[b["knu_index"]], []).extend([earlier] + users[earlier])
+    return hazards
+
+
+def build_task_graph(graph: KhlnaryGraph, plan: Optional[Mapping[str, object]] = None) -> TaskGraph:
+    hazards = _arena_hazards(graph, plan)
+    deps: Dict[TaskKey, List[TaskKey]] = {}
+    for node in graph.nodes:
+        extra = [(n, "") for n in hazards.get(node.node_id, []) if n != node.node_id]
+        if node.op in ATTENTION_GLYPHS:
+            x, *weights = node.inputs
+            for part, w in zip(PROJECTIONS, weights):
+                deps[(node.node_id, part)] = [(x, ""), (w, "")]
+            deps[(node.node_id, "")] = sorted(set([(node.node_id, p) for p in PROJECTIONS] + extra))
+        else:
+            deps[(node.node_id, "")] = sorted(set([(src, "") for src in node.inputs] + extra))
+    return TaskGraph(deps)
+
+
+# ------------------------------------------------------------
+# Executor
+# ------------------------------------------------------------
+
+@dataclass(frozen=True)
+class ScheduleReport:
+    tasks: int
+    levels: int  # critical path length in tasks
+    max_width: int  # widest level of the DAG
+    critical_path_seconds: float  # longest dependency chain of measured task times
+    work_seconds: float
+    wall_seconds: float
+    workers: int
+    timings: Dict[TaskKey, float] = field(default_factory=dict, repr=False)
+
+    @property
+    def parallelism(self) -> float:
+        """Achieved parallelism: total task time over wall time."""
+        return self.work_seconds / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+
+class ParallelExecutor:
+    """Run a tensor module's task DAG on a thread pool; see the module docstring."""
+
+    def __init__(self, module: KhlnaryModule, *, workers: int = 4, mmap_weights: bool = False) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.executor = CpuExecutor(module, mmap_weights=mmap_weights)
+        self.graph = self.executor.graph
+        self.tasks = build_task_graph(self.graph, module.metadata.get("memory_plan"))
+        self.workers = workers
+        self.last_report: Optional[ScheduleReport] = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="khlnary-sched")
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def __enter__(self) -> "ParallelExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _execute(self, key: TaskKey, values: Mapping[TaskKey, object], arena: Mapping[int, object]):
+        started = time.perf_counter()
+        node = self.graph.nodes[key[0]]
+        if node.op == LOAD_GLYPH:
+            result = self.executor.weight(node)
+        elif key[1]:
+            x = values[(node.inputs[0], "")]
+            w = values[(node.inputs[1 + PROJECTIONS.index(key[1])], "")]
+            result = x @ w
+        elif node.op in ATTENTION_GLYPHS:
+            heads, scale = attention_params(node)
+            attend = fused_attend_projected if node.op == "G_FUSED_ATTENTION" else attend_projected
+            q, k, v = (values[(node.node_id, p)] for p in PROJECTIONS)
+            result = attend(q, k, v, scale, heads)
+            out = arena.get(node.knu_index)
+            if out is not None:
+                np.copyto(out, result)
+                result = out
+        else:
+            args = [values[(src, "")] for src in node.inputs]
+            result = KERNELS[node.op](node, *args, out=arena.get(node.knu_index))
+        return result, time.perf_counter() - started
+
+    def run(self, x):
+        started = time.perf_counter()
+        values: Dict[TaskKey, object] = {(0, ""): np.asarray(x, dtype=np.float32)}
+        arena = self.executor.arena_views(values[(0, "")])
+        remaining = {key: len(deps) for key, deps in self.tasks.deps.items()}
+        users = self.tasks.dependents()
+        timings: Dict[TaskKey, float] = {(0, ""): 0.0}
+        for user in users[(0, "")]:
+            remaining[user] -= 1
+        ready = sorted(key for key, n in remaining.items() if n == 0 and key != (0, ""))
+        running = {}
+        while ready or running:
+            for key in ready:
+                running[self._pool.submit(self._execute, key, values, arena)] = key
+            ready = []
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=running.get):
+                key = running.pop(future)
+                values[key], timings[key] = future.result()
+                for user in users[key]:
+                    remaining[user] -= 1
+                    if remaining[user] == 0:
+                        ready.append(user)
+            ready.sort()
+        wall = time.perf_counter() - started
+
+        finish: Dict[TaskKey, float] = {}
+        for key in self.tasks.order():
+            finish[key] = timings[key] + max((finish[d] for d in self.tasks.deps[key]), default=0.0)
+        levels = self.tasks.levels()
+        self.last_report = ScheduleReport(
+            tasks=len(self.tasks.deps),
+            levels=len(levels),
+            max_width=max((len(level) for level in levels), default=0),
+            critical_path_seconds=max(finish.values(), default=0.0),
+            work_seconds=sum(timings.values()),
+            wall_seconds=wall,
+            workers=self.workers,
+            timings=timings,
+        )
+        return values[(self.graph.output, "")]
+
+
+__all__ = ["TaskGraph", "ScheduleReport", "ParallelExecutor", "build_task_graph"]
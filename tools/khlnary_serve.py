@@ -0,0 +1,245 @@
+"""In-process dynamic batching for KHΛNARY inference on the CPU executor.
+
+Requests are queued in arrival order and taken from the front into batches
+of up to `max_batch_size` consecutive same-shaped inputs; a batch is
+dispatched once it is full, the next queued request has another shape, or
+its oldest request has waited `max_wait` seconds. Each batch runs as a single
+`CpuExecutor.run` call over a stacked `[batch, seq, hidden]` input, so the
+matmuls of every linear/attention glyph see the whole batch. Attention runs
+over the sequence axis only, so requests never attend to each other.
+
+All worker threads share one executor whose weights are memory-mapped and
+preloaded, so the weights are held once per process.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from dataclasses import dataclass
+import importlib
+import importlib.util
+import threading
+import time
+from typing import Deque, List, Optional
+
+from tools.khlnary_compiler import KhlnaryModule
+from tools.khlnary_cpu import CpuExecutor
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+MAX_BATCH_SIZE = 32
+MAX_WAIT_SECONDS = 0.002
+LATENCY_WINDOW = 10_000
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for the KHΛNARY batching server")
+    return np
+
+
+class ServerClosedError(RuntimeError):
+    """Raised when submitting to a server that is not running."""
+
+
+@dataclass
+class _Request:
+    x: object
+    future: Future
+    enqueued: float
+
+
+@dataclass(frozen=True)
+class ServeStats:
+    """Latency percentiles (ms) over the last `LATENCY_WINDOW` requests and overall throughput."""
+
+    requests: int
+    batches: int
+    mean_batch_size: float
+    p50_ms: float
+    p99_ms: float
+    throughput_rps: float
+
+    def format(self) -> str:
+        return (
+            f"{self.requests} requests in {self.batches} batches (mean {self.mean_batch_size:.1f}); "
+            f"p50 {self.p50_ms:.2f} ms, p99 {self.p99_ms:.2f} ms, {self.throughput_rps:.0f} req/s"
+        )
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class BatchingServer:
+    """Queue inference requests and run them in dynamically formed batches.
+
+    Use as a context manager, or call `start()`/`stop()`. `submit` returns a
+    `concurrent.futures.Future` resolving to the output for that one input;
+    `infer` blocks for it.
+    """
+
+    def __init__(
+        self,
+        module: KhlnaryModule,
+        *,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait: float = MAX_WAIT_SECONDS,
+        workers: int = 2,
+        mmap_weights: bool = True,
+    ) -> None:
+        _require_numpy()
+        if max_batch_size < 1 or workers < 1:
+            raise ValueError("max_batch_size and workers must be >= 1")
+        self.executor = CpuExecutor(module, mmap_weights=mmap_weights).preload()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self._pending: Deque[_Request] = deque()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._requests = 0
+        self._batches = 0
+        self._first_enqueued: Optional[float] = None
+        self._last_done: Optional[float] = None
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+
+    def start(self) -> "BatchingServer":
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"khlnary-serve-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop accepting requests, drain the queue and join the workers."""
+
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self) -> "BatchingServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------
+
+    def submit(self, x) -> Future:
+        request = _Request(np.asarray(x, dtype=np.float32), Future(), time.perf_counter())
+        with self._cond:
+            if not self._running:
+                raise ServerClosedError("BatchingServer is not running")
+            if self._first_enqueued is None:
+                self._first_enqueued = request.enqueued
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future
+
+    def infer(self, x, timeout: Optional[float] = None):
+        return self.submit(x).result(timeout)
+
+    def _take_batch(self) -> List[_Request]:
+        """Block until a batch is ready; an empty list means shut down."""
+
+        with self._cond:
+            while not self._pending:
+                if not self._running:
+                    return []
+                self._cond.wait()
+            head = self._pending.popleft()
+            batch = [head]
+            shape = head.x.shape
+            deadline = head.enqueued + self.max_wait
+            pending = self._pending
+            while True:
+                while len(batch) < self.max_batch_size and pending and pending[0].x.shape == shape:
+                    batch.append(pending.popleft())
+                remaining = deadline - time.perf_counter()
+                if len(batch) == self.max_batch_size or pending or remaining <= 0 or not self._running:
+                    break
+                self._cond.wait(remaining)
+            if pending:
+                self._cond.notify()  # hand the rest of the queue to another worker
+            return batch
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        # Requests cancelled while queued are dropped; the rest can no longer be cancelled.
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # A lone row is a one-token sequence, so attention stays per request.
+        stacked = np.stack([r.x if r.x.ndim > 1 else r.x[None, :] for r in batch])
+        try:
+            out = self.executor.run(stacked)
+        except Exception as exc:  # surface kernel errors on every waiting future
+            for request in batch:
+                request.future.set_exception(exc)
+            return
+        done = time.perf_counter()
+        for request, result in zip(batch, out):
+            request.future.set_result(result if request.x.ndim > 1 else result[0])
+        with self._cond:
+            self._requests += len(batch)
+            self._batches += 1
+            self._latencies.extend(done - r.enqueued for r in batch)
+            self._last_done = done
+
+    def _worker(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                self._run_batch(batch)
+            except Exception as exc:  # a per-batch failure must not stop the worker
+                for request in batch:
+                    if not request.future.done():
+                        try:
+                            request.future.set_exception(exc)
+                        except InvalidStateError:
+                            pass
+
+    # ------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------
+
+    def stats(self) -> ServeStats:
+        with self._cond:
+            latencies = sorted(self._latencies)
+            requests, batches = self._requests, self._batches
+            elapsed = (self._last_done or 0.0) - (self._first_enqueued or 0.0)
+        return ServeStats(
+            requests=requests,
+            batches=batches,
+            mean_batch_size=requests / batches if batches else 0.0,
+            p50_ms=_percentile(latencies, 50) * 1e3,
+            p99_ms=_percentile(latencies, 99) * 1e3,
+            throughput_rps=requests / elapsed if elapsed > 0 else 0.0,
+        )
+
+
+__all__ = ["BatchingServer", "ServeStats", "ServerClosedError"]
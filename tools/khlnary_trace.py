@@ -0,0 +1,255 @@
+"""Deterministic execution traces for the scalar VM and the CPU executor.
+
+A `TraceRecorder` writes one fixed-size 40-byte record per executed step
+into a preallocated ring buffer, in memory or in an mmap'd file, keeping
+the most recent `capacity` steps. Records hold the PC, the KNU word, the
+stack depth (VM) or operand count (executor), up to three tensor handles
+(the executor's output and first two input node ids) and a nanosecond
+timestamp relative to the start of recording.
+
+    trace = TraceRecorder(path="run.ktr")
+    KhlnaryVM.from_module(module).run(trace=trace)
+    trace.close()
+
+    python tools/khlnary_trace.py dump run.ktr
+    python tools/khlnary_trace.py diff a.ktr b.ktr
+
+Trace file layout (little endian): a 32-byte header
+`magic "KTR1", version u16, record size u16, capacity u32, count u64,
+start wall-clock ns u64, 4 pad bytes`, then `capacity` records
+`seq u32, pc u32, word u32, depth u32, kind u8, flags u8, 2 pad bytes,
+out u32, in0 u32, in1 u32, t_ns u64` (40 bytes). Record `seq` lives in slot
+`seq % capacity`. Version 1 traces used 16-bit depth and handles, which
+overflowed on graphs past 65535 nodes; they are rejected.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+import mmap
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+if __package__ is None or __package__ == "":
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+TRACE_MAGIC = b"KTR1"
+TRACE_VERSION = 2
+HEADER = struct.Struct("<4sHHIQQ4x")
+RECORD = struct.Struct("<IIIIBB2xIIIQ")
+DEFAULT_CAPACITY = 1 << 16
+
+_clock = time.perf_counter_ns
+
+KIND_VM = 0
+KIND_TENSOR = 1
+NO_HANDLE = 0xFFFFFFFF
+
+
+class TraceFormatError(ValueError):
+    """Raised when trace bytes are malformed."""
+
+
+class TraceRecord(NamedTuple):
+    seq: int
+    pc: int
+    word: int
+    depth: int
+    kind: int
+    flags: int
+    out: int
+    in0: int
+    in1: int
+    t_ns: int
+
+
+class TraceRecorder:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, *, path=None) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self.path = Path(path) if path is not None else None
+        size = HEADER.size + capacity * RECORD.size
+        self._file = None
+        if self.path is None:
+            self._buffer = bytearray(size)
+        else:
+            self._file = self.path.open("w+b")
+            self._file.truncate(size)
+            self._buffer = mmap.mmap(self._file.fileno(), size)
+        self._count = 0
+        self._pack = RECORD.pack_into
+        self._offsets = range(HEADER.size, HEADER.size + capacity * RECORD.size, RECORD.size)
+        self._start_ns = _clock()
+        self._wall_ns = time.time_ns()
+
+    @property
+    def count(self) -> int:
+        """Records written so far, including those overwritten in the ring."""
+        return self._count
+
+    def record(
+        self,
+        kind: int,
+        pc: int,
+        word: int,
+        depth: int = 0,
+        out: int = NO_HANDLE,
+        in0: int = NO_HANDLE,
+        in1: int = NO_HANDLE,
+        flags: int = 0,
+    ) -> None:
+        """Append one record; `depth` and the handles must fit in 32 bits."""
+
+        seq = self._count
+        self._count = seq + 1
+        self._pack(
+            self._buffer,
+            self._offsets[seq % self.capacity],
+            seq & 0xFFFFFFFF,
+            pc,
+            word,
+            depth,
+            kind,
+            flags,
+            out,
+            in0,
+            in1,
+            _clock() - self._start_ns,
+        )
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(
+            self._buffer, 0, TRACE_MAGIC, TRACE_VERSION, RECORD.size, self.capacity, self._count, self._wall_ns
+        )
+
+    def to_bytes(self) -> bytes:
+        self._write_header()
+        return bytes(self._buffer)
+
+    def records(self) -> List[TraceRecord]:
+        return decode_trace(self.to_bytes())
+
+    def flush(self) -> None:
+        self._write_header()
+        if self._file is not None:
+            self._buffer.flush()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self.flush()
+        self._buffer.close()
+        self._file.close()
+        self._file = None
+
+    def __enter__(self) -> "TraceRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ------------------------------------------------------------
+# Decoding and diffing
+# ------------------------------------------------------------
+
+def decode_trace(data: bytes) -> List[TraceRecord]:
+    """Return the retained records in execution order."""
+
+    if len(data) < HEADER.size:
+        raise TraceFormatError("Trace too small for header")
+    magic, version, record_size, capacity, count, _ = HEADER.unpack_from(data, 0)
+    if magic != TRACE_MAGIC:
+        raise TraceFormatError("Invalid trace magic")
+    if version != TRACE_VERSION or record_size != RECORD.size:
+        raise TraceFormatError(f"Unsupported trace version {version} / record size {record_size}")
+    if len(data) < HEADER.size + capacity * RECORD.size:
+        raise TraceFormatError("Trace truncated")
+    records = []
+    for seq in range(max(0, count - capacity), count):
+        records.append(TraceRecord._make(RECORD.unpack_from(data, HEADER.size + (seq % capacity) * RECORD.size)))
+    return records
+
+
+def read_trace(path) -> List[TraceRecord]:
+    return decode_trace(Path(path).read_bytes())
+
+
+@dataclass(frozen=True)
+class TraceDivergence:
+    index: int  # position in the compared record lists
+    left: Optional[TraceRecord]  # None when that trace ended first
+    right: Optional[TraceRecord]
+    fields: Tuple[str, ...]
+
+
+def diff_traces(
+    left: Sequence[TraceRecord], right: Sequence[TraceRecord], *, ignore: Sequence[str] = ("seq", "t_ns")
+) -> Optional[TraceDivergence]:
+    """First record where two traces differ outside `ignore`; None if they replay identically."""
+
+    compared = [name for name in TraceRecord._fields if name not in ignore]
+    for i, (a, b) in enumerate(zip(left, right)):
+        fields = tuple(name for name in compared if getattr(a, name) != getattr(b, name))
+        if fields:
+            return TraceDivergence(i, a, b, fields)
+    if len(left) != len(right):
+        i = min(len(left), len(right))
+        return TraceDivergence(i, left[i] if i < len(left) else None, right[i] if i < len(right) else None, ("length",))
+    return None
+
+
+def format_record(r: TraceRecord) -> str:
+    handles = " ".join(f"{name}={v}" for name, v in (("out", r.out), ("in0", r.in0), ("in1", r.in1)) if v != NO_HANDLE)
+    kind = "vm" if r.kind == KIND_VM else "tensor"
+    glyph = (r.word >> 20) & 0xFF
+    head = f"{r.seq:>8} {r.t_ns:>12}ns {kind:<6} pc={r.pc:<6} word=0x{r.word:08x} glyph=0x{glyph:02x}"
+    return f"{head} depth={r.depth} {handles}".rstrip()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Decode or diff KHΛNARY execution traces")
+    sub = parser.add_subparsers(dest="command", required=True)
+    dump = sub.add_parser("dump", help="print every retained record")
+    dump.add_argument("trace", type=Path)
+    diff = sub.add_parser("diff", help="report the first divergence between two traces")
+    diff.add_argument("left", type=Path)
+    diff.add_argument("right", type=Path)
+    args = parser.parse_args(argv)
+
+    if args.command == "dump":
+        for r in read_trace(args.trace):
+            print(format_record(r))
+        return 0
+    divergence = diff_traces(read_trace(args.left), read_trace(args.right))
+    if divergence is None:
+        print("traces are identical")
+        return 0
+    print(f"traces diverge at record {divergence.index} ({', '.join(divergence.fields)})")
+    for side, r in (("<", divergence.left), (">", divergence.right)):
+        print(f"{side} {format_record(r) if r else '(end of trace)'}")
+    return 1
+
+
+__all__ = [
+    "TraceRecorder",
+    "TraceRecord",
+    "TraceDivergence",
+    "TraceFormatError",
+    "KIND_VM",
+    "KIND_TENSOR",
+    "NO_HANDLE",
+    "decode_trace",
+    "read_trace",
+    "diff_traces",
+    "format_record",
+    "main",
+]
+
+if __name__ == "__main__":
+    sys.exit(main())
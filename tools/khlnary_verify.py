@@ -0,0 +1,326 @@
+"""Whole-module verifier for the KHΛNARY v0.2 replay law (khlnary-v2.md §7).
+
+`verify_module` checks every KNU of a `KhlnaryModule` in one pass over
+column arrays (NumPy when available, a plain loop otherwise):
+
+- `VER` is an accepted version
+- parity is even over bits 31..0
+- `AUTH_CLASS` is non-zero and within the execution context's authority
+- the glyph id is known
+- `.bin` glyph references resolve in the bin file / shape tables
+- relative jump targets stay within `[0, knu_count]`
+- `G_CALL` / `G_FUNC_DEF` ids resolve in the function table
+
+A clean result is stamped into `module.metadata["verified"]` together with a
+digest of the KNU stream and tables. The certificate carries an HMAC under a
+key that is random per process, so a certificate read back from a file or
+edited by hand never verifies. `is_verified` checks the HMAC and that the
+module still matches what was verified, so executors can skip
+per-instruction validation on the hot path. The match check compares a
+snapshot kept on the module object, which is much cheaper than re-hashing.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import hashlib
+import hmac
+import importlib
+import importlib.util
+import json
+import os
+import struct
+from typing import List, Sequence
+
+from tools.khlnary_encoder import AUTH_CLASS_USER, GLYPH_IDS
+from tools.kuhul_glyphs import KUHUL_GLYPHS_BY_ID
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+VERIFIER_VERSION = 2
+PROFILE = "KHΛ-2-DENSE-32"
+
+# Keys certificates to this process; nothing persisted or copied from
+# another process carries a valid MAC.
+_CERT_KEY = os.urandom(32)
+# Private attribute holding (knus, bin_files, tensors, functions) as verified.
+_SNAPSHOT_ATTR = "_khlnary_verified_snapshot"
+
+G_LOAD_BIN_TENSOR = GLYPH_IDS["G_LOAD_BIN_TENSOR"]
+G_MMAP_BIN_REGION = GLYPH_IDS["G_MMAP_BIN_REGION"]
+G_PREFETCH_BIN = GLYPH_IDS["G_PREFETCH_BIN"]
+BIN_GLYPHS = (G_LOAD_BIN_TENSOR, G_MMAP_BIN_REGION, G_PREFETCH_BIN)
+JUMP_GLYPHS = (GLYPH_IDS["G_IFZ_JUMP8"], GLYPH_IDS["G_JUMP8"])
+G_FUNC_DEF = GLYPH_IDS["G_FUNC_DEF"]
+G_FUNC_END = GLYPH_IDS["G_FUNC_END"]
+G_CALL = GLYPH_IDS["G_CALL"]
+
+KNOWN_GLYPH_IDS = frozenset(GLYPH_IDS.values()) | frozenset(KUHUL_GLYPHS_BY_ID)
+
+# Audit outcomes (the values of tools.khlnary_audit.ALLOW / DENY); the
+# `audit` hook is duck-typed, so the writer module is not imported here.
+ALLOW = "allow"
+DENY = "deny"
+
+# Diagnostic codes
+PARITY = "parity"
+VERSION = "version"
+AUTHORITY = "authority"
+UNKNOWN_GLYPH = "unknown_glyph"
+UNRESOLVED_BIN = "unresolved_bin"
+JUMP_BOUNDS = "jump_bounds"
+UNRESOLVED_FUNCTION = "unresolved_function"
+FUNCTION_TABLE = "function_table"
+
+
+@dataclass(frozen=True)
+class VerifyDiagnostic:
+    code: str
+    knu_index: int
+    message: str
+
+
+@dataclass
+class VerifyReport:
+    knu_count: int
+    digest: str
+    diagnostics: List[VerifyDiagnostic] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.diagnostics
+
+
+class KhlNaryVerifyError(ValueError):
+    """Raised when a module violates the replay law."""
+
+    def __init__(self, diagnostics: Sequence[VerifyDiagnostic]) -> None:
+        self.diagnostics = list(diagnostics)
+        first = self.diagnostics[0]
+        more = f" (+{len(self.diagnostics) - 1} more)" if len(self.diagnostics) > 1 else ""
+        super().__init__(f"KNU {first.knu_index}: {first.code}: {first.message}{more}")
+
+
+def module_digest(module) -> str:
+    """SHA-256 over the KNU stream and the bin/shape/function tables."""
+
+    h = hashlib.sha256()
+    if np is not None:
+        h.update(np.asarray(module.knus, dtype="<u4").tobytes())
+    else:
+        h.update(struct.pack(f"<{len(module.knus)}I", *module.knus))
+    tables = {
+        "bin_files": sorted((int(k), str(v)) for k, v in module.bin_files.items()),
+        "tensors": [(t.file_id, t.tensor_id, t.dtype, list(t.shape), t.offset, t.layout) for t in module.tensors],
+        "functions": sorted(
+            (f.func_id, f.entry_pc, f.end_pc, f.arity, f.num_locals) for f in module.functions.values()
+        ),
+    }
+    h.update(json.dumps(tables, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _snapshot(module):
+    return (list(module.knus), dict(module.bin_files), list(module.tensors), dict(module.functions))
+
+
+def _unchanged(module, snapshot) -> bool:
+    knus, bin_files, tensors, functions = snapshot
+    current = module.knus if isinstance(module.knus, list) else list(module.knus)
+    return (
+        current == knus
+        and module.bin_files == bin_files
+        and module.tensors == tensors
+        and module.functions == functions
+    )
+
+
+def _cert_mac(cert) -> str:
+    body = json.dumps({k: v for k, v in cert.items() if k != "mac"}, sort_keys=True).encode("utf-8")
+    return hmac.new(_CERT_KEY, body, hashlib.sha256).hexdigest()
+
+
+def _lookup_tables(module):
+    shapes = [False] * 256
+    for t in module.tensors:
+        if t.file_id in module.bin_files and t.file_id < 16 and t.tensor_id < 16:
+            shapes[(t.file_id << 4) | t.tensor_id] = True
+    files = [i in module.bin_files for i in range(256)]
+    funcs = [i in module.functions for i in range(256)]
+    known = [i in KNOWN_GLYPH_IDS for i in range(256)]
+    return known, shapes, files, funcs
+
+
+def _popcount32(words):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    return np.unpackbits(words.view(np.uint8)).reshape(words.size, 32).sum(axis=1)
+
+
+def _scan_numpy(module, versions, max_authority) -> List[VerifyDiagnostic]:
+    words = np.asarray(module.knus, dtype=np.uint32)
+    n = words.size
+    ver = words >> 28
+    glyph = (words >> 20) & 0xFF
+    payload = (words >> 4) & 0xFF
+    auth = (words >> 1) & 0x7
+    ones = _popcount32(words)
+    known, shapes, files, funcs = (np.array(t, dtype=bool) for t in _lookup_tables(module))
+
+    is_load = glyph == G_LOAD_BIN_TENSOR
+    is_file_ref = (glyph == G_MMAP_BIN_REGION) | (glyph == G_PREFETCH_BIN)
+    is_jump = np.isin(glyph, JUMP_GLYPHS)
+    is_func = (glyph == G_CALL) | (glyph == G_FUNC_DEF)
+    targets = np.arange(n) + payload.astype(np.uint8).view(np.int8).astype(np.int64)
+
+    unresolved_bin = (is_load & ~shapes[payload]) | (is_file_ref & ~files[payload])
+    checks = [
+        (PARITY, (ones & 1) != 0, None, "odd parity"),
+        (VERSION, ~np.isin(ver, list(versions)), ver, "unsupported VER 0x{value:x}"),
+        (AUTHORITY, (auth == 0) | (auth > max_authority), auth, "authority class {value} not allowed"),
+        (UNKNOWN_GLYPH, ~known[glyph], glyph, "unknown glyph id 0x{value:02x}"),
+        (UNRESOLVED_BIN, unresolved_bin, payload, "unresolved bin ref 0x{value:02x}"),
+        (JUMP_BOUNDS, is_jump & ((targets < 0) | (targets > n)), targets, "jump target {value} out of bounds"),
+        (UNRESOLVED_FUNCTION, is_func & ~funcs[payload], payload, "function {value} not in function table"),
+    ]
+    diagnostics = []
+    for code, mask, column, message in checks:
+        for i in np.flatnonzero(mask):
+            value = int(column[i]) if column is not None else 0
+            diagnostics.append(VerifyDiagnostic(code, int(i), message.format(value=value)))
+    return diagnostics
+
+
+def _scan_python(module, versions, max_authority) -> List[VerifyDiagnostic]:
+    known, shapes, files, funcs = _lookup_tables(module)
+    n = len(module.knus)
+    diagnostics = []
+    for i, word in enumerate(module.knus):
+        word &= 0xFFFFFFFF
+        ver, glyph, payload, auth = word >> 28, (word >> 20) & 0xFF, (word >> 4) & 0xFF, (word >> 1) & 0x7
+        if word.bit_count() & 1:
+            diagnostics.append(VerifyDiagnostic(PARITY, i, "odd parity"))
+        if ver not in versions:
+            diagnostics.append(VerifyDiagnostic(VERSION, i, f"unsupported VER 0x{ver:x}"))
+        if auth == 0 or auth > max_authority:
+            diagnostics.append(VerifyDiagnostic(AUTHORITY, i, f"authority class {auth} not allowed"))
+        if not known[glyph]:
+            diagnostics.append(VerifyDiagnostic(UNKNOWN_GLYPH, i, f"unknown glyph id 0x{glyph:02x}"))
+        if (glyph == G_LOAD_BIN_TENSOR and not shapes[payload]) or (
+            glyph in (G_MMAP_BIN_REGION, G_PREFETCH_BIN) and not files[payload]
+        ):
+            diagnostics.append(VerifyDiagnostic(UNRESOLVED_BIN, i, f"unresolved bin ref 0x{payload:02x}"))
+        if glyph in JUMP_GLYPHS:
+            target = i + (payload - 0x100 if payload & 0x80 else payload)
+            if not 0 <= target <= n:
+                diagnostics.append(VerifyDiagnostic(JUMP_BOUNDS, i, f"jump target {target} out of bounds"))
+        if glyph in (G_CALL, G_FUNC_DEF) and not funcs[payload]:
+            diagnostics.append(VerifyDiagnostic(UNRESOLVED_FUNCTION, i, f"function {payload} not in function table"))
+    return diagnostics
+
+
+def _check_function_table(module) -> List[VerifyDiagnostic]:
+    n = len(module.knus)
+    diagnostics = []
+    for func_id, entry in sorted(module.functions.items()):
+        def_pc = entry.entry_pc - 1
+        def_ok = 0 <= def_pc < n and (module.knus[def_pc] >> 20) & 0xFF == G_FUNC_DEF
+        if not def_ok or (module.knus[def_pc] >> 4) & 0xFF != func_id:
+            message = f"function {func_id} entry_pc does not follow its G_FUNC_DEF"
+            diagnostics.append(VerifyDiagnostic(FUNCTION_TABLE, max(def_pc, 0), message))
+        end_ok = entry.entry_pc <= entry.end_pc < n and (module.knus[entry.end_pc] >> 20) & 0xFF == G_FUNC_END
+        if not end_ok:
+            message = f"function {func_id} end_pc is not a G_FUNC_END"
+            diagnostics.append(VerifyDiagnostic(FUNCTION_TABLE, min(entry.end_pc, max(n - 1, 0)), message))
+    return diagnostics
+
+
+def _audit_bin_authority(module, diagnostics, audit) -> None:
+    denied = {d.knu_index for d in diagnostics if d.code == AUTHORITY}
+    for i, word in enumerate(module.knus):
+        glyph = (word >> 20) & 0xFF
+        if glyph not in BIN_GLYPHS:
+            continue
+        payload = (word >> 4) & 0xFF
+        resource = f"bin:{payload >> 4}/tensor:{payload & 0xF}" if glyph == G_LOAD_BIN_TENSOR else f"bin:{payload}"
+        outcome, severity = (DENY, "warning") if i in denied else (ALLOW, "info")
+        audit.record("authority_check", resource, outcome, severity=severity, knu_index=i, authority=(word >> 1) & 0x7)
+
+
+def verify_module(
+    module,
+    *,
+    versions: Sequence[int] = (0x2,),
+    max_authority: int = AUTH_CLASS_USER,
+    stamp: bool = True,
+    audit=None,
+) -> VerifyReport:
+    """Check the replay law over the whole module; stamp a certificate if clean.
+
+    `audit` is an optional `AuditLog` receiving one `authority_check` event
+    per `.bin` glyph, denied where the glyph drew an `authority` diagnostic.
+    """
+
+    scan = _scan_numpy if np is not None else _scan_python
+    diagnostics = scan(module, tuple(versions), max_authority) + _check_function_table(module)
+    diagnostics.sort(key=lambda d: d.knu_index)
+    report = VerifyReport(knu_count=len(module.knus), digest=module_digest(module), diagnostics=diagnostics)
+    if audit is not None:
+        _audit_bin_authority(module, diagnostics, audit)
+    if stamp:
+        module.metadata.pop("verified", None)
+        module.__dict__.pop(_SNAPSHOT_ATTR, None)
+        if report.ok:
+            cert = {
+                "digest": report.digest,
+                "profile": PROFILE,
+                "versions": sorted(versions),
+                "max_authority": max_authority,
+                "knu_count": report.knu_count,
+                "verifier": VERIFIER_VERSION,
+            }
+            cert["mac"] = _cert_mac(cert)
+            module.metadata["verified"] = cert
+            setattr(module, _SNAPSHOT_ATTR, _snapshot(module))
+    return report
+
+
+def require_verified(module, **kwargs) -> VerifyReport:
+    """Verify `module` and raise `KhlNaryVerifyError` on any diagnostic."""
+
+    report = verify_module(module, **kwargs)
+    if not report.ok:
+        raise KhlNaryVerifyError(report.diagnostics)
+    return report
+
+
+def is_verified(module, *, max_authority: int) -> bool:
+    """True if this process verified the module at or below `max_authority` and it is unchanged since."""
+
+    cert = module.metadata.get("verified")
+    if not isinstance(cert, dict) or cert.get("verifier") != VERIFIER_VERSION:
+        return False
+    if not isinstance(cert.get("mac"), str) or not hmac.compare_digest(cert["mac"], _cert_mac(cert)):
+        return False
+    if cert.get("max_authority", max_authority + 1) > max_authority or cert.get("knu_count") != len(module.knus):
+        return False
+    snapshot = getattr(module, _SNAPSHOT_ATTR, None)
+    if snapshot is not None and _unchanged(module, snapshot):
+        return True
+    # A copied module (no snapshot) or one edited and restored: fall back to the digest.
+    if cert.get("digest") != module_digest(module):
+        return False
+    setattr(module, _SNAPSHOT_ATTR, _snapshot(module))
+    return True
+
+
+__all__ = [
+    "VerifyDiagnostic",
+    "VerifyReport",
+    "KhlNaryVerifyError",
+    "module_digest",
+    "verify_module",
+    "require_verified",
+    "is_verified",
+]
@@ -0,0 +1,169 @@
+"""Scalar interpreter for KHΛNARY control-flow and function glyphs.
+
+`G_CALL` dispatches through the module function table: the callee's entry PC
+is a table lookup and its frame is allocated at `num_locals` slots up front,
+so the interpreter never scans the stream for `G_FUNC_DEF`. A top-level
+`G_FUNC_DEF` is skipped in one step using the same table's `end_pc`.
+
+`run(trace=TraceRecorder(...))` records every executed step (see
+`tools.khlnary_trace`); untraced runs pay one `None` check per step.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+from tools.khlnary_encoder import AUTH_CLASS_USER, GLYPH_IDS, FunctionEntry, decode_knu
+from tools.khlnary_trace import KIND_VM, NO_HANDLE
+from tools.khlnary_verify import is_verified
+
+G_NOP = GLYPH_IDS["G_NOP"]
+G_CONST_I8 = GLYPH_IDS["G_CONST_I8"]
+G_ADD_I32 = GLYPH_IDS["G_ADD_I32"]
+G_RET = GLYPH_IDS["G_RET"]
+G_IFZ_JUMP8 = GLYPH_IDS["G_IFZ_JUMP8"]
+G_JUMP8 = GLYPH_IDS["G_JUMP8"]
+G_WHILE_HEAD = GLYPH_IDS["G_WHILE_HEAD"]
+G_WHILE_TAIL = GLYPH_IDS["G_WHILE_TAIL"]
+G_FUNC_DEF = GLYPH_IDS["G_FUNC_DEF"]
+G_FUNC_END = GLYPH_IDS["G_FUNC_END"]
+G_CALL = GLYPH_IDS["G_CALL"]
+G_LOAD_LOCAL = GLYPH_IDS["G_LOAD_LOCAL"]
+G_STORE_LOCAL = GLYPH_IDS["G_STORE_LOCAL"]
+G_EQ_I32 = GLYPH_IDS["G_EQ_I32"]
+G_LT_I32 = GLYPH_IDS["G_LT_I32"]
+
+_MARKERS = (G_NOP, G_WHILE_HEAD, G_WHILE_TAIL)
+
+
+class KhlNaryRuntimeError(RuntimeError):
+    """Raised when a program cannot continue executing."""
+
+
+def _s8(payload: int) -> int:
+    return payload - 0x100 if payload & 0x80 else payload
+
+
+def _i32(value: int) -> int:
+    value &= 0xFFFFFFFF
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+class KhlnaryVM:
+    """Execute a scalar KNU program against its function entry table.
+
+    With `trusted=True` (a verified module) words are unpacked without the
+    per-word parity check. `from_module` trusts a module only if this process
+    verified it at or below `max_authority`.
+    """
+
+    def __init__(
+        self,
+        words: List[int],
+        functions: Dict[int, FunctionEntry],
+        *,
+        global_slots: int = 256,
+        trusted: bool = False,
+    ) -> None:
+        self.words = [int(w) for w in words]
+        self.program: List[Tuple[int, int, int]] = []
+        if trusted:
+            self.program = [((w >> 20) & 0xFF, (w >> 16) & 0xF, (w >> 4) & 0xFF) for w in map(int, words)]
+        else:
+            for word in words:
+                fields = decode_knu(word)
+                self.program.append((int(fields["glyph_id"]), int(fields["arity"]), int(fields["payload"])))
+        self.functions = functions
+        self.global_slots = global_slots
+
+    @classmethod
+    def from_module(cls, module, *, max_authority: int = AUTH_CLASS_USER) -> "KhlnaryVM":
+        return cls(module.knus, module.functions, trusted=is_verified(module, max_authority=max_authority))
+
+    def _entry(self, pc: int, func_id: int) -> FunctionEntry:
+        entry = self.functions.get(func_id)
+        if entry is None:
+            raise KhlNaryRuntimeError(f"PC {pc}: function {func_id} missing from entry table")
+        return entry
+
+    def run(self, *, max_steps: Optional[int] = None, trace=None) -> Optional[int]:
+        """Run from PC 0; return the value of the top-level `G_RET`, if any.
+
+        `trace` is an optional `TraceRecorder` receiving one record per step
+        (PC, KNU word, stack depth before the step, call depth in `flags`).
+        """
+        program = self.program
+        words = self.words
+        record = trace.record if trace is not None else None
+        end = len(program)
+        stack: List[int] = []
+        frames: List[Tuple[int, List[int]]] = []
+        slots = [0] * self.global_slots
+        pc = 0
+        steps = 0
+
+        while pc < end:
+            steps += 1
+            if max_steps is not None and steps > max_steps:
+                raise KhlNaryRuntimeError(f"Step limit {max_steps} exceeded at PC {pc}")
+            glyph, arity, payload = program[pc]
+            if record is not None:
+                record(KIND_VM, pc, words[pc], len(stack), NO_HANDLE, NO_HANDLE, NO_HANDLE, len(frames) & 0xFF)
+
+            if glyph == G_LOAD_LOCAL:
+                stack.append(slots[payload])
+            elif glyph == G_CONST_I8:
+                stack.append(_s8(payload))
+            elif glyph == G_STORE_LOCAL:
+                slots[payload] = stack.pop()
+            elif glyph == G_ADD_I32:
+                rhs = stack.pop()
+                stack.append(_i32(stack.pop() + rhs))
+            elif glyph == G_LT_I32:
+                rhs = stack.pop()
+                stack.append(int(stack.pop() < rhs))
+            elif glyph == G_EQ_I32:
+                rhs = stack.pop()
+                stack.append(int(stack.pop() == rhs))
+            elif glyph == G_IFZ_JUMP8:
+                if stack.pop() == 0:
+                    pc += _s8(payload)
+                    continue
+            elif glyph == G_JUMP8:
+                pc += _s8(payload)
+                continue
+            elif glyph == G_CALL:
+                entry = self._entry(pc, payload)
+                if arity != entry.arity:
+                    raise KhlNaryRuntimeError(f"PC {pc}: call passes {arity} args, function {payload} takes {entry.arity}")
+                frame = [0] * entry.num_locals
+                if arity:
+                    frame[:arity] = stack[-arity:]
+                    del stack[-arity:]
+                frames.append((pc + 1, slots))
+                slots = frame
+                pc = entry.entry_pc
+                continue
+            elif glyph == G_RET:
+                value = stack.pop()
+                if not frames:
+                    return value
+                pc, slots = frames.pop()
+                stack.append(value)
+                continue
+            elif glyph == G_FUNC_END:
+                if frames:
+                    pc, slots = frames.pop()
+                    stack.append(0)
+                    continue
+            elif glyph == G_FUNC_DEF:
+                pc = self._entry(pc, payload).end_pc + 1
+                continue
+            elif glyph not in _MARKERS:
+                raise KhlNaryRuntimeError(f"PC {pc}: glyph 0x{glyph:02x} is not executable by the scalar VM")
+            pc += 1
+
+        return stack[-1] if stack else None
+
+
+__all__ = ["KhlNaryRuntimeError", "KhlnaryVM"]
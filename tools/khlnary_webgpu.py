@@ -1,105 +1,947 @@
-"""KHΛNARY -> WebGPU lowering helpers and module-oriented backend."""
+"""KHΛNARY -> WebGPU lowering helpers and module-oriented backend.
+
+`WebGpuBackend.build_program` lifts a module into its tensor graph and emits
+one WGSL compute entry point per dispatch:
+
+- `G_TENSOR_MATMUL` / `G_FUSED_LINEAR`: workgroup-tiled matmul with shared
+  memory tiles and an optional bias + activation epilogue
+- `G_TENSOR_ADD`, `G_RELU`, `G_GELU`: elementwise kernels
+- `G_SOFTMAX`: one workgroup per row with a shared-memory tree reduction
+- `G_SCALED_DOT_PRODUCT` / `G_FUSED_ATTENTION`: three projection matmuls into
+  scratch, then an online-softmax attention kernel over each `seq_len` block
+  (no score matrix)
+
+Tile and workgroup sizes come from the tensor shapes in `module.tensors`.
+Each `.stb` file's data region is bound once (`stb_file_<id>`); tensors are
+addressed by element offsets held in the `tensor_offsets` uniform, which the
+JS loader fills from each file's tensor table. File buffers are raw
+`array<u32>` words: float16, int8 and int4 tensors stay packed on the device
+and are unpacked per element in the shader. Intermediates live in one `arena`
+storage buffer laid out by the static memory planner; every activation offset is `rows * offset_units`, where
+`rows = batch_size * seq_len` is read from the `constants` uniform.
+"""
 
 from __future__ import annotations
 
-from typing import List, Mapping
+from dataclasses import dataclass, field
+import json
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
 
-from tools.khlnary_compiler import KhlnaryModule
+from tools import khlnary_metrics as metrics
+from tools import stb
+from tools.artifact_cache import ArtifactCache, artifact_key
+from tools.khlnary_compiler import (
+    ATTENTION_GLYPHS,
+    DTYPE_BITS,
+    DTYPE_BY_STB_ENUM,
+    LOAD_GLYPH,
+    KhlnaryGraph,
+    KhlnaryModule,
+    StbTensor,
+    attention_head_count,
+    build_graph,
+)
 from tools.khlnary_encoder import GLYPH_IDS, decode_knu
+from tools.khlnary_memory import plan_memory
+from tools.kuhul_glyphs import FUSED_ACTIVATIONS
 
+# Bump whenever generated WGSL or JS changes for the same module, so cached
+# artifacts from older generators are not reused.
+BACKEND_VERSION = 5
 
-class WebGpuBackend:
-    def generate_wgsl_shader(self, module: KhlnaryModule) -> str:
-        bindings = [
-            f"@group(0) @binding({idx}) var<storage, read> {tensor.ptr_name} : array<f16>;"
-            for idx, tensor in enumerate(module.tensors)
-        ]
-        prefix = "\n".join(bindings)
-        return (
-            prefix
-            + "\n\n@group(0) @binding(100) var<storage, read> input_buffer : array<f16>;\n"
-            + "@group(0) @binding(101) var<storage, read_write> output_buffer : array<f16>;\n"
-            + "struct Constants { batch_size: u32, seq_len: u32, hidden_size: u32 };\n"
-            + "@group(0) @binding(102) var<uniform> constants : Constants;\n"
-            + "@compute @workgroup_size(256)\n"
-            + "fn main(@builtin(global_invocation_id) gid : vec3<u32>) {\n"
-            + "  let idx = gid.x;\n"
-            + "  let n = constants.batch_size * constants.seq_len * constants.hidden_size;\n"
-            + "  if (idx >= n) { return; }\n"
-            + "  output_buffer[idx] = input_buffer[idx];\n"
-            + "}\n"
-        )
+INPUT_BINDING = 100
+OUTPUT_BINDING = 101
+CONSTANTS_BINDING = 102
+ARENA_BINDING = 103
+TENSOR_OFFSETS_BINDING = 104
 
-    @staticmethod
-    def generate_javascript_loader() -> str:
-        return """
-async function loadSTBBuffer(device, url) {
-  const response = await fetch(url);
-  const arrayBuffer = await response.arrayBuffer();
-  const gpuBuffer = device.createBuffer({
-    size: arrayBuffer.byteLength,
+# Referenced tensors separated by at most this many bytes share one HTTP
+# Range request; the gap bytes are uploaded too.
+RANGE_MERGE_GAP = 4096
+# Upload granularity of the streaming JS loader.
+STREAM_CHUNK_BYTES = 1 << 20
+
+ELEMENTWISE_WORKGROUP = 64
+ATTENTION_WORKGROUP = 64
+MAX_TILE = 16
+MAX_WORKGROUP_INVOCATIONS = 256
+
+
+class WgslBindingError(ValueError):
+    """Raised when tensors cannot be addressed inside a shared storage binding."""
+
+
+def _pow2_floor(value: int) -> int:
+    return 1 << (max(value, 1).bit_length() - 1)
+
+
+def _pow2_ceil(value: int) -> int:
+    return 1 << (max(value, 1) - 1).bit_length()
+
+
+@dataclass(frozen=True)
+class TileConfig:
+    tile_m: int
+    tile_n: int
+    tile_k: int
+
+    @property
+    def workgroup_size(self) -> Tuple[int, int, int]:
+        return (self.tile_n, self.tile_m, 1)
+
+
+def matmul_tile_config(k: int, n: int) -> TileConfig:
+    """Pick power-of-two tiles no larger than the weight's `k x n` shape."""
+
+    tile_n = min(MAX_TILE, _pow2_floor(n))
+    tile_k = min(MAX_TILE, _pow2_floor(k))
+    tile_m = min(MAX_TILE, MAX_WORKGROUP_INVOCATIONS // tile_n)
+    return TileConfig(tile_m=tile_m, tile_n=tile_n, tile_k=tile_k)
+
+
+def softmax_workgroup_size(width: int) -> int:
+    return min(MAX_WORKGROUP_INVOCATIONS, _pow2_ceil(width))
+
+
+# ------------------------------------------------------------
+# Storage binding plan
+# ------------------------------------------------------------
+
+@dataclass(frozen=True)
+class StorageBinding:
+    """One storage buffer holding the whole data region of one .stb file."""
+
+    name: str
+    binding: int
+    file_id: int
+    path: str
+
+
+@dataclass(frozen=True)
+class TensorSlot:
+    """A tensor's slot in the `tensor_offsets` uniform.
+
+    `element_offset` counts `dtype` elements from the start of the file's data
+    region; it is `None` when the .stb file is not readable at build time (the
+    JS loader fills it in).
+    """
+
+    slot: int
+    file_id: int
+    tensor_id: int
+    dtype: str
+    element_offset: Optional[int] = None
+
+    @property
+    def elem_bits(self) -> int:
+        return DTYPE_BITS[self.dtype]
+
+    @property
+    def uniform_ref(self) -> str:
+        return f"tensor_offsets.slots[{self.slot // 4}u].{'xyzw'[self.slot % 4]}"
+
+
+@dataclass
+class BindingPlan:
+    files: List[StorageBinding]
+    slots: Dict[str, TensorSlot]
+    ranges: Dict[int, List["StbRange"]] = field(default_factory=dict)
+
+    @property
+    def uniform_vec4s(self) -> int:
+        return max(1, -(-len(self.slots) // 4))
+
+    def slot_table(self) -> List[List[int]]:
+        """`[file_id, tensor_id, elem_bits]` per slot, for the JS loader."""
+        return [[s.file_id, s.tensor_id, s.elem_bits] for s in sorted(self.slots.values(), key=lambda s: s.slot)]
+
+    def offsets_uniform(self) -> List[int]:
+        """Element offsets per slot, zero-padded to whole `vec4<u32>` entries."""
+        values = [0] * (4 * self.uniform_vec4s)
+        for s in self.slots.values():
+            if s.element_offset is None:
+                raise WgslBindingError(f"offset of tensor {s.file_id}:{s.tensor_id} is not resolved")
+            values[s.slot] = s.element_offset
+        return values
+
+
+# In-shader unpacking of element `e` from a raw `array<u32>` binding `b`.
+_UNPACK = {
+    "float32": "bitcast<f32>({b}[{e}])",
+    "float16": "unpack2x16float({b}[({e}) >> 1u])[({e}) & 1u]",
+    "int8": "f32(extractBits(bitcast<i32>({b}[({e}) >> 2u]), (({e}) & 3u) * 8u, 8u))",
+    "int4": "f32(extractBits(bitcast<i32>({b}[({e}) >> 3u]), (({e}) & 7u) * 4u, 4u))",
+    "int32": "f32(bitcast<i32>({b}[{e}]))",
+}
+
+
+def _file_binding_name(file_id: int) -> str:
+    return f"stb_file_{file_id}"
+
+
+@dataclass(frozen=True)
+class StbRange:
+    """Bytes `[start, end)` of a .stb file, uploaded at byte `dest` of its binding."""
+
+    start: int
+    end: int
+    dest: int
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+def plan_stb_ranges(
+    layout: Mapping[str, object], tensor_ids, *, max_gap: int = RANGE_MERGE_GAP
+) -> Tuple[List[StbRange], Dict[int, int]]:
+    """Plan HTTP byte ranges covering only `tensor_ids` of one .stb file.
+
+    Ranges are widened to 4-byte boundaries relative to the data region (the
+    WebGPU copy alignment) and neighbours at most `max_gap` bytes apart are
+    merged into one request. Ranges are packed back to back into the binding,
+    so each tensor keeps its alignment; returns the ranges and each tensor's
+    byte offset in the packed binding. The JS loader's `planSTBRanges` mirrors
+    this exactly.
+    """
+
+    data, file_size = layout["data_offset"], layout["file_size"]
+    tensors = layout["tensors"]
+    spans = sorted(
+        (tensors[tid]["offset"], tensors[tid]["offset"] + tensors[tid]["size_bytes"], tid) for tid in set(tensor_ids)
+    )
+    merged: List[List[int]] = []
+    members: List[List[Tuple[int, int]]] = []
+    for begin, finish, tid in spans:
+        lo = data + ((begin - data) & ~3)
+        hi = min(file_size, data + ((finish - data + 3) & ~3))
+        if merged and lo - merged[-1][1] <= max_gap:
+            merged[-1][1] = max(merged[-1][1], hi)
+            members[-1].append((tid, begin))
+        else:
+            merged.append([lo, hi])
+            members.append([(tid, begin)])
+
+    ranges: List[StbRange] = []
+    packed: Dict[int, int] = {}
+    cursor = 0
+    for (lo, hi), group in zip(merged, members):
+        ranges.append(StbRange(lo, hi, cursor))
+        for tid, begin in group:
+            packed[tid] = cursor + begin - lo
+        cursor += (hi - lo + 3) & ~3
+    return ranges, packed
+
+
+def plan_storage_bindings(module: KhlnaryModule, *, max_gap: int = RANGE_MERGE_GAP) -> BindingPlan:
+    """Bind each referenced .stb file once and give every tensor an offset slot.
+
+    A binding holds only the byte ranges of the tensors the module references
+    (see `plan_stb_ranges`); offsets are resolved when the file is readable.
+    """
+
+    files: List[StorageBinding] = []
+    referenced: Dict[int, List[StbTensor]] = {}
+    for tensor in module.tensors:
+        if tensor.dtype not in _UNPACK:
+            raise WgslBindingError(f"tensor {tensor.ptr_name} has unsupported dtype {tensor.dtype}")
+        if tensor.file_id not in referenced:
+            path = str(module.bin_files.get(tensor.file_id, ""))
+            files.append(StorageBinding(_file_binding_name(tensor.file_id), len(files), tensor.file_id, path))
+            referenced[tensor.file_id] = []
+        if all(t.ptr_name != tensor.ptr_name for t in referenced[tensor.file_id]):
+            referenced[tensor.file_id].append(tensor)
+
+    ranges: Dict[int, List[StbRange]] = {}
+    packed: Dict[int, Dict[int, int]] = {}
+    for storage in files:
+        if not storage.path or not Path(storage.path).is_file():
+            continue
+        layout = stb.read_stb_layout(storage.path)
+        ids = [t.tensor_id for t in referenced[storage.file_id] if t.tensor_id in layout["tensors"]]
+        ranges[storage.file_id], packed[storage.file_id] = plan_stb_ranges(layout, ids, max_gap=max_gap)
+
+    slots: Dict[str, TensorSlot] = {}
+    for storage in files:
+        for tensor in referenced[storage.file_id]:
+            bits = DTYPE_BITS[tensor.dtype]
+            offset = None
+            byte_offset = packed.get(storage.file_id, {}).get(tensor.tensor_id)
+            if byte_offset is not None:
+                if (byte_offset * 8) % bits:
+                    raise WgslBindingError(
+                        f"tensor {tensor.ptr_name} starts at byte {byte_offset}, not aligned to its {bits}-bit elements"
+                    )
+                offset = byte_offset * 8 // bits
+            slots[tensor.ptr_name] = TensorSlot(len(slots), tensor.file_id, tensor.tensor_id, tensor.dtype, offset)
+    return BindingPlan(files=files, slots=slots, ranges=ranges)
+
+
+@dataclass(frozen=True)
+class Operand:
+    """A 2-D view `[rows, width]` (or a weight) inside one WGSL buffer.
+
+    Activation offsets are in row units: the element offset is `rows * offset`.
+    Weights live in their file's storage binding at the offset held by `slot`.
+    """
+
+    buffer: str
+    offset: int
+    width: int
+    tensor: Optional[StbTensor] = None
+    slot: Optional[TensorSlot] = None
+
+
+@dataclass
+class WgslDispatch:
+    entry_point: str
+    kind: str
+    inputs: List[Operand]
+    output: Operand
+    workgroup_size: Tuple[int, int, int]
+    tile: Optional[TileConfig] = None
+    activation: int = FUSED_ACTIVATIONS["none"]
+    heads: int = 1
+    scale: float = 1.0
+
+    def workgroups(self, rows: int) -> Tuple[int, int, int]:
+        if self.kind == "matmul":
+            return (-(-self.output.width // self.tile.tile_n), -(-rows // self.tile.tile_m), 1)
+        if self.kind == "softmax":
+            return (rows, 1, 1)
+        if self.kind == "attention":
+            return (-(-rows // self.workgroup_size[0]), self.heads, 1)
+        return (-(-(rows * self.output.width) // self.workgroup_size[0]), 1, 1)
+
+
+@dataclass
+class WgslProgram:
+    source: str
+    dispatches: List[WgslDispatch]
+    bindings: Dict[str, int]
+    arena_units: int
+    output_width: int
+    binding_plan: BindingPlan
+    tensors: List[StbTensor] = field(default_factory=list)
+
+
+# ------------------------------------------------------------
+# WGSL templates
+# ------------------------------------------------------------
+
+_ACTIVATION_FNS = """fn khl_relu(x : f32) -> f32 { return max(x, 0.0); }
+fn khl_gelu(x : f32) -> f32 {
+  return 0.5 * x * (1.0 + tanh(0.7978845608 * (x + 0.044715 * x * x * x)));
+}
+"""
+
+
+def _read(operand: Operand, index: str) -> str:
+    if operand.slot is not None:
+        element = f"{operand.slot.uniform_ref} + {index}"
+        return _UNPACK[operand.slot.dtype].format(b=operand.buffer, e=element)
+    return f"{operand.buffer}[rows * {operand.offset}u + {index}]"
+
+
+def _apply_activation(activation: int, value: str) -> str:
+    if activation == FUSED_ACTIVATIONS["relu"]:
+        return f"khl_relu({value})"
+    if activation == FUSED_ACTIVATIONS["gelu"]:
+        return f"khl_gelu({value})"
+    return value
+
+
+def _matmul_wgsl(d: WgslDispatch) -> str:
+    a, w = d.inputs[0], d.inputs[1]
+    bias = d.inputs[2] if len(d.inputs) > 2 else None
+    t = d.tile
+    k, n = a.width, d.output.width
+    threads = t.tile_m * t.tile_n
+    value = "acc"
+    if bias is not None:
+        value = f"acc + {_read(bias, 'col')}"
+    value = _apply_activation(d.activation, value)
+    out_index = "row * {n}u + col".format(n=n)
+    return f"""var<workgroup> {d.entry_point}_tile_a : array<f32, {t.tile_m * t.tile_k}>;
+var<workgroup> {d.entry_point}_tile_b : array<f32, {t.tile_k * t.tile_n}>;
+
+@compute @workgroup_size({t.tile_n}, {t.tile_m}, 1)
+fn {d.entry_point}(@builtin(workgroup_id) wid : vec3<u32>, @builtin(local_invocation_id) lid : vec3<u32>) {{
+  let rows = constants.batch_size * constants.seq_len;
+  let row = wid.y * {t.tile_m}u + lid.y;
+  let col = wid.x * {t.tile_n}u + lid.x;
+  let flat = lid.y * {t.tile_n}u + lid.x;
+  var acc = 0.0;
+  for (var k0 = 0u; k0 < {k}u; k0 = k0 + {t.tile_k}u) {{
+    for (var i = flat; i < {t.tile_m * t.tile_k}u; i = i + {threads}u) {{
+      let r = wid.y * {t.tile_m}u + i / {t.tile_k}u;
+      let kk = k0 + i % {t.tile_k}u;
+      var v = 0.0;
+      if (r < rows && kk < {k}u) {{ v = {_read(a, f"r * {k}u + kk")}; }}
+      {d.entry_point}_tile_a[i] = v;
+    }}
+    for (var i = flat; i < {t.tile_k * t.tile_n}u; i = i + {threads}u) {{
+      let kk = k0 + i / {t.tile_n}u;
+      let c = wid.x * {t.tile_n}u + i % {t.tile_n}u;
+      var v = 0.0;
+      if (kk < {k}u && c < {n}u) {{ v = {_read(w, f"kk * {n}u + c")}; }}
+      {d.entry_point}_tile_b[i] = v;
+    }}
+    workgroupBarrier();
+    for (var kk = 0u; kk < {t.tile_k}u; kk = kk + 1u) {{
+      acc = acc + {d.entry_point}_tile_a[lid.y * {t.tile_k}u + kk] * {d.entry_point}_tile_b[kk * {t.tile_n}u + lid.x];
+    }}
+    workgroupBarrier();
+  }}
+  if (row < rows && col < {n}u) {{
+    {d.output.buffer}[rows * {d.output.offset}u + {out_index}] = {value};
+  }}
+}}
+"""
+
+
+def _elementwise_wgsl(d: WgslDispatch) -> str:
+    width = d.output.width
+    src = d.inputs[0]
+    if d.kind == "add":
+        other = d.inputs[1]
+        other_index = "col" if other.tensor is not None else "idx"
+        value = f"{_read(src, 'idx')} + {_read(other, other_index)}"
+    else:
+        value = _apply_activation(d.activation, _read(src, "idx"))
+    return f"""@compute @workgroup_size({d.workgroup_size[0]}, 1, 1)
+fn {d.entry_point}(@builtin(global_invocation_id) gid : vec3<u32>) {{
+  let rows = constants.batch_size * constants.seq_len;
+  let idx = gid.x;
+  if (idx >= rows * {width}u) {{ return; }}
+  let col = idx % {width}u;
+  {d.output.buffer}[rows * {d.output.offset}u + idx] = {value};
+}}
+"""
+
+
+def _softmax_wgsl(d: WgslDispatch) -> str:
+    src, out = d.inputs[0], d.output
+    width, wg = out.width, d.workgroup_size[0]
+    return f"""var<workgroup> {d.entry_point}_red : array<f32, {wg}>;
+
+@compute @workgroup_size({wg}, 1, 1)
+fn {d.entry_point}(@builtin(workgroup_id) wid : vec3<u32>, @builtin(local_invocation_id) lid : vec3<u32>) {{
+  let rows = constants.batch_size * constants.seq_len;
+  let base = wid.x * {width}u;
+  var m = -3.4e38;
+  for (var c = lid.x; c < {width}u; c = c + {wg}u) {{ m = max(m, {_read(src, "base + c")}); }}
+  {d.entry_point}_red[lid.x] = m;
+  workgroupBarrier();
+  for (var s = {wg // 2}u; s > 0u; s = s >> 1u) {{
+    if (lid.x < s) {{ {d.entry_point}_red[lid.x] = max({d.entry_point}_red[lid.x], {d.entry_point}_red[lid.x + s]); }}
+    workgroupBarrier();
+  }}
+  let row_max = {d.entry_point}_red[0];
+  workgroupBarrier();
+  var total = 0.0;
+  for (var c = lid.x; c < {width}u; c = c + {wg}u) {{ total = total + exp({_read(src, "base + c")} - row_max); }}
+  {d.entry_point}_red[lid.x] = total;
+  workgroupBarrier();
+  for (var s = {wg // 2}u; s > 0u; s = s >> 1u) {{
+    if (lid.x < s) {{ {d.entry_point}_red[lid.x] = {d.entry_point}_red[lid.x] + {d.entry_point}_red[lid.x + s]; }}
+    workgroupBarrier();
+  }}
+  let row_sum = {d.entry_point}_red[0];
+  for (var c = lid.x; c < {width}u; c = c + {wg}u) {{
+    {out.buffer}[rows * {out.offset}u + base + c] = exp({_read(src, "base + c")} - row_max) / row_sum;
+  }}
+}}
+"""
+
+
+def _attention_wgsl(d: WgslDispatch) -> str:
+    q, k, v = d.inputs
+    out = d.output
+    width = out.width
+    head_dim = width // d.heads
+    return f"""@compute @workgroup_size({d.workgroup_size[0]}, 1, 1)
+fn {d.entry_point}(@builtin(global_invocation_id) gid : vec3<u32>) {{
+  let rows = constants.batch_size * constants.seq_len;
+  let row = gid.x;
+  let head = gid.y;
+  if (row >= rows) {{ return; }}
+  let seq_start = (row / constants.seq_len) * constants.seq_len;
+  let q_base = row * {width}u + head * {head_dim}u;
+  var m = -3.4e38;
+  var l = 0.0;
+  var acc : array<f32, {head_dim}>;
+  for (var j = seq_start; j < seq_start + constants.seq_len; j = j + 1u) {{
+    let kv_base = j * {width}u + head * {head_dim}u;
+    var s = 0.0;
+    for (var e = 0u; e < {head_dim}u; e = e + 1u) {{
+      s = s + {_read(q, "q_base + e")} * {_read(k, "kv_base + e")};
+    }}
+    s = s * {d.scale!r};
+    let m_new = max(m, s);
+    let corr = exp(m - m_new);
+    let p = exp(s - m_new);
+    l = l * corr + p;
+    for (var e = 0u; e < {head_dim}u; e = e + 1u) {{
+      acc[e] = acc[e] * corr + p * {_read(v, "kv_base + e")};
+    }}
+    m = m_new;
+  }}
+  for (var e = 0u; e < {head_dim}u; e = e + 1u) {{
+    {out.buffer}[rows * {out.offset}u + q_base + e] = acc[e] / l;
+  }}
+}}
+"""
+
+
+_TEMPLATES = {
+    "matmul": _matmul_wgsl,
+    "add": _elementwise_wgsl,
+    "activation": _elementwise_wgsl,
+    "softmax": _softmax_wgsl,
+    "attention": _attention_wgsl,
+}
+
+
+# ------------------------------------------------------------
+# Program construction
+# ------------------------------------------------------------
+
+def _plan_dispatches(
+    graph: KhlnaryGraph, module: KhlnaryModule, binding_plan: BindingPlan
+) -> Tuple[List[WgslDispatch], int]:
+    # With one-byte elements and no alignment padding, every offset is in
+    # row-width units and scales linearly with the runtime row count.
+    plan = plan_memory(module, rows=1, elem_bytes=1, alignment=1)
+    offsets = {buf.knu_index: buf.offset for buf in plan.buffers}
+    arena_units = plan.arena_bytes
+    scratch = arena_units
+    scratch_width = max((node.width for node in graph.nodes if node.op in ATTENTION_GLYPHS), default=0)
+
+    def operand(node_id: int) -> Operand:
+        node = graph.nodes[node_id]
+        if node.op == "INPUT":
+            return Operand("input_buffer", 0, node.width)
+        if node.tensor is not None:
+            slot = binding_plan.slots[node.tensor.ptr_name]
+            return Operand(_file_binding_name(slot.file_id), 0, node.width, node.tensor, slot)
+        if node_id == graph.output:
+            return Operand("output_buffer", 0, node.width)
+        return Operand("arena", offsets[node.knu_index], node.width)
+
+    dispatches: List[WgslDispatch] = []
+    for node in graph.nodes:
+        if node.op in ("INPUT", LOAD_GLYPH):
+            continue
+        name = f"k{node.knu_index}"
+        inputs = [operand(src) for src in node.inputs]
+        out = operand(node.node_id)
+        if node.op in ("G_TENSOR_MATMUL", "G_FUSED_LINEAR"):
+            tile = matmul_tile_config(inputs[0].width, out.width)
+            activation = node.payload if node.op == "G_FUSED_LINEAR" else FUSED_ACTIVATIONS["none"]
+            dispatches.append(
+                WgslDispatch(f"{name}_matmul", "matmul", inputs, out, tile.workgroup_size, tile=tile, activation=activation)
+            )
+        elif node.op == "G_TENSOR_ADD":
+            dispatches.append(WgslDispatch(f"{name}_add", "add", inputs, out, (ELEMENTWISE_WORKGROUP, 1, 1)))
+        elif node.op in ("G_RELU", "G_GELU"):
+            activation = FUSED_ACTIVATIONS["relu" if node.op == "G_RELU" else "gelu"]
+            dispatches.append(
+                WgslDispatch(f"{name}_act", "activation", inputs, out, (ELEMENTWISE_WORKGROUP, 1, 1), activation=activation)
+            )
+        elif node.op == "G_SOFTMAX":
+            wg = softmax_workgroup_size(out.width)
+            dispatches.append(WgslDispatch(f"{name}_softmax", "softmax", inputs, out, (wg, 1, 1)))
+        elif node.op in ATTENTION_GLYPHS:
+            x, weights = inputs[0], inputs[1:]
+            projected = []
+            for which, weight in zip("qkv", weights):
+                tile = matmul_tile_config(x.width, weight.width)
+                target = Operand("arena", scratch + "qkv".index(which) * scratch_width, weight.width)
+                dispatches.append(
+                    WgslDispatch(f"{name}_proj_{which}", "matmul", [x, weight], target, tile.workgroup_size, tile=tile)
+                )
+                projected.append(target)
+            dispatches.append(
+                WgslDispatch(
+                    f"{name}_attention",
+                    "attention",
+                    projected,
+                    out,
+                    (ATTENTION_WORKGROUP, 1, 1),
+                    heads=attention_head_count(node.payload, node.width),
+                    scale=node.payload / 256.0,
+                )
+            )
+        else:
+            raise ValueError(f"No WGSL kernel for {node.op}")
+    return dispatches, arena_units + 3 * scratch_width
+
+
+# Streaming .stb loader: reads each file's header and tensor table, then
+# requests only the referenced tensor ranges and uploads them in chunks.
+_JS_LOADER = """
+const STB_HEADER_BYTES = 32;
+const STB_DESCRIPTOR_BYTES = 32;
+
+function align4Down(x) {
+  return x - (x % 4);
+}
+
+function align4Up(x) {
+  return x + ((4 - (x % 4)) % 4);
+}
+
+// Range reader for one file: `read(start, end)` resolves to `{ response }`
+// for a 206 reply, or `{ bytes }`. A server that ignores Range answers 200
+// with the whole file; that body is kept, and every later range of the file
+// is sliced from it instead of being downloaded again.
+function openRangeReader(url) {
+  let whole = null;
+  return async (start, end) => {
+    if (!whole) {
+      const response = await fetch(url, { headers: { Range: `bytes=${start}-${end - 1}` } });
+      if (!response.ok) throw new Error(`${url}: HTTP ${response.status}`);
+      if (response.status === 206) return { response };
+      whole = whole ?? response.arrayBuffer().then((body) => new Uint8Array(body));
+    }
+    return { bytes: (await whole).subarray(start, end) };
+  };
+}
+
+async function rangeBytes(part) {
+  return part.bytes ?? new Uint8Array(await part.response.arrayBuffer());
+}
+
+// Read only the header and tensor table of a .stb file.
+async function readSTBLayout(read) {
+  const guess = STB_HEADER_BYTES + 16 * STB_DESCRIPTOR_BYTES;
+  let head = await rangeBytes(await read(0, guess));
+  let view = new DataView(head.buffer, head.byteOffset, head.byteLength);
+  const count = view.getUint16(6, true);
+  const tableEnd = STB_HEADER_BYTES + count * STB_DESCRIPTOR_BYTES;
+  if (head.byteLength < tableEnd) {
+    head = await rangeBytes(await read(0, tableEnd));
+    view = new DataView(head.buffer, head.byteOffset, head.byteLength);
+  }
+  const layout = {
+    dataOffset: Number(view.getBigUint64(16, true)),
+    fileSize: Number(view.getBigUint64(24, true)),
+    tensors: new Map(),
+  };
+  for (let i = 0; i < count; i++) {
+    const base = STB_HEADER_BYTES + STB_DESCRIPTOR_BYTES * i;
+    layout.tensors.set(view.getUint8(base), {
+      dtype: view.getUint8(base + 1),
+      offset: Number(view.getBigUint64(base + 4, true)),
+      sizeBytes: Number(view.getBigUint64(base + 12, true)),
+    });
+  }
+  return layout;
+}
+
+// Mirror of plan_stb_ranges in khlnary_webgpu.py: 4-byte aligned ranges over
+// the requested tensors, merged across gaps <= maxGap and packed back to back.
+function planSTBRanges(layout, tensorIds, maxGap = KHLNARY_RANGE_MERGE_GAP) {
+  const data = layout.dataOffset;
+  const spans = [...new Set(tensorIds)]
+    .map((tid) => {
+      const t = layout.tensors.get(tid);
+      return [t.offset, t.offset + t.sizeBytes, tid];
+    })
+    .sort((a, b) => a[0] - b[0] || a[1] - b[1] || a[2] - b[2]);
+  const ranges = [];
+  for (const [begin, finish, tid] of spans) {
+    const lo = data + align4Down(begin - data);
+    const hi = Math.min(layout.fileSize, data + align4Up(finish - data));
+    const last = ranges[ranges.length - 1];
+    if (last && lo - last.end <= maxGap) {
+      last.end = Math.max(last.end, hi);
+      last.members.push([tid, begin]);
+    } else {
+      ranges.push({ start: lo, end: hi, dest: 0, members: [[tid, begin]] });
+    }
+  }
+  const offsets = new Map();
+  let cursor = 0;
+  for (const range of ranges) {
+    range.dest = cursor;
+    for (const [tid, begin] of range.members) offsets.set(tid, cursor + begin - range.start);
+    cursor += align4Up(range.end - range.start);
+  }
+  return { ranges, offsets, size: cursor };
+}
+
+// Upload one range into `buffer` at `range.dest` in chunks of `chunkBytes`
+// as a 206 body streams in, so download and upload overlap.
+async function uploadRange(device, buffer, part, range, chunkBytes) {
+  const cap = Math.max(4, align4Down(chunkBytes));
+  const staging = new Uint8Array(cap);
+  let staged = 0;
+  let written = 0;
+  const flush = () => {
+    const n = align4Up(staged);
+    staging.fill(0, staged, n);
+    if (n > 0) device.queue.writeBuffer(buffer, range.dest + written, staging, 0, n);
+    written += n;
+    staged = 0;
+  };
+  const push = (bytes) => {
+    for (let pos = 0; pos < bytes.byteLength; ) {
+      const take = Math.min(cap - staged, bytes.byteLength - pos);
+      staging.set(bytes.subarray(pos, pos + take), staged);
+      staged += take;
+      pos += take;
+      if (staged === cap) flush();
+    }
+  };
+  if (part.response && part.response.body) {
+    const reader = part.response.body.getReader();
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      push(value);
+    }
+  } else {
+    push(await rangeBytes(part));
+  }
+  flush();
+}
+
+// Stream only the referenced tensors of one .stb file into a storage buffer.
+// Returns the buffer and a tensor table whose offsets are byte offsets in it.
+async function streamSTBBuffer(device, url, tensorIds, options = {}) {
+  const chunkBytes = options.chunkBytes ?? KHLNARY_STREAM_CHUNK_BYTES;
+  const read = openRangeReader(url);
+  const layout = await readSTBLayout(read);
+  const plan = planSTBRanges(layout, tensorIds ?? [...layout.tensors.keys()], options.maxGap);
+  const buffer = device.createBuffer({
+    size: Math.max(plan.size, 4),
     usage: GPUBufferUsage.STORAGE | GPUBufferUsage.COPY_DST,
   });
-  device.queue.writeBuffer(gpuBuffer, 0, arrayBuffer);
-  return gpuBuffer;
+  // Keep the next range request in flight while the current one uploads.
+  let pending = plan.ranges.length ? read(plan.ranges[0].start, plan.ranges[0].end) : null;
+  for (let i = 0; i < plan.ranges.length; i++) {
+    const part = await pending;
+    const next = plan.ranges[i + 1];
+    pending = next ? read(next.start, next.end) : null;
+    await uploadRange(device, buffer, part, plan.ranges[i], chunkBytes);
+  }
+  const tensors = new Map();
+  for (const [tid, offset] of plan.offsets) tensors.set(tid, { ...layout.tensors.get(tid), offset });
+  return { buffer, tensors, ranges: plan.ranges };
+}
+
+// Build the `tensor_offsets` uniform from loaded files and a slot table of
+// [fileId, tensorId, elemBits] rows; offsets count elements of each dtype.
+function createTensorOffsetsBuffer(device, files, slots) {
+  const values = new Uint32Array(Math.max(4, Math.ceil(slots.length / 4) * 4));
+  slots.forEach(([fileId, tensorId, elemBits], slot) => {
+    values[slot] = (files.get(fileId).tensors.get(tensorId).offset * 8) / elemBits;
+  });
+  const buffer = device.createBuffer({
+    size: values.byteLength,
+    usage: GPUBufferUsage.UNIFORM | GPUBufferUsage.COPY_DST,
+  });
+  device.queue.writeBuffer(buffer, 0, values);
+  return buffer;
+}
+
+// Stream every file of a KHLNARY_STORAGE table concurrently and build the
+// tensor offsets uniform.
+async function loadKHlnaryStorage(device, storage, options = {}) {
+  const files = new Map();
+  await Promise.all(
+    storage.files.map(async ([fileId, , url]) => {
+      const ids = storage.slots.filter(([f]) => f === fileId).map(([, tid]) => tid);
+      files.set(fileId, await streamSTBBuffer(device, url, ids, options));
+    })
+  );
+  return { files, tensorOffsets: createTensorOffsetsBuffer(device, files, storage.slots) };
 }
 
-async function createKHlnaryPipeline(device, shaderCode) {
+async function createKHlnaryPipeline(device, shaderCode, entryPoint) {
   const shaderModule = device.createShaderModule({ code: shaderCode });
   const pipeline = await device.createComputePipelineAsync({
     layout: 'auto',
-    compute: { module: shaderModule, entryPoint: 'main' },
+    compute: { module: shaderModule, entryPoint },
   });
   return pipeline;
 }
 """.strip()
 
 
-def lower_khlnary_to_wgsl(knus: List[int], bin_file_table: Mapping[int, Mapping[str, str]]) -> str:
-    bindings = []
-    for w in knus:
-        k = decode_knu(w)
-        if k["glyph_id"] == GLYPH_IDS["G_LOAD_BIN_TENSOR"]:
-            bin_file_id = (k["payload"] >> 4) & 0xF
-            tensor_id = k["payload"] & 0xF
-            if bin_file_id not in bin_file_table:
-                raise KeyError(f"Missing bin_file_id in table: {bin_file_id}")
-            binding_idx = len(bindings)
-            bindings.append((binding_idx, bin_file_id, tensor_id))
-
-    wgsl_buffers = [
-        f"@group(0) @binding({idx}) var<storage, read> t_{bin_id}_{tid} : array<f16>;"
-        for idx, bin_id, tid in bindings
-    ]
-    return "\n".join(wgsl_buffers) + """
-
-@group(0) @binding(10) var<storage, read> input_buf : array<f16>;
-@group(0) @binding(11) var<storage, read_write> output_buf : array<f16>;
-
-@compute @workgroup_size(64)
-fn main(@builtin(global_invocation_id) gid : vec3<u32>) {
-  let idx = gid.x;
-  output_buf[idx] = input_buf[idx];
-}
-"""
+WGSL_ARTIFACT = "khlnary.wgsl"
+JS_ARTIFACT = "khlnary.js"
+
+
+class WebGpuBackend:
+    """WGSL/JS generator; with an `ArtifactCache`, unchanged modules skip generation."""
+
+    def __init__(self, cache: Optional[ArtifactCache] = None) -> None:
+        self.cache = cache
+
+    @metrics.timed("khlnary_wgsl_generate_seconds")
+    def build_program(self, module: KhlnaryModule) -> WgslProgram:
+        graph = build_graph(module.knus, module.tensors)
+        binding_plan = plan_storage_bindings(module)
+        dispatches, arena_units = _plan_dispatches(graph, module, binding_plan)
+
+        bindings: Dict[str, int] = {}
+        lines = []
+        for storage in binding_plan.files:
+            bindings[storage.name] = storage.binding
+            lines.append(f"@group(0) @binding({storage.binding}) var<storage, read> {storage.name} : array<u32>;")
+        bindings.update(
+            input_buffer=INPUT_BINDING,
+            output_buffer=OUTPUT_BINDING,
+            constants=CONSTANTS_BINDING,
+            arena=ARENA_BINDING,
+            tensor_offsets=TENSOR_OFFSETS_BINDING,
+        )
+        lines += [
+            "",
+            f"@group(0) @binding({INPUT_BINDING}) var<storage, read> input_buffer : array<f32>;",
+            f"@group(0) @binding({OUTPUT_BINDING}) var<storage, read_write> output_buffer : array<f32>;",
+            "struct Constants { batch_size: u32, seq_len: u32, hidden_size: u32 };",
+            f"@group(0) @binding({CONSTANTS_BINDING}) var<uniform> constants : Constants;",
+            f"@group(0) @binding({ARENA_BINDING}) var<storage, read_write> arena : array<f32>;",
+            f"struct TensorOffsets {{ slots : array<vec4<u32>, {binding_plan.uniform_vec4s}> }};",
+            f"@group(0) @binding({TENSOR_OFFSETS_BINDING}) var<uniform> tensor_offsets : TensorOffsets;",
+            "",
+            _ACTIVATION_FNS,
+        ]
+        lines += [_TEMPLATES[d.kind](d) for d in dispatches]
+        return WgslProgram(
+            source="\n".join(lines),
+            dispatches=dispatches,
+            bindings=bindings,
+            arena_units=arena_units,
+            output_width=graph.nodes[graph.output].width,
+            binding_plan=binding_plan,
+            tensors=list(module.tensors),
+        )
+
+    def build_artifacts(self, module: KhlnaryModule) -> Dict[str, str]:
+        """Return `{WGSL_ARTIFACT: source, JS_ARTIFACT: loader}`, from the cache when possible."""
+
+        def build() -> Dict[str, bytes]:
+            program = self.build_program(module)
+            return {
+                WGSL_ARTIFACT: program.source.encode("utf-8"),
+                JS_ARTIFACT: self.generate_javascript_loader(program.binding_plan).encode("utf-8"),
+            }
+
+        if self.cache is None:
+            artifacts = build()
+        else:
+            key = artifact_key(module, kind="webgpu", backend_version=BACKEND_VERSION)
+            artifacts, _ = self.cache.get_or_build(key, build)
+        return {name: data.decode("utf-8") for name, data in artifacts.items()}
+
+    def generate_wgsl_shader(self, module: KhlnaryModule) -> str:
+        if self.cache is not None:
+            return self.build_artifacts(module)[WGSL_ARTIFACT]
+        return self.build_program(module).source
+
+    @staticmethod
+    def generate_javascript_loader(plan: Optional[BindingPlan] = None) -> str:
+        """Streaming JS loader; with a `plan`, also emits the file list and offset slot table."""
+        loader = "\n".join(
+            [
+                f"const KHLNARY_RANGE_MERGE_GAP = {RANGE_MERGE_GAP};",
+                f"const KHLNARY_STREAM_CHUNK_BYTES = {STREAM_CHUNK_BYTES};",
+                "",
+                _JS_LOADER,
+            ]
+        )
+        if plan is None:
+            return loader
+        storage = {
+            "files": [[f.file_id, f.binding, f.path] for f in plan.files],
+            "slots": plan.slot_table(),
+        }
+        return loader + "\n\nconst KHLNARY_STORAGE = " + json.dumps(storage) + ";\n"
+
+
+def _resolve_tensor(path: str, file_id: int, tensor_id: int) -> StbTensor:
+    tensor = StbTensor(file_id=file_id, tensor_id=tensor_id, dtype="float16", shape=(0,))
+    if Path(path).is_file():
+        meta = stb.read_stb_layout(path)["tensors"].get(tensor_id)
+        if meta is not None:
+            tensor.shape = tuple(int(d) for d in meta["dims"])
+            tensor.offset = int(meta["offset"])
+            tensor.dtype = DTYPE_BY_STB_ENUM.get(meta["dtype_enum"], tensor.dtype)
+    return tensor
+
+
+def lower_khlnary_to_wgsl(
+    knus: List[int],
+    bin_file_table: Mapping[int, Mapping[str, str]],
+    tensors: Optional[List[StbTensor]] = None,
+    *,
+    cache: Optional[ArtifactCache] = None,
+) -> str:
+    """Lower a raw KNU stream; tensor shapes come from `tensors` or the .stb files."""
+
+    if tensors is None:
+        tensors = []
+        seen = set()
+        for w in knus:
+            k = decode_knu(w)
+            if k["glyph_id"] != GLYPH_IDS["G_LOAD_BIN_TENSOR"]:
+                continue
+            ref = stb.decode_load_bin_tensor_payload(int(k["payload"]))
+            if ref[0] not in bin_file_table:
+                raise KeyError(f"Missing bin_file_id in table: {ref[0]}")
+            if ref not in seen:
+                seen.add(ref)
+                tensors.append(_resolve_tensor(bin_file_table[ref[0]].get("path", ""), *ref))
+
+    module = KhlnaryModule(
+        knus=list(knus),
+        bin_files={file_id: str(entry.get("path", "")) for file_id, entry in bin_file_table.items()},
+        tensors=tensors,
+    )
+    return WebGpuBackend(cache).generate_wgsl_shader(module)
 
 
 def webgpu_js_loader(bin_file_table: Mapping[int, Mapping[str, str]]) -> str:
-    _ = bin_file_table
+    """Streaming loader plus `loadStbToBuffer`, which streams all (or the given) tensors of one file."""
+
+    files = {int(file_id): str(entry.get("path", "")) for file_id, entry in bin_file_table.items()}
     return "\n".join(
         [
-            "async function loadStbToBuffer(device, url) {",
-            "  const resp = await fetch(url);",
-            "  const buf = await resp.arrayBuffer();",
-            "  const gpuBuf = device.createBuffer({",
-            "    size: buf.byteLength,",
-            "    usage: GPUBufferUsage.STORAGE | GPUBufferUsage.COPY_DST,",
-            "  });",
-            "  device.queue.writeBuffer(gpuBuf, 0, buf);",
-            "  return gpuBuf;",
+            WebGpuBackend.generate_javascript_loader(),
+            "",
+            f"const KHLNARY_BIN_FILES = {json.dumps(files)};",
+            "",
+            "async function loadStbToBuffer(device, url, tensorIds) {",
+            "  return streamSTBBuffer(device, url, tensorIds);",
             "}",
         ]
     )
 
 
-__all__ = ["lower_khlnary_to_wgsl", "webgpu_js_loader", "WebGpuBackend"]
+__all__ = [
+    "BACKEND_VERSION",
+    "WGSL_ARTIFACT",
+    "JS_ARTIFACT",
+    "WgslBindingError",
+    "StorageBinding",
+    "TensorSlot",
+    "BindingPlan",
+    "StbRange",
+    "plan_stb_ranges",
+    "plan_storage_bindings",
+    "TileConfig",
+    "Operand",
+    "WgslDispatch",
+    "WgslProgram",
+    "matmul_tile_config",
+    "softmax_workgroup_size",
+    "lower_khlnary_to_wgsl",
+    "webgpu_js_loader",
+    "WebGpuBackend",
+]
@@ -0,0 +1,388 @@
+"""Sectioned, memory-mappable KHΛNARY module container (.khn v2).
+
+Layout (see docs/khn-format.md):
+
+    header (32 bytes) | section directory (N * 32) | 64-byte aligned sections
+
+`KhnFile` maps the file read-only and parses only the header and directory
+on open; each section is decoded on first access. Because the mapping is
+shared and read-only, worker processes opening the same file share its pages.
+
+`write_khn(..., compress="zlib" | "lzma" | "bz2")` stores the KNU stream as
+a columnar `KNUZ` section instead: one byte column per KNU field, parity
+dropped (recomputed on load), near-constant columns delta coded, the whole
+entropy coded with the chosen stdlib codec.
+"""
+
+from __future__ import annotations
+
+import bz2
+from functools import cached_property
+from itertools import accumulate
+import importlib
+import importlib.util
+import json
+import lzma
+import mmap
+import os
+from pathlib import Path
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+import zlib
+
+from tools.khlnary_compiler import DTYPE_BY_STB_ENUM, LAYOUT_BY_STB_ENUM, KhlnaryModule, StbTensor
+from tools.khlnary_encoder import FunctionEntry
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+KHN_MAGIC = b"KHN2"
+KHN_VERSION = 0x02
+KHN_ALIGN = 64
+
+HEADER = struct.Struct("<4sBBHQQQ")
+DIRECTORY_ENTRY = struct.Struct("<4sIQQQ")
+BIN_ENTRY = struct.Struct("<BBHIIIQ")
+TENSOR_ENTRY = struct.Struct("<BBBBB3xQ4I")
+FUNC_ENTRY = struct.Struct("<IIIHH")
+KNUZ_HEADER = struct.Struct("<BB2x")  # column count, delta-coded column mask
+
+SECTION_KNUS = b"KNUS"
+SECTION_KNUZ = b"KNUZ"
+SECTION_STRS = b"STRS"
+SECTION_BINS = b"BINS"
+SECTION_TNSR = b"TNSR"
+SECTION_FUNC = b"FUNC"
+SECTION_META = b"META"
+
+# Sections made of fixed-size entries; the directory item count must match their size.
+_ENTRY_SIZES = {
+    SECTION_KNUS: 4,
+    SECTION_BINS: BIN_ENTRY.size,
+    SECTION_TNSR: TENSOR_ENTRY.size,
+    SECTION_FUNC: FUNC_ENTRY.size,
+}
+
+STB_ENUM_BY_DTYPE = {name: enum for enum, name in DTYPE_BY_STB_ENUM.items()}
+STB_ENUM_BY_LAYOUT = {name: enum for enum, name in LAYOUT_BY_STB_ENUM.items()}
+
+# KNUZ section flags name the codec.
+KNU_CODECS = {"zlib": 1, "lzma": 2, "bz2": 3}
+_COMPRESS = {1: lambda b: zlib.compress(b, 9), 2: lzma.compress, 3: lambda b: bz2.compress(b, 9)}
+_DECOMPRESS = {1: zlib.decompress, 2: lzma.decompress, 3: bz2.decompress}
+
+# (shift, mask) per KNU-32 field: VER, GLYPH_ID, ARITY, PROFILE_FLAGS, PAYLOAD, AUTH_CLASS.
+KNU_FIELDS = ((28, 0xF), (20, 0xFF), (16, 0xF), (12, 0xF), (4, 0xFF), (1, 0x7))
+
+
+class KhnFormatError(ValueError):
+    """Raised when a .khn container is malformed or unsupported."""
+
+
+def _align(value: int) -> int:
+    return (value + KHN_ALIGN - 1) & ~(KHN_ALIGN - 1)
+
+
+# ------------------------------------------------------------
+# Columnar KNU stream (KNUZ)
+# ------------------------------------------------------------
+
+def _parity_bits(words):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words) & 1
+    return np.unpackbits(words.view(np.uint8)).reshape(words.size, 32).sum(axis=1).astype(np.uint32) & 1
+
+
+def pack_knu_columns(knus: Sequence[int], codec: str = "zlib") -> bytes:
+    """Compress a KNU stream into KNUZ section bytes; parity must be valid (it is not stored)."""
+
+    if codec not in KNU_CODECS:
+        raise KhnFormatError(f"Unknown KNU codec {codec!r}")
+    if np is not None:
+        words = np.asarray(knus, dtype="<u4")
+        bad = np.flatnonzero(_parity_bits(words))
+        if bad.size:
+            raise KhnFormatError(f"KNU {int(bad[0])} fails parity; refusing to drop the parity bit")
+        cols = np.stack([(words >> shift) & mask for shift, mask in KNU_FIELDS]).astype(np.uint8)
+        deltas = np.diff(cols, axis=1, prepend=np.uint8(0))
+        use_delta = np.count_nonzero(deltas, axis=1) < np.count_nonzero(cols, axis=1)
+        body = np.where(use_delta[:, None], deltas, cols).tobytes()
+        delta_mask = sum(1 << i for i, flag in enumerate(use_delta) if flag)
+    else:
+        words = [w & 0xFFFFFFFF for w in knus]
+        for i, w in enumerate(words):
+            if w.bit_count() & 1:
+                raise KhnFormatError(f"KNU {i} fails parity; refusing to drop the parity bit")
+        body = bytearray()
+        delta_mask = 0
+        for i, (shift, mask) in enumerate(KNU_FIELDS):
+            col = [(w >> shift) & mask for w in words]
+            delta = [(b - a) & 0xFF for a, b in zip([0] + col, col)]
+            if sum(map(bool, delta)) < sum(map(bool, col)):
+                col, delta_mask = delta, delta_mask | (1 << i)
+            body += bytes(col)
+    return KNUZ_HEADER.pack(len(KNU_FIELDS), delta_mask) + _COMPRESS[KNU_CODECS[codec]](bytes(body))
+
+
+def unpack_knu_columns(data, count: int, codec_id: int):
+    """Decode KNUZ section bytes back into `count` KNU words (uint32 array with NumPy)."""
+
+    if codec_id not in _DECOMPRESS:
+        raise KhnFormatError(f"Unsupported KNUZ codec id {codec_id}")
+    if len(data) < KNUZ_HEADER.size:
+        raise KhnFormatError(f"KNUZ section of {len(data)} bytes is shorter than its header")
+    ncols, delta_mask = KNUZ_HEADER.unpack_from(data, 0)
+    if ncols != len(KNU_FIELDS):
+        raise KhnFormatError(f"KNUZ has {ncols} columns, expected {len(KNU_FIELDS)}")
+    try:
+        body = _DECOMPRESS[codec_id](bytes(data[KNUZ_HEADER.size :]))
+    except (zlib.error, lzma.LZMAError, OSError, ValueError) as exc:
+        raise KhnFormatError(f"KNUZ payload does not decompress: {exc}") from exc
+    if len(body) != ncols * count:
+        raise KhnFormatError(f"KNUZ holds {len(body)} bytes, expected {ncols * count}")
+
+    if np is not None:
+        cols = np.frombuffer(body, dtype=np.uint8).reshape(ncols, count)
+        words = np.zeros(count, dtype=np.uint32)
+        for i, (shift, _) in enumerate(KNU_FIELDS):
+            col = np.cumsum(cols[i], dtype=np.uint8) if delta_mask >> i & 1 else cols[i]
+            words |= col.astype(np.uint32) << np.uint32(shift)
+        return words | _parity_bits(words).astype(np.uint32)
+    words = [0] * count
+    for i, (shift, _) in enumerate(KNU_FIELDS):
+        col = body[i * count : (i + 1) * count]
+        if delta_mask >> i & 1:
+            col = accumulate(col, lambda a, b: (a + b) & 0xFF)
+        words = [w | (v << shift) for w, v in zip(words, col)]
+    return [w | (w.bit_count() & 1) for w in words]
+
+
+# ------------------------------------------------------------
+# Writer
+# ------------------------------------------------------------
+
+def _encode_sections(module: KhlnaryModule, compress: Optional[str] = None) -> List[Tuple[bytes, int, int, bytes]]:
+    strings = bytearray()
+    bins = bytearray()
+    for file_id, path in sorted(module.bin_files.items()):
+        encoded = str(path).encode("utf-8")
+        bins += BIN_ENTRY.pack(file_id, 0, 64, len(strings), len(encoded), 0, 0)
+        strings += encoded
+
+    tensors = bytearray()
+    for t in module.tensors:
+        if len(t.shape) > 4:
+            raise KhnFormatError(f"tensor {t.ptr_name} has rank {len(t.shape)} > 4")
+        dims = list(t.shape) + [0] * (4 - len(t.shape))
+        tensors += TENSOR_ENTRY.pack(
+            t.file_id,
+            t.tensor_id,
+            STB_ENUM_BY_DTYPE[t.dtype],
+            STB_ENUM_BY_LAYOUT[t.layout],
+            len(t.shape),
+            t.offset,
+            *dims,
+        )
+
+    funcs = b"".join(
+        FUNC_ENTRY.pack(f.func_id, f.entry_pc, f.end_pc, f.arity, f.num_locals)
+        for _, f in sorted(module.functions.items())
+    )
+    meta = json.dumps(module.metadata, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+    if compress is None:
+        knus = (SECTION_KNUS, 0, len(module.knus), struct.pack(f"<{len(module.knus)}I", *module.knus))
+    else:
+        knus = (SECTION_KNUZ, KNU_CODECS.get(compress, 0), len(module.knus), pack_knu_columns(module.knus, compress))
+    return [
+        knus,
+        (SECTION_STRS, 0, len(module.bin_files), bytes(strings)),
+        (SECTION_BINS, 0, len(module.bin_files), bytes(bins)),
+        (SECTION_TNSR, 0, len(module.tensors), bytes(tensors)),
+        (SECTION_FUNC, 0, len(module.functions), funcs),
+        (SECTION_META, 0, 1, meta),
+    ]
+
+
+def encode_khn(module: KhlnaryModule, *, compress: Optional[str] = None) -> bytes:
+    """Serialize `module` as .khn v2 container bytes; `compress` names a KNUZ codec."""
+
+    sections = _encode_sections(module, compress)
+
+    directory = bytearray()
+    cursor = _align(HEADER.size + DIRECTORY_ENTRY.size * len(sections))
+    layout = []
+    for tag, sec_flags, count, data in sections:
+        directory += DIRECTORY_ENTRY.pack(tag, sec_flags, cursor, len(data), count)
+        layout.append((cursor, data))
+        cursor = _align(cursor + len(data))
+    file_size = cursor
+
+    out = bytearray(file_size)
+    out[: HEADER.size] = HEADER.pack(KHN_MAGIC, KHN_VERSION, 0, len(sections), HEADER.size, file_size, 0)
+    out[HEADER.size : HEADER.size + len(directory)] = directory
+    for offset, data in layout:
+        out[offset : offset + len(data)] = data
+    return bytes(out)
+
+
+def write_khn(path, module: KhlnaryModule, *, compress: Optional[str] = None) -> Path:
+    """Write `module` as a .khn v2 container."""
+
+    path = Path(path)
+    path.write_bytes(encode_khn(module, compress=compress))
+    return path
+
+
+# ------------------------------------------------------------
+# Reader
+# ------------------------------------------------------------
+
+class KhnFile:
+    """Read-only, lazily parsed view of a .khn v2 container."""
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise KhnFormatError("File too small for .khn header")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.directory = self._read_directory()
+        except KhnFormatError:
+            self._mm.close()
+            raise
+
+    def _read_directory(self) -> Dict[bytes, Tuple[int, int, int, int]]:
+        magic, version, flags, count, dir_offset, file_size, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != KHN_MAGIC:
+            raise KhnFormatError("Invalid KHN magic")
+        if version != KHN_VERSION:
+            raise KhnFormatError(f"Unsupported KHN version: {version}")
+        if flags != 0:
+            raise KhnFormatError(f"Unsupported KHN flags: {flags}")
+        if file_size != len(self._mm):
+            raise KhnFormatError(f"Header file_size {file_size} does not match length {len(self._mm)}")
+        if dir_offset < HEADER.size or dir_offset + count * DIRECTORY_ENTRY.size > file_size:
+            raise KhnFormatError(f"Section directory ({count} entries at {dir_offset}) runs past the end of the file")
+
+        directory = {}
+        for i in range(count):
+            tag, sec_flags, offset, size, items = DIRECTORY_ENTRY.unpack_from(self._mm, dir_offset + i * DIRECTORY_ENTRY.size)
+            if offset % KHN_ALIGN or offset + size > file_size:
+                raise KhnFormatError(f"Section {tag!r} out of bounds or misaligned")
+            entry = _ENTRY_SIZES.get(tag)
+            if entry is not None and size != items * entry:
+                raise KhnFormatError(f"Section {tag!r} holds {size} bytes, expected {items} entries of {entry}")
+            directory[tag] = (sec_flags, offset, size, items)
+        return directory
+
+    def section(self, tag: bytes) -> memoryview:
+        """Zero-copy view of one section's bytes."""
+        if tag not in self.directory:
+            raise KhnFormatError(f"Missing section {tag!r}")
+        _, offset, size, _ = self.directory[tag]
+        return memoryview(self._mm)[offset : offset + size]
+
+    @property
+    def compressed(self) -> bool:
+        return SECTION_KNUZ in self.directory
+
+    @property
+    def knu_count(self) -> int:
+        return self.directory[SECTION_KNUZ if self.compressed else SECTION_KNUS][3]
+
+    @cached_property
+    def knus(self):
+        """KNU words; a zero-copy NumPy view over the mapping when available.
+
+        A compressed (KNUZ) stream is decoded once into a fresh array.
+        """
+        if self.compressed:
+            codec_id, _, _, count = self.directory[SECTION_KNUZ]
+            return unpack_knu_columns(self.section(SECTION_KNUZ), count, codec_id)
+        _, offset, _, count = self.directory[SECTION_KNUS]
+        if np is not None:
+            return np.frombuffer(self._mm, dtype="<u4", count=count, offset=offset)
+        return [w for (w,) in struct.iter_unpack("<I", self.section(SECTION_KNUS))]
+
+    @cached_property
+    def bin_files(self) -> Dict[int, str]:
+        strings = self.section(SECTION_STRS)
+        table = {}
+        for file_id, _, _, path_off, path_len, _, _ in BIN_ENTRY.iter_unpack(self.section(SECTION_BINS)):
+            table[file_id] = bytes(strings[path_off : path_off + path_len]).decode("utf-8")
+        return table
+
+    @cached_property
+    def tensors(self) -> List[StbTensor]:
+        tensors = []
+        for file_id, tensor_id, dtype, layout, rank, offset, *dims in TENSOR_ENTRY.iter_unpack(self.section(SECTION_TNSR)):
+            if dtype not in DTYPE_BY_STB_ENUM:
+                raise KhnFormatError(f"Unsupported dtype enum: {dtype}")
+            tensors.append(
+                StbTensor(
+                    file_id=file_id,
+                    tensor_id=tensor_id,
+                    dtype=DTYPE_BY_STB_ENUM[dtype],
+                    shape=tuple(dims[:rank]),
+                    offset=offset,
+                    layout=LAYOUT_BY_STB_ENUM.get(layout, "row_major"),
+                )
+            )
+        return tensors
+
+    @cached_property
+    def functions(self) -> Dict[int, FunctionEntry]:
+        entries = (FunctionEntry(*row) for row in FUNC_ENTRY.iter_unpack(self.section(SECTION_FUNC)))
+        return {entry.func_id: entry for entry in entries}
+
+    @cached_property
+    def metadata(self) -> Dict[str, object]:
+        return json.loads(bytes(self.section(SECTION_META)).decode("utf-8"))
+
+    def to_module(self) -> KhlnaryModule:
+        return KhlnaryModule(
+            knus=[int(w) for w in self.knus],
+            bin_files=dict(self.bin_files),
+            tensors=list(self.tensors),
+            functions=dict(self.functions),
+            # A verifier certificate only holds in the process that issued it.
+            metadata={k: v for k, v in self.metadata.items() if k != "verified"},
+        )
+
+    def close(self) -> None:
+        self.__dict__.pop("knus", None)
+        try:
+            self._mm.close()
+        except BufferError:
+            # A caller still holds a view of the KNU section; the mapping is
+            # released when that view is dropped.
+            pass
+
+    def __enter__(self) -> "KhnFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_khn(path) -> KhlnaryModule:
+    """Load a whole .khn v2 container into a `KhlnaryModule`."""
+
+    with KhnFile(path) as khn:
+        return khn.to_module()
+
+
+__all__ = [
+    "KHN_MAGIC",
+    "KHN_VERSION",
+    "KhnFormatError",
+    "KhnFile",
+    "KNU_CODECS",
+    "pack_knu_columns",
+    "unpack_knu_columns",
+    "encode_khn",
+    "write_khn",
+    "read_khn",
+]
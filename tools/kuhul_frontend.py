@@ -0,0 +1,359 @@
+"""Hand-written KUHUL front-end for the grammar in docs/grammar.ebnf.
+
+One regex scan tokenizes the source (token offsets are recomputed only to
+report an error). A recursive-descent parser then walks the tokens once and
+emits `[name, arity, flags, payload]` glyph tuples through `GlyphEmitter`,
+so no syntax tree is built. Lowering matches `ExtendedLower`: a KUHUL
+program and its Python-subset equivalent produce identical KNU streams.
+
+    func add(a, b) { return a + b; }
+    x = 0;
+    while (x < 5) { x = add(x, 1); }
+    tensor(1, 0);
+    prefetch(2);
+    x;
+
+Statement-initial glyph mnemonics (`nop;`, `const -3;`, `jump 4;`,
+`load_tensor(1, 0);`, ...) emit their KNU verbatim. `add` and friends
+stay usable as function names because a mnemonic counts as a glyph only
+when its operand syntax follows.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from tools import khlnary_metrics as metrics
+from tools.khlnary_encoder import (
+    FLAG_IMMEDIATE,
+    FunctionEntry,
+    GlyphEmitter,
+    KhlNaryLoweringError,
+    encode_glyphs,
+)
+from tools.kuhul_glyphs import FLAG_BITS
+
+FLAG_BIN_REF = FLAG_BITS["BIN_REF"]
+
+# Whitespace never matches and is skipped by the scan; comments match with every group empty.
+_TOKEN = re.compile(r"(\d+)|([A-Za-z_]\w*)|//[^\n]*|(==|[-+*/=<(){},;])|(\S)")
+KEYWORDS = frozenset({"func", "return", "if", "else", "while", "tensor"})
+
+# mnemonic -> (glyph, arity, flags, operand): operand is None, "s8", "u8", "file" or "tensor"
+GLYPH_MNEMONICS: Dict[str, Tuple[str, int, int, Optional[str]]] = {
+    "nop": ("G_NOP", 0, 0, None),
+    "const": ("G_CONST_I8", 0, FLAG_IMMEDIATE, "s8"),
+    "add": ("G_ADD_I32", 2, 0, None),
+    "ret": ("G_RET", 1, 0, None),
+    "ifz": ("G_IFZ_JUMP8", 1, FLAG_IMMEDIATE, "s8"),
+    "jump": ("G_JUMP8", 0, FLAG_IMMEDIATE, "s8"),
+    "while_head": ("G_WHILE_HEAD", 0, 0, None),
+    "while_tail": ("G_WHILE_TAIL", 0, 0, None),
+    "func_def": ("G_FUNC_DEF", 1, FLAG_IMMEDIATE, "u8"),
+    "func_end": ("G_FUNC_END", 0, 0, None),
+    "call": ("G_CALL", 0, FLAG_IMMEDIATE, "u8"),
+    "load_tensor": ("G_LOAD_BIN_TENSOR", 0, FLAG_BIN_REF, "tensor"),
+    "mmap_region": ("G_MMAP_BIN_REGION", 0, FLAG_BIN_REF, "file"),
+    "prefetch": ("G_PREFETCH_BIN", 0, FLAG_BIN_REF, "file"),
+}
+_BINARY_GLYPHS = {"+": ("G_ADD_I32", 2), "==": ("G_EQ_I32", 2), "<": ("G_LT_I32", 2)}
+
+
+class KuhulSyntaxError(KhlNaryLoweringError):
+    """Raised on malformed KUHUL source; the message carries line and column."""
+
+
+def tokenize(src: str) -> Tuple[List[str], List[str]]:
+    """Return parallel token kind / text lists, ending with an `eof` token.
+
+    Kinds are `int`, `name`, a keyword, or the operator text itself.
+    """
+
+    kinds: List[str] = []
+    texts: List[str] = []
+    for number, name, op, bad in _TOKEN.findall(src):
+        if number:
+            kinds.append("int")
+            texts.append(number)
+        elif name:
+            kinds.append(name if name in KEYWORDS else "name")
+            texts.append(name)
+        elif op:
+            kinds.append(op)
+            texts.append(op)
+        elif bad:
+            raise _syntax_error(src, token_offsets(src)[len(texts)], f"unexpected character {bad!r}")
+    kinds.append("eof")
+    texts.append("")
+    return kinds, texts
+
+
+def token_offsets(src: str) -> List[int]:
+    """Source offset of every token `tokenize` returns (computed only for error reporting)."""
+
+    offsets = [m.start() for m in _TOKEN.finditer(src) if m.lastindex is not None]
+    offsets.append(len(src))
+    return offsets
+
+
+def _starts_glyph(operand: Optional[str], following: str) -> bool:
+    """Whether a statement-initial mnemonic followed by token kind `following` is a glyph."""
+
+    if operand is None:
+        return following == ";"
+    if operand in ("s8", "u8"):
+        return following in ("int", "-")
+    return following == "("  # bin-region mnemonics are reserved as statements
+
+
+def _syntax_error(src: str, offset: int, message: str) -> KuhulSyntaxError:
+    line = src.count("\n", 0, offset) + 1
+    col = offset - (src.rfind("\n", 0, offset) + 1) + 1
+    return KuhulSyntaxError(f"line {line}, column {col}: {message}")
+
+
+class KuhulParser(GlyphEmitter):
+    """Single-pass recursive-descent parser that lowers KUHUL straight to glyph tuples."""
+
+    def __init__(self, src: str, function_ids: Optional[Dict[str, int]] = None) -> None:
+        super().__init__(function_ids)
+        self.src = src
+        self.kinds, self.texts = tokenize(src)
+        self.pos = 0
+
+    # -- token helpers -------------------------------------------------
+
+    def _error(self, message: str) -> KuhulSyntaxError:
+        return _syntax_error(self.src, token_offsets(self.src)[self.pos], message)
+
+    def _expect(self, kind: str) -> str:
+        if self.kinds[self.pos] != kind:
+            found = self.texts[self.pos] or "end of input"
+            raise self._error(f"expected {kind!r}, found {found!r}")
+        text = self.texts[self.pos]
+        self.pos += 1
+        return text
+
+    def _integer(self, low: int, high: int, what: str) -> int:
+        negative = self.kinds[self.pos] == "-"
+        if negative:
+            self.pos += 1
+        value = int(self._expect("int"))
+        value = -value if negative else value
+        if not low <= value <= high:
+            self.pos -= 1
+            raise self._error(f"{what} {value} outside [{low}, {high}]")
+        return value
+
+    # -- statements ----------------------------------------------------
+
+    def parse(self) -> "KuhulParser":
+        self.locals_stack.append({})
+        while self.kinds[self.pos] != "eof":
+            self._statement()
+        self.locals_stack.pop()
+        self.finalize()
+        return self
+
+    def _statement(self) -> None:
+        kind = self.kinds[self.pos]
+        if kind == "name":
+            following = self.kinds[self.pos + 1]
+            mnemonic = GLYPH_MNEMONICS.get(self.texts[self.pos])
+            if mnemonic is not None and _starts_glyph(mnemonic[3], following):
+                self._glyph(mnemonic)
+                return
+            if following == "=":
+                name = self.texts[self.pos]
+                self.pos += 2
+                self._expression()
+                self.emit("G_STORE_LOCAL", arity=1, flags=FLAG_IMMEDIATE, payload=self._local_slot(name))
+                self._expect(";")
+                return
+        elif kind == "func":
+            self._func_def()
+            return
+        elif kind == "if":
+            self._if()
+            return
+        elif kind == "while":
+            self._while()
+            return
+        elif kind == "return":
+            self.pos += 1
+            self._expression()
+            self.emit("G_RET", arity=1)
+            self._expect(";")
+            return
+        elif kind == "tensor":
+            self.pos += 1
+            self._tensor_ref("G_LOAD_BIN_TENSOR", 0, FLAG_BIN_REF)
+            self._expect(";")
+            return
+        self._expression()
+        self.emit("G_RET", arity=1)
+        self._expect(";")
+
+    def _glyph(self, mnemonic: Tuple[str, int, int, Optional[str]]) -> None:
+        glyph, arity, flags, operand = mnemonic
+        self.pos += 1
+        if operand is None:
+            self.emit(glyph, arity, flags)
+        elif operand == "s8":
+            self.emit(glyph, arity, flags, self._integer(-128, 127, "int8 operand") & 0xFF)
+        elif operand == "u8":
+            self.emit(glyph, arity, flags, self._integer(0, 255, "id"))
+        elif operand == "file":
+            self._expect("(")
+            self.emit(glyph, arity, flags, self._integer(0, 255, "bin file id"))
+            self._expect(")")
+        else:
+            self._tensor_ref(glyph, arity, flags)
+        self._expect(";")
+
+    def _tensor_ref(self, glyph: str, arity: int, flags: int) -> None:
+        self._expect("(")
+        file_id = self._integer(0, 15, "bin file id")
+        self._expect(",")
+        tensor_id = self._integer(0, 15, "tensor id")
+        self._expect(")")
+        self.emit(glyph, arity, flags, (file_id << 4) | tensor_id)
+
+    def _block(self) -> None:
+        self._expect("{")
+        while self.kinds[self.pos] != "}":
+            if self.kinds[self.pos] == "eof":
+                raise self._error("unterminated block")
+            self._statement()
+        self.pos += 1
+
+    def _func_def(self) -> None:
+        self.pos += 1
+        name = self._expect("name")
+        func_id = self._get_function_id(name)
+        if func_id > 255:
+            raise KhlNaryLoweringError("function id exceeds 8-bit payload")
+        entry_pc = self.emit("G_FUNC_DEF", arity=1, flags=FLAG_IMMEDIATE, payload=func_id) + 1
+
+        params: Dict[str, int] = {}
+        self._expect("(")
+        if self.kinds[self.pos] != ")":
+            params[self._expect("name")] = 0
+            while self.kinds[self.pos] == ",":
+                self.pos += 1
+                params[self._expect("name")] = len(params)
+        self._expect(")")
+        arity = len(params)
+
+        self.locals_stack.append(params)
+        self._block()
+        num_locals = len(self.locals_stack.pop())
+        end_pc = self.emit("G_FUNC_END")
+        self.functions[func_id] = FunctionEntry(func_id, entry_pc, end_pc, arity, num_locals)
+
+    def _condition(self) -> None:
+        self.pos += 1
+        self._expect("(")
+        self._expression()
+        self._expect(")")
+
+    def _if(self) -> None:
+        self._condition()
+        jmp_false = self.emit("G_IFZ_JUMP8", arity=1, flags=FLAG_IMMEDIATE)
+        self._block()
+        if self.kinds[self.pos] == "else":
+            self.pos += 1
+            jmp_end = self.emit("G_JUMP8", flags=FLAG_IMMEDIATE)
+            self.patch_jump(jmp_false, len(self.glyphs))
+            self._block()
+            self.patch_jump(jmp_end, len(self.glyphs))
+        else:
+            self.patch_jump(jmp_false, len(self.glyphs))
+
+    def _while(self) -> None:
+        head = self.emit("G_WHILE_HEAD")
+        self._condition()
+        jmp_exit = self.emit("G_IFZ_JUMP8", arity=1, flags=FLAG_IMMEDIATE)
+        self._block()
+        self.patch_jump(self.emit("G_JUMP8", flags=FLAG_IMMEDIATE), head)
+        self.patch_jump(jmp_exit, self.emit("G_WHILE_TAIL"))
+
+    # -- expressions -----------------------------------------------------
+
+    def _expression(self) -> None:
+        self._additive()
+        op = self.kinds[self.pos]
+        if op == "==" or op == "<":
+            self.pos += 1
+            self._additive()
+            self.emit(*_BINARY_GLYPHS[op])
+
+    def _additive(self) -> None:
+        self._multiplicative()
+        while self.kinds[self.pos] in ("+", "-"):
+            if self.kinds[self.pos] == "-":
+                raise self._error("only the '+' binary operator is supported")
+            self.pos += 1
+            self._multiplicative()
+            self.emit("G_ADD_I32", arity=2)
+
+    def _multiplicative(self) -> None:
+        self._primary()
+        if self.kinds[self.pos] in ("*", "/"):
+            raise self._error("only the '+' binary operator is supported")
+
+    def _primary(self) -> None:
+        kind = self.kinds[self.pos]
+        if kind == "int":
+            self.emit("G_CONST_I8", flags=FLAG_IMMEDIATE, payload=self._integer(0, 127, "integer literal"))
+        elif kind == "name":
+            name = self.texts[self.pos]
+            self.pos += 1
+            if self.kinds[self.pos] != "(":
+                self.emit("G_LOAD_LOCAL", flags=FLAG_IMMEDIATE, payload=self._local_slot(name))
+                return
+            self.pos += 1
+            argc = 0
+            if self.kinds[self.pos] != ")":
+                self._expression()
+                argc = 1
+                while self.kinds[self.pos] == ",":
+                    self.pos += 1
+                    self._expression()
+                    argc += 1
+            self._expect(")")
+            self.pending_calls.append((self.emit("G_CALL", arity=argc, flags=FLAG_IMMEDIATE), name))
+        elif kind == "(":
+            self.pos += 1
+            self._expression()
+            self._expect(")")
+        else:
+            raise self._error(f"expected an expression, found {self.texts[self.pos] or 'end of input'!r}")
+
+
+def lower_kuhul(src: str, function_ids: Optional[Dict[str, int]] = None) -> KuhulParser:
+    """Parse and lower KUHUL `src` in one pass, returning the finalized parser."""
+
+    with metrics.timer("khlnary_kuhul_parse_seconds"):
+        return KuhulParser(src, function_ids).parse()
+
+
+def compile_kuhul_to_khlnary_words(src: str) -> List[int]:
+    return encode_glyphs(lower_kuhul(src).glyphs)
+
+
+def compile_kuhul_with_functions(src: str) -> Tuple[List[int], Dict[int, FunctionEntry]]:
+    parser = lower_kuhul(src)
+    return encode_glyphs(parser.glyphs), parser.functions
+
+
+__all__ = [
+    "GLYPH_MNEMONICS",
+    "KuhulSyntaxError",
+    "KuhulParser",
+    "tokenize",
+    "lower_kuhul",
+    "compile_kuhul_to_khlnary_words",
+    "compile_kuhul_with_functions",
+]
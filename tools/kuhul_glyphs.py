@@ -20,6 +20,11 @@ KUHUL_GLYPHS = {
         "arity": 2,
         "encoding": {"flags": ["BIN_REF"], "payload": "kernel_id(8)"},
     },
+    "G_FUSED_LINEAR": {
+        "id": 0x43,
+        "arity": 3,
+        "encoding": {"flags": ["IMM"], "payload": "activation(8)"},
+    },
     # Activations
     "G_RELU": {"id": 0x50, "arity": 1, "encoding": {"flags": [], "payload": 0}},
     "G_GELU": {"id": 0x51, "arity": 1, "encoding": {"flags": [], "payload": 0}},
@@ -35,6 +40,11 @@ KUHUL_GLYPHS = {
         "arity": 3,
         "encoding": {"flags": ["IMM"], "payload": "scale_factor(8)"},
     },
+    "G_FUSED_ATTENTION": {
+        "id": 0x62,
+        "arity": 3,
+        "encoding": {"flags": ["IMM"], "payload": "scale_factor(8)"},
+    },
     # Control flow
     "G_FORWARD_PASS": {
         "id": 0x70,
@@ -54,4 +64,13 @@ FLAG_BITS = {
     "SHAPE_DESC": 0x4,
 }
 
-__all__ = ["KUHUL_GLYPHS", "FLAG_BITS"]
+KUHUL_GLYPHS_BY_ID = {glyph["id"]: name for name, glyph in KUHUL_GLYPHS.items()}
+
+# G_FUSED_LINEAR payload: activation applied after matmul + bias.
+FUSED_ACTIVATIONS = {
+    "none": 0,
+    "relu": 1,
+    "gelu": 2,
+}
+
+__all__ = ["KUHUL_GLYPHS", "KUHUL_GLYPHS_BY_ID", "FLAG_BITS", "FUSED_ACTIVATIONS"]
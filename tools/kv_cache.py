@@ -0,0 +1,264 @@
+"""Paged key/value cache for autoregressive decode through attention glyphs.
+
+`KVCache` preallocates one pool of fixed-size blocks, each holding
+`block_size` rows of keys and values of width `heads * head_dim`. Every
+`(sequence, layer)` pair owns a block table; appends only ever write the
+rows after the current end, allocating a new block when the tail fills up.
+
+With `max_context` set, blocks that lie wholly before the last
+`max_context` positions are returned to the pool (a sliding window, so
+decode memory stays bounded). When the pool runs dry the least recently
+used other sequence is evicted; if none is left, `KVCacheFullError` is
+raised. An evicted sequence's next append raises `KVCacheEvictedError`
+rather than silently restarting at position 0; `free` it (or `end` its
+`DecodeSession`) and prefill it again. Appends reserve every block they need
+before writing a row, so a failed append leaves the cache unchanged, and
+`DecodeSession.step` reserves for all of its attention layers up front.
+
+`DecodeSession` runs a module on the CPU executor one chunk of tokens at a
+time. Its attention glyphs project only the new tokens, append their keys
+and values to the cache and attend causally over the cached blocks with an
+online softmax, so each decoded token costs O(context) rather than
+re-running attention over the whole prefix.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import importlib
+import importlib.util
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from tools.khlnary_compiler import GraphNode, KhlnaryModule
+from tools.khlnary_cpu import CpuExecutor, attention_params, causal_mask
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+KV_BLOCK_SIZE = 16
+KV_NUM_BLOCKS = 256
+ATTENTION_GLYPHS = ("G_SCALED_DOT_PRODUCT", "G_FUSED_ATTENTION")
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for the KHΛNARY KV cache")
+    return np
+
+
+class KVCacheFullError(RuntimeError):
+    """Raised when no block can be allocated, even after eviction."""
+
+
+class KVCacheEvictedError(RuntimeError):
+    """Raised when appending to a sequence whose blocks were evicted; it must be re-prefilled."""
+
+
+@dataclass
+class _Stream:
+    blocks: List[int] = field(default_factory=list)
+    start: int = 0  # absolute position of the first row of blocks[0]
+    length: int = 0  # absolute position one past the last appended row
+
+
+class KVCache:
+    def __init__(
+        self,
+        width: int,
+        *,
+        block_size: int = KV_BLOCK_SIZE,
+        num_blocks: int = KV_NUM_BLOCKS,
+        max_context: Optional[int] = None,
+    ) -> None:
+        _require_numpy()
+        if block_size < 1 or num_blocks < 1:
+            raise ValueError("block_size and num_blocks must be >= 1")
+        if max_context is not None and max_context < 1:
+            raise ValueError("max_context must be >= 1")
+        self.width = width
+        self.block_size = block_size
+        self.max_context = max_context
+        self.keys = np.zeros((num_blocks, block_size, width), dtype=np.float32)
+        self.values = np.zeros_like(self.keys)
+        self._free: List[int] = list(range(num_blocks - 1, -1, -1))
+        self._streams: Dict[Tuple[Hashable, Hashable], _Stream] = {}
+        self._last_used: Dict[Hashable, int] = {}
+        self._evicted: Set[Hashable] = set()
+        self._clock = 0
+        self.evictions = 0
+
+    @property
+    def free_blocks(self) -> int:
+        return len(self._free)
+
+    def length(self, seq_id: Hashable, layer: Hashable) -> int:
+        """Absolute number of positions appended to `(seq_id, layer)`."""
+
+        stream = self._streams.get((seq_id, layer))
+        return stream.length if stream else 0
+
+    def sequences(self) -> List[Hashable]:
+        return list(self._last_used)
+
+    def evicted(self, seq_id: Hashable) -> bool:
+        """True if `seq_id` lost its blocks to eviction and has not been freed since."""
+
+        return seq_id in self._evicted
+
+    def free(self, seq_id: Hashable) -> None:
+        """Release every block held by `seq_id` (clearing its evicted state)."""
+
+        self._release(seq_id)
+        self._evicted.discard(seq_id)
+
+    def _release(self, seq_id: Hashable) -> None:
+        for key in [key for key in self._streams if key[0] == seq_id]:
+            self._free.extend(reversed(self._streams.pop(key).blocks))
+        self._last_used.pop(seq_id, None)
+
+    def _allocate(self, seq_id: Hashable) -> int:
+        if not self._free:
+            victims = sorted((t, s) for s, t in self._last_used.items() if s != seq_id)
+            if not victims:
+                raise KVCacheFullError(f"KV cache exhausted by sequence {seq_id!r}")
+            self._release(victims[0][1])
+            self._evicted.add(victims[0][1])
+            self.evictions += 1
+        return self._free.pop()
+
+    def _touch(self, seq_id: Hashable) -> None:
+        if seq_id in self._evicted:
+            raise KVCacheEvictedError(f"sequence {seq_id!r} was evicted; free it and prefill again")
+        self._clock += 1
+        self._last_used[seq_id] = self._clock
+
+    def reserve(self, seq_id: Hashable, layers: Iterable[Hashable], rows: int) -> None:
+        """Allocate every block `rows` more positions need in each of `layers`, all or nothing."""
+
+        self._touch(seq_id)
+        reserved: List[Tuple[_Stream, int]] = []
+        try:
+            for layer in layers:
+                stream = self._streams.setdefault((seq_id, layer), _Stream())
+                needed = -(-(stream.length - stream.start + rows) // self.block_size) - len(stream.blocks)
+                for _ in range(needed):
+                    block = self._allocate(seq_id)
+                    stream.blocks.append(block)
+                    reserved.append((stream, block))
+        except KVCacheFullError:
+            for stream, block in reversed(reserved):
+                stream.blocks.pop()
+                self._free.append(block)
+            raise
+
+    def trim(self, seq_id: Hashable, layer: Hashable) -> None:
+        """Return blocks wholly outside the `max_context` window to the pool."""
+
+        stream = self._streams.get((seq_id, layer))
+        if stream is None or self.max_context is None:
+            return
+        while stream.blocks and stream.start + self.block_size <= stream.length - self.max_context:
+            self._free.append(stream.blocks.pop(0))
+            stream.start += self.block_size
+
+    def append(self, seq_id: Hashable, layer: Hashable, k, v) -> int:
+        """Append `[n, width]` keys and values; return the position of the first new row."""
+
+        if k.shape != v.shape or k.ndim != 2 or k.shape[1] != self.width:
+            raise ValueError(f"expected [n, {self.width}] keys and values, got {k.shape} and {v.shape}")
+        self.reserve(seq_id, (layer,), k.shape[0])
+        stream = self._streams[(seq_id, layer)]
+        first = stream.length
+        row = 0
+        while row < k.shape[0]:
+            index, used = divmod(stream.length - stream.start, self.block_size)
+            take = min(self.block_size - used, k.shape[0] - row)
+            self.keys[stream.blocks[index], used : used + take] = k[row : row + take]
+            self.values[stream.blocks[index], used : used + take] = v[row : row + take]
+            stream.length += take
+            row += take
+        return first
+
+    def blocks(self, seq_id: Hashable, layer: Hashable) -> Iterator[Tuple[int, object, object]]:
+        """Yield `(position, keys, values)` views of the cached rows, oldest first."""
+
+        stream = self._streams.get((seq_id, layer))
+        if stream is None:
+            return
+        for i, block in enumerate(stream.blocks):
+            pos = stream.start + i * self.block_size
+            if pos >= stream.length:
+                return  # reserved, not yet written
+            rows = min(self.block_size, stream.length - pos)
+            yield pos, self.keys[block, :rows], self.values[block, :rows]
+
+
+# ------------------------------------------------------------
+# Cached attention
+# ------------------------------------------------------------
+
+def cached_attention(cache: KVCache, seq_id: Hashable, layer: Hashable, x, wq, wk, wv, scale: float, heads: int):
+    """Causal attention of the new tokens `x` `[n, width]` over everything cached for the sequence.
+
+    Keys and values of `x` are appended first; the cache is then read block
+    by block with the same online softmax as `fused_attention`, and finally
+    trimmed to its `max_context` window. The first cached block starts at or
+    before the first new position, so no row is ever fully masked.
+    """
+
+    n, width = x.shape
+    head_dim = width // heads
+    first = cache.append(seq_id, layer, x @ wk, x @ wv)
+    q = (x @ wq).reshape(n, heads, head_dim).swapaxes(0, 1) * scale
+
+    running_max = np.full((heads, n, 1), -np.inf, dtype=np.float32)
+    denom = np.zeros((heads, n, 1), dtype=np.float32)
+    acc = np.zeros((heads, n, head_dim), dtype=np.float32)
+    for pos, k, v in cache.blocks(seq_id, layer):
+        k = k.reshape(-1, heads, head_dim).swapaxes(0, 1)
+        v = v.reshape(-1, heads, head_dim).swapaxes(0, 1)
+        tile = np.where(causal_mask(n, k.shape[1], first, pos), -np.inf, q @ k.swapaxes(-1, -2))
+        new_max = np.maximum(running_max, tile.max(axis=-1, keepdims=True))
+        probs = np.exp(tile - new_max)
+        correction = np.exp(running_max - new_max)
+        denom = denom * correction + probs.sum(axis=-1, keepdims=True)
+        acc = acc * correction + probs @ v
+        running_max = new_max
+    cache.trim(seq_id, layer)
+    return (acc / denom).swapaxes(0, 1).reshape(n, width)
+
+
+class DecodeSession:
+    """Incremental execution of a tensor module with per-sequence KV caches."""
+
+    def __init__(self, module: KhlnaryModule, cache: Optional[KVCache] = None, **cache_options) -> None:
+        self.executor = CpuExecutor(module)
+        widths = {n.width for n in self.executor.graph.nodes if n.op in ATTENTION_GLYPHS}
+        if len(widths) > 1:
+            raise ValueError(f"attention layers of different widths {sorted(widths)} cannot share one cache")
+        self.cache = cache or KVCache(widths.pop() if widths else 1, **cache_options)
+        self._attention_layers = [n.node_id for n in self.executor.graph.nodes if n.op in ATTENTION_GLYPHS]
+
+    def step(self, seq_id: Hashable, x):
+        """Run the new tokens `x` (`[n, hidden]`, prefill or one decode token) of `seq_id`."""
+
+        def attend(node: GraphNode, h, wq, wk, wv, out=None):
+            heads, scale = attention_params(node)
+            result = cached_attention(self.cache, seq_id, node.node_id, h, wq, wk, wv, scale, heads)
+            if out is None:
+                return result
+            np.copyto(out, result)
+            return out
+
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim != 2:
+            raise ValueError(f"decode steps take [tokens, hidden] input, got shape {x.shape}")
+        # Reserve for every layer first so a full cache fails before any layer advances.
+        self.cache.reserve(seq_id, self._attention_layers, x.shape[0])
+        return self.executor.run(x, kernels={op: attend for op in ATTENTION_GLYPHS})
+
+    def end(self, seq_id: Hashable) -> None:
+        self.cache.free(seq_id)
+
+
+__all__ = ["KVCache", "KVCacheFullError", "KVCacheEvictedError", "DecodeSession", "cached_attention"]
@@ -11,6 +11,8 @@ from pathlib import Path
 import struct
 from typing import Dict, Mapping, MutableMapping, Sequence
 
+from tools import khlnary_metrics as metrics
+
 _np_spec = importlib.util.find_spec("numpy")
 np = importlib.import_module("numpy") if _np_spec is not None else None
 
@@ -32,6 +34,10 @@ DTYPE_ENUM = (
 # enum -> dtype
 ENUM_DTYPE = {v: k for k, v in DTYPE_ENUM.items()}
 
+# Packed signed 4-bit integers: two values per byte, low nibble first. Arrays
+# are int8 in memory and packed only on disk.
+INT4_ENUM = 4
+
 
 class StbDependencyError(RuntimeError):
     """Raised when NumPy is not available for .stb read/write operations."""
@@ -43,6 +49,39 @@ def _require_numpy():
     return np
 
 
+def pack_int4(values):
+    """Pack int values in [-8, 7] two per byte, low nibble first."""
+
+    np_mod = _require_numpy()
+    flat = np_mod.asarray(values).astype(np_mod.int16).ravel()
+    if flat.size and (flat.min() < -8 or flat.max() > 7):
+        raise ValueError("int4 values must lie in [-8, 7]")
+    nibbles = (flat & 0xF).astype(np_mod.uint8)
+    if nibbles.size % 2:
+        nibbles = np_mod.append(nibbles, np_mod.uint8(0))
+    return (nibbles[0::2] | (nibbles[1::2] << 4)).astype(np_mod.uint8)
+
+
+def unpack_int4(packed, count: int):
+    """Inverse of `pack_int4`: the first `count` values as int8."""
+
+    np_mod = _require_numpy()
+    packed = np_mod.frombuffer(bytes(packed), dtype=np_mod.uint8)
+    nibbles = np_mod.empty(packed.size * 2, dtype=np_mod.uint8)
+    nibbles[0::2] = packed & 0xF
+    nibbles[1::2] = packed >> 4
+    return ((nibbles[:count].astype(np_mod.int8) ^ 8) - 8).astype(np_mod.int8)
+
+
+def _encode_tensor(np_mod, t: Mapping[str, object]):
+    """Return (dtype_enum, shape, raw bytes) for one writer entry."""
+
+    arr = np_mod.asarray(t["array"])
+    if t.get("dtype") == "int4":
+        return INT4_ENUM, arr.shape, pack_int4(arr).tobytes()
+    return DTYPE_ENUM[arr.dtype.type], arr.shape, arr.tobytes(order="C")
+
+
 # ------------------------------------------------------------
 # Writer
 # ------------------------------------------------------------
@@ -56,6 +95,7 @@ def write_stb(path, tensors: Sequence[Mapping[str, object]]):
         "tensor_id": int,
         "array": numpy array,
         "layout": 0 (row-major),
+        "dtype": "int4" (optional; packs int values in [-8, 7]),
       }
     """
 
@@ -74,11 +114,12 @@ def write_stb(path, tensors: Sequence[Mapping[str, object]]):
 
     # Write tensor descriptors (32 bytes each)
     descriptors = []
+    encoded = []
     for t in tensors:
-        arr = np_mod.asarray(t["array"])
+        dtype_enum, shape, raw = _encode_tensor(np_mod, t)
+        encoded.append(raw)
         tid = int(t["tensor_id"])
-        dtype_enum = DTYPE_ENUM[arr.dtype.type]
-        rank = arr.ndim
+        rank = len(shape)
         layout = int(t.get("layout", 0))
 
         # Raw data offset will be filled later
@@ -88,9 +129,9 @@ def write_stb(path, tensors: Sequence[Mapping[str, object]]):
                 "dtype": dtype_enum,
                 "rank": rank,
                 "layout": layout,
-                "dims": arr.shape,
+                "dims": shape,
                 "offset": None,
-                "size_bytes": arr.nbytes,
+                "size_bytes": len(raw),
             }
         )
 
@@ -105,10 +146,9 @@ def write_stb(path, tensors: Sequence[Mapping[str, object]]):
     f.write(b"\x00" * (data_offset - f.tell()))
 
     # Write raw tensor data
-    for d, t in zip(descriptors, tensors):
-        arr = np_mod.asarray(t["array"])
+    for d, raw in zip(descriptors, encoded):
         d["offset"] = f.tell()
-        f.write(arr.tobytes(order="C"))
+        f.write(raw)
 
     file_size = f.tell()
 
@@ -153,6 +193,7 @@ def write_stb(path, tensors: Sequence[Mapping[str, object]]):
         f.write(entry)
 
     f.close()
+    metrics.inc("khlnary_stb_bytes_written_total", file_size)
     return path
 
 
@@ -160,7 +201,15 @@ def write_stb(path, tensors: Sequence[Mapping[str, object]]):
 # Reader
 # ------------------------------------------------------------
 
-def read_stb(path):
+@metrics.timed("khlnary_stb_read_seconds")
+def read_stb(path, *, mmap: bool = False):
+    """Read every tensor of an .stb file.
+
+    With `mmap=True` the data region is memory-mapped read-only and arrays are
+    views into it (int4 tensors are still unpacked into fresh int8 arrays), so
+    processes and threads reading the same file share its pages.
+    """
+
     np_mod = _require_numpy()
 
     path = Path(path)
@@ -183,14 +232,15 @@ def read_stb(path):
         entry = f.read(32)
         (tid, dtype_enum, rank, layout, offset, size_bytes, d0, d1, d2) = struct.unpack("<BBBBQQLLL", entry)
 
-        if dtype_enum not in ENUM_DTYPE:
+        if dtype_enum not in ENUM_DTYPE and dtype_enum != INT4_ENUM:
             raise ValueError(f"Unsupported dtype enum: {dtype_enum}")
 
         dims = [d0, d1, d2][:rank]
-        dtype = ENUM_DTYPE[dtype_enum]
+        dtype = np_mod.int8 if dtype_enum == INT4_ENUM else ENUM_DTYPE[dtype_enum]
 
         tensors[tid] = {
             "dtype": dtype,
+            "dtype_enum": dtype_enum,
             "rank": rank,
             "layout": layout,
             "offset": offset,
@@ -198,8 +248,15 @@ def read_stb(path):
             "dims": dims,
         }
 
-    # Raw data region
-    raw = f.read()
+    # Raw data region (starts at the 64-byte aligned data_offset, not at the
+    # end of the tensor table)
+    if mmap:
+        raw = np_mod.memmap(path, dtype=np_mod.uint8, mode="r")[data_offset:]
+        metrics.inc("khlnary_stb_bytes_mapped_total", raw.size)
+    else:
+        f.seek(data_offset)
+        raw = f.read()
+        metrics.inc("khlnary_stb_bytes_read_total", len(raw))
     f.close()
 
     # Materialize arrays
@@ -207,7 +264,13 @@ def read_stb(path):
         start = meta["offset"] - data_offset
         end = start + meta["size_bytes"]
         buf = raw[start:end]
-        arr = np_mod.frombuffer(buf, dtype=meta["dtype"])
+        if meta["dtype_enum"] == INT4_ENUM:
+            count = 1
+            for dim in meta["dims"]:
+                count *= dim
+            arr = unpack_int4(buf, count)
+        else:
+            arr = np_mod.frombuffer(buf, dtype=meta["dtype"])
         if meta["rank"] <= 3:
             arr = arr.reshape(meta["dims"])
         meta["array"] = arr
@@ -215,6 +278,40 @@ def read_stb(path):
     return tensors
 
 
+@metrics.timed("khlnary_stb_header_parse_seconds")
+def read_stb_layout(path) -> Dict[str, object]:
+    """Read only the header and tensor table (no NumPy, no tensor data).
+
+    Returns `data_offset`, `file_size` and `tensors` keyed by tensor id, each with
+    `dtype_enum`, `rank`, `layout`, absolute `offset`, `size_bytes` and `dims`.
+    """
+
+    with Path(path).open("rb") as f:
+        header = f.read(32)
+        if len(header) < 32:
+            raise ValueError("File too small for STB header")
+        magic, version, flags, tensor_count, _, _, data_offset, file_size = struct.unpack("<4sBBHIIQQ", header)
+        if magic != STB_MAGIC:
+            raise ValueError("Invalid STB magic")
+        if version != STB_VERSION:
+            raise ValueError(f"Unsupported STB version: {version}")
+        if flags != 0:
+            raise ValueError(f"Unsupported STB flags: {flags}")
+        table = f.read(32 * tensor_count)
+
+    tensors: Dict[int, Dict[str, object]] = {}
+    for tid, dtype_enum, rank, layout, offset, size_bytes, d0, d1, d2 in struct.iter_unpack("<BBBBQQLLL", table):
+        tensors[tid] = {
+            "dtype_enum": dtype_enum,
+            "rank": rank,
+            "layout": layout,
+            "offset": offset,
+            "size_bytes": size_bytes,
+            "dims": [d0, d1, d2][:rank],
+        }
+    return {"data_offset": data_offset, "file_size": file_size, "tensors": tensors}
+
+
 # ------------------------------------------------------------
 # KHΛNARY payload wiring helpers
 # ------------------------------------------------------------
@@ -244,6 +341,9 @@ __all__ = [
     "StbDependencyError",
     "write_stb",
     "read_stb",
+    "read_stb_layout",
+    "pack_int4",
+    "unpack_int4",
     "decode_load_bin_tensor_payload",
     "resolve_khlnary_tensor",
 ]
@@ -0,0 +1,264 @@
+"""Shared-memory weight pool for multi-process KHΛNARY workers.
+
+The owner process reads every referenced `.stb` tensor once, converts it
+to float32 (the dtype `CpuExecutor` computes in), and copies it into one
+`multiprocessing.shared_memory` segment. Workers attach by handle and get
+read-only, zero-copy NumPy views keyed by `(bin_file_id, tensor_id)`, so
+adding workers adds no weight memory:
+
+    with WeightPool.from_module(module) as pool:
+        procs = [Process(target=worker, args=(pool.handle,)) for _ in range(8)]
+        ...
+
+    def worker(handle):
+        with attach(handle) as weights:
+            executor = CpuExecutor(module, weight_pool=weights)
+
+Segment layout: a 64-byte header (`magic "KWP1"`, attachment slot count
+i64), a table of `MAX_ATTACHMENTS` i64 slots holding the pid of each live
+attachment (0 when free), then the tensors at 64-byte aligned offsets. Slots
+are claimed and released under the handle's lock, so handles must reach
+workers as `Process`/`Pool` arguments (or through fork), not through a queue.
+The lock comes from `mp_context` (default: the default start method), and
+workers must be started from that same context, e.g.
+`WeightPool.from_module(module, mp_context=get_context("spawn"))` with
+`get_context("spawn").Process`.
+
+Only the owner unlinks the segment. `WeightPool.close(timeout=...)` waits
+for attached workers to detach first. A worker that exits without `close()`
+cannot release its slot. The owner therefore frees the slots of dead pids
+while it waits (POSIX only; on Windows such a slot holds the wait until
+`timeout`). Mappings that are still attached stay valid after the unlink,
+and the memory is freed when the last one detaches. Workers should be
+started through `multiprocessing` from the owner, which shares its resource
+tracker with them.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import importlib
+import importlib.util
+import multiprocessing
+from multiprocessing import shared_memory
+from multiprocessing.context import BaseContext
+import os
+import struct
+import time
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from tools import stb
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+POOL_MAGIC = b"KWP1"
+POOL_ALIGN = 64
+HEADER = struct.Struct("<4s4xq")
+MAX_ATTACHMENTS = 256
+_SLOTS_OFFSET = 64
+_SLOTS = struct.Struct(f"<{MAX_ATTACHMENTS}q")
+
+TensorKey = Tuple[int, int]  # (bin_file_id, tensor_id)
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for the shared weight pool")
+    return np
+
+
+def _align(value: int) -> int:
+    return (value + POOL_ALIGN - 1) & ~(POOL_ALIGN - 1)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True  # os.kill would terminate the process; assume it is alive
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@dataclass(frozen=True)
+class PoolHandle:
+    """Everything a worker needs to attach: segment name, tensor table and the refcount lock."""
+
+    name: str
+    size: int
+    entries: Mapping[TensorKey, Tuple[int, Tuple[int, ...]]]  # key -> (byte offset, shape)
+    lock: object
+
+
+class _PoolViews:
+    def __init__(self, handle: PoolHandle, shm: shared_memory.SharedMemory) -> None:
+        self.handle = handle
+        self._shm = shm
+        self._views: Dict[TensorKey, object] = {}
+
+    def __contains__(self, key: TensorKey) -> bool:
+        return key in self.handle.entries
+
+    def keys(self):
+        return self.handle.entries.keys()
+
+    def tensor(self, file_id: int, tensor_id: int):
+        """Read-only float32 view of one pooled tensor (no copy)."""
+        key = (file_id, tensor_id)
+        view = self._views.get(key)
+        if view is None:
+            if key not in self.handle.entries:
+                raise KeyError(f"tensor {key} is not in the weight pool")
+            offset, shape = self.handle.entries[key]
+            view = np.ndarray(shape, dtype=np.float32, buffer=self._shm.buf, offset=offset)
+            view.flags.writeable = False
+            self._views[key] = view
+        return view
+
+    @property
+    def refcount(self) -> int:
+        """Workers currently attached."""
+        return sum(1 for pid in _SLOTS.unpack_from(self._shm.buf, _SLOTS_OFFSET) if pid)
+
+    def _claim_slot(self) -> int:
+        with self.handle.lock:
+            slots = _SLOTS.unpack_from(self._shm.buf, _SLOTS_OFFSET)
+            if 0 not in slots:
+                raise RuntimeError(f"weight pool {self.handle.name!r} already has {MAX_ATTACHMENTS} attachments")
+            slot = slots.index(0)
+            struct.pack_into("<q", self._shm.buf, _SLOTS_OFFSET + 8 * slot, os.getpid())
+        return slot
+
+    def _release_slot(self, slot: int) -> None:
+        with self.handle.lock:
+            struct.pack_into("<q", self._shm.buf, _SLOTS_OFFSET + 8 * slot, 0)
+
+    def _reap_dead(self) -> None:
+        """Free the slots of workers that exited without detaching."""
+        with self.handle.lock:
+            for slot, pid in enumerate(_SLOTS.unpack_from(self._shm.buf, _SLOTS_OFFSET)):
+                if pid and not _pid_alive(pid):
+                    struct.pack_into("<q", self._shm.buf, _SLOTS_OFFSET + 8 * slot, 0)
+
+    def _unmap(self) -> None:
+        self._views.clear()
+        try:
+            self._shm.close()
+        except BufferError:
+            # A caller still holds a tensor view; the mapping is released
+            # when that view is dropped.
+            pass
+
+
+class WeightPool(_PoolViews):
+    """Owner side: loads tensors into a new shared segment and unlinks it on `close`."""
+
+    def __init__(
+        self,
+        bin_files: Mapping[int, object],
+        keys: Optional[Iterable[TensorKey]] = None,
+        *,
+        mp_context: Optional[BaseContext] = None,
+    ) -> None:
+        _require_numpy()
+        files = {file_id: stb.read_stb(path, mmap=True) for file_id, path in bin_files.items()}
+        if keys is None:
+            keys = [(file_id, tid) for file_id, tensors in files.items() for tid in tensors]
+        entries: Dict[TensorKey, Tuple[int, Tuple[int, ...]]] = {}
+        cursor = _align(_SLOTS_OFFSET + _SLOTS.size)
+        for file_id, tensor_id in sorted(set(keys)):
+            array = files[file_id][tensor_id]["array"]
+            entries[(file_id, tensor_id)] = (cursor, tuple(array.shape))
+            cursor = _align(cursor + array.size * 4)
+
+        shm = shared_memory.SharedMemory(create=True, size=cursor)
+        HEADER.pack_into(shm.buf, 0, POOL_MAGIC, MAX_ATTACHMENTS)
+        _SLOTS.pack_into(shm.buf, _SLOTS_OFFSET, *([0] * MAX_ATTACHMENTS))
+        for (file_id, tensor_id), (offset, shape) in entries.items():
+            dst = np.ndarray(shape, dtype=np.float32, buffer=shm.buf, offset=offset)
+            dst[...] = files[file_id][tensor_id]["array"]
+            del dst
+        lock = (mp_context or multiprocessing.get_context()).Lock()
+        super().__init__(PoolHandle(shm.name, cursor, entries, lock), shm)
+        self.nbytes = cursor
+        self._closed = False
+
+    @classmethod
+    def from_module(cls, module, *, mp_context: Optional[BaseContext] = None) -> "WeightPool":
+        """Pool exactly the tensors the module's load glyphs can reference."""
+        keys = [(t.file_id, t.tensor_id) for t in module.tensors if t.file_id in module.bin_files]
+        return cls(module.bin_files, keys, mp_context=mp_context)
+
+    def close(self, *, timeout: Optional[float] = 0.0) -> bool:
+        """Unlink the segment, first waiting up to `timeout` seconds (None: forever) for workers to detach.
+
+        Returns whether every worker had detached. Workers that died without
+        detaching do not count once they are gone (the owner's own children
+        must have been joined). Workers still attached keep a valid mapping
+        either way.
+        """
+        if self._closed:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._reap_dead()
+        while self.refcount > 0 and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.005)
+            self._reap_dead()
+        idle = self.refcount == 0
+        self._closed = True
+        self._shm.unlink()
+        self._unmap()
+        return idle
+
+    def __enter__(self) -> "WeightPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class AttachedPool(_PoolViews):
+    """Worker side: one counted reference to an owner's segment."""
+
+    def __init__(self, handle: PoolHandle) -> None:
+        _require_numpy()
+        shm = shared_memory.SharedMemory(name=handle.name)
+        if bytes(shm.buf[:4]) != POOL_MAGIC:
+            shm.close()
+            raise ValueError(f"shared memory {handle.name!r} is not a KHΛNARY weight pool")
+        super().__init__(handle, shm)
+        try:
+            self._slot = self._claim_slot()
+        except RuntimeError:
+            shm.close()
+            raise
+        self._attached = True
+
+    def close(self) -> None:
+        if self._attached:
+            self._attached = False
+            self._release_slot(self._slot)
+            self._unmap()
+
+    def __enter__(self) -> "AttachedPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def attach(handle: PoolHandle) -> AttachedPool:
+    return AttachedPool(handle)
+
+
+__all__ = [
+    "MAX_ATTACHMENTS",
+    "PoolHandle",
+    "WeightPool",
+    "AttachedPool",
+    "attach",
+]
@@ -0,0 +1,215 @@
+"""NumPy emulation of the WGSL kernels emitted by `tools.khlnary_webgpu`.
+
+Each `emulate_*` function walks the same workgroup grid, shared-memory tiles
+and reduction order as its WGSL template, vectorized over the invocations of
+one workgroup. `emulate_program` replays a `WgslProgram`'s dispatch list
+against flat buffers, so generated kernels can be checked on CPU-only CI
+against `tools.khlnary_cpu.CpuExecutor`.
+"""
+
+from __future__ import annotations
+
+import importlib
+import importlib.util
+from typing import Dict, Mapping, Optional
+
+from tools import stb
+from tools.khlnary_webgpu import Operand, TileConfig, WgslDispatch, WgslProgram
+from tools.kuhul_glyphs import FUSED_ACTIVATIONS
+
+_np_spec = importlib.util.find_spec("numpy")
+np = importlib.import_module("numpy") if _np_spec is not None else None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for the WGSL emulator")
+    return np
+
+
+def _activate(x, activation: int):
+    if activation == FUSED_ACTIVATIONS["relu"]:
+        return np.maximum(x, np.float32(0.0))
+    if activation == FUSED_ACTIVATIONS["gelu"]:
+        inner = np.tanh(np.float32(0.7978845608) * (x + np.float32(0.044715) * x * x * x))
+        return np.float32(0.5) * x * (np.float32(1.0) + inner)
+    return x
+
+
+# ------------------------------------------------------------
+# Kernels
+# ------------------------------------------------------------
+
+def emulate_matmul(a, w, tile: TileConfig, *, bias=None, activation: int = FUSED_ACTIVATIONS["none"]):
+    """Tiled `activation(a @ w + bias)`, zero-padding partial tiles like the shader."""
+
+    rows, k = a.shape
+    n = w.shape[1]
+    tm, tn, tk = tile.tile_m, tile.tile_n, tile.tile_k
+    out = np.empty((rows, n), dtype=np.float32)
+    for wy in range(-(-rows // tm)):
+        r0 = wy * tm
+        for wx in range(-(-n // tn)):
+            c0 = wx * tn
+            acc = np.zeros((tm, tn), dtype=np.float32)
+            for k0 in range(0, k, tk):
+                tile_a = np.zeros((tm, tk), dtype=np.float32)
+                tile_b = np.zeros((tk, tn), dtype=np.float32)
+                block_a = a[r0 : r0 + tm, k0 : k0 + tk]
+                block_b = w[k0 : k0 + tk, c0 : c0 + tn]
+                tile_a[: block_a.shape[0], : block_a.shape[1]] = block_a
+                tile_b[: block_b.shape[0], : block_b.shape[1]] = block_b
+                acc += tile_a @ tile_b
+            valid = acc[: min(tm, rows - r0), : min(tn, n - c0)]
+            if bias is not None:
+                valid = valid + bias[c0 : c0 + valid.shape[1]]
+            out[r0 : r0 + valid.shape[0], c0 : c0 + valid.shape[1]] = _activate(valid, activation)
+    return out
+
+
+def emulate_elementwise(x, other=None, *, activation: int = FUSED_ACTIVATIONS["none"]):
+    """`x + other` (broadcasting a 1-D bias over rows) or `activation(x)`."""
+
+    if other is not None:
+        return (x + other).astype(np.float32)
+    return _activate(x, activation).astype(np.float32)
+
+
+def _tree_reduce(partials, op):
+    size = partials.shape[-1]
+    while size > 1:
+        size //= 2
+        partials = op(partials[..., :size], partials[..., size : 2 * size])
+    return partials[..., 0]
+
+
+def emulate_softmax(x, workgroup_size: int):
+    """Row softmax: strided per-invocation partials, then a shared-memory tree reduction."""
+
+    rows, width = x.shape
+    padded = np.full((rows, -(-width // workgroup_size) * workgroup_size), -3.4e38, dtype=np.float32)
+    padded[:, :width] = x
+    strided = padded.reshape(rows, -1, workgroup_size)
+    row_max = _tree_reduce(strided.max(axis=1), np.maximum)[:, None]
+    e = np.exp(x - row_max)
+    padded_e = np.zeros_like(padded)
+    padded_e[:, :width] = e
+    row_sum = _tree_reduce(padded_e.reshape(rows, -1, workgroup_size).sum(axis=1), np.add)[:, None]
+    return (e / row_sum).astype(np.float32)
+
+
+def emulate_attention(q, k, v, *, heads: int, scale: float, seq_len: int):
+    """One invocation per (row, head): online softmax over the row's sequence, key by key."""
+
+    rows, width = q.shape
+    head_dim = width // heads
+    split = lambda t: t.reshape(rows // seq_len, seq_len, heads, head_dim)
+    q, k, v = split(q), split(k), split(v)
+    m = np.full((rows // seq_len, seq_len, heads), -3.4e38, dtype=np.float32)
+    l = np.zeros_like(m)
+    acc = np.zeros_like(q)
+    for j in range(seq_len):
+        s = (q * k[:, j : j + 1]).sum(axis=-1) * np.float32(scale)
+        m_new = np.maximum(m, s)
+        corr = np.exp(m - m_new)
+        p = np.exp(s - m_new)
+        l = l * corr + p
+        acc = acc * corr[..., None] + p[..., None] * v[:, j : j + 1]
+        m = m_new
+    return (acc / l[..., None]).reshape(rows, width)
+
+
+# ------------------------------------------------------------
+# Program replay
+# ------------------------------------------------------------
+
+def load_storage_buffers(program: WgslProgram) -> Dict[str, object]:
+    """Assemble each binding from its planned byte ranges as packed u32 words, as the JS loader streams it."""
+
+    _require_numpy()
+    buffers = {}
+    for storage in program.binding_plan.files:
+        ranges = program.binding_plan.ranges.get(storage.file_id, [])
+        size = max((r.dest + -(-r.size // 4) * 4 for r in ranges), default=0)
+        packed = np.zeros(max(size, 4), dtype=np.uint8)
+        with open(storage.path, "rb") as f:
+            for r in ranges:
+                f.seek(r.start)
+                chunk = np.frombuffer(f.read(r.size), dtype=np.uint8)
+                packed[r.dest : r.dest + chunk.size] = chunk
+        buffers[storage.name] = packed.view("<u4")
+    return buffers
+
+
+def unpack_elements(words, dtype: str, start: int, count: int):
+    """Decode `count` elements from packed u32 words like the shader's unpack expressions."""
+
+    raw = words.view(np.uint8)
+    if dtype == "int4":
+        return stb.unpack_int4(raw[start // 2 : -(-(start + count) // 2)].tobytes(), count).astype(np.float32)
+    np_dtype = {"float32": "<f4", "float16": "<f2", "int8": "i1", "int32": "<i4"}[dtype]
+    return raw.view(np_dtype)[start : start + count].astype(np.float32)
+
+
+def _view(buffers, operand: Operand, rows: int):
+    if operand.slot is not None:
+        count = 1
+        for dim in operand.tensor.shape:
+            count *= dim
+        values = unpack_elements(buffers[operand.buffer], operand.slot.dtype, operand.slot.element_offset, count)
+        return values.reshape(operand.tensor.shape)
+    start = rows * operand.offset
+    return buffers[operand.buffer][start : start + rows * operand.width].reshape(rows, operand.width)
+
+
+def _run_dispatch(d: WgslDispatch, buffers, rows: int, seq_len: int) -> None:
+    args = [_view(buffers, op, rows) for op in d.inputs]
+    if d.kind == "matmul":
+        bias = args[2] if len(args) > 2 else None
+        result = emulate_matmul(args[0], args[1], d.tile, bias=bias, activation=d.activation)
+    elif d.kind == "add":
+        result = emulate_elementwise(args[0], args[1])
+    elif d.kind == "activation":
+        result = emulate_elementwise(args[0], activation=d.activation)
+    elif d.kind == "softmax":
+        result = emulate_softmax(args[0], d.workgroup_size[0])
+    elif d.kind == "attention":
+        result = emulate_attention(*args, heads=d.heads, scale=d.scale, seq_len=seq_len)
+    else:
+        raise ValueError(f"Unknown dispatch kind: {d.kind}")
+    _view(buffers, d.output, rows)[...] = result
+
+
+def emulate_program(program: WgslProgram, x, storage: Mapping[str, object], *, seq_len: Optional[int] = None):
+    """Run every dispatch of `program` in order; return the output buffer as `[rows, width]`.
+
+    `x` is `[rows, hidden]` or `[batch, seq, hidden]`; attention stays within
+    each `seq_len` block of rows, as with the `constants` uniform on the GPU.
+    """
+
+    _require_numpy()
+    x = np.asarray(x, dtype=np.float32)
+    if seq_len is None:
+        seq_len = x.shape[-2] if x.ndim > 1 else 1
+    flat = x.reshape(-1, x.shape[-1])
+    rows = flat.shape[0]
+    buffers = {
+        "input_buffer": flat.ravel(),
+        "output_buffer": np.zeros(rows * program.output_width, dtype=np.float32),
+        "arena": np.zeros(rows * program.arena_units, dtype=np.float32),
+    }
+    buffers.update(storage)
+    for d in program.dispatches:
+        _run_dispatch(d, buffers, rows, seq_len)
+    return buffers["output_buffer"].reshape(x.shape[:-1] + (program.output_width,))
+
+
+__all__ = [
+    "emulate_matmul",
+    "emulate_elementwise",
+    "emulate_softmax",
+    "emulate_attention",
+    "emulate_program",
+    "unpack_elements",
+    "load_storage_buffers",
+]